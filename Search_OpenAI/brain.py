@@ -1,7 +1,9 @@
 import asyncio
+import hashlib
 import os
 import sqlite3
 import uuid
+from dataclasses import dataclass
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,12 +12,19 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Câu trả lời khi LLM lỗi (không đưa vào semantic cache)
+LLM_ERROR_PREFIX = "Xin lỗi, tôi không thể xử lý yêu cầu này."
+
 from Search_OpenAI.search import SearchManager
 from config import TAVILY_API_KEY, GROQ_API_KEY
 from typing import List, Union, Optional
 from Search_OpenAI.database import DatabaseManager, SessionContext
 from Search_OpenAI.telegram_service import get_notifier, notify_on_error
 from Search_OpenAI.data_cleanup import get_cleanup_service
+from Search_OpenAI.semantic_cache import SemanticCache
+from Search_OpenAI.search_cache import create_search_cache
+from Search_OpenAI.single_flight import SingleFlight, normalize_query
+from Search_OpenAI.embedding_service import EmbeddingService
 from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -24,6 +33,17 @@ from langchain_community.vectorstores import Chroma
 from langchain_community.chat_message_histories import SQLChatMessageHistory
 
 
+@dataclass
+class PreparedAnswer:
+    """Kết quả các bước trước LLM: câu trả lời có sẵn, hoặc context để LLM trả lời"""
+    session_id: str
+    session: Optional[SessionContext] = None
+    query_vector: Optional[List[float]] = None
+    answer: Optional[str] = None
+    context: str = ""
+    source: str = ""
+
+
 class TmeBrain:
     def __init__(self) -> None:
         
@@ -31,7 +51,12 @@ class TmeBrain:
         self.llm = self._init_llm()
         self.search_manager = SearchManager()
         self.database = DatabaseManager()
+        self.search_cache = create_search_cache(self.database)
+        self.embeddings = None
         self.vectorstore = self._init_vectorstore()  # Có thể None nếu lỗi
+        self.semantic_cache = SemanticCache()
+        self._vector_flight = SingleFlight('vectorstore')
+        self._llm_flight = SingleFlight('llm')
         self.chat_history = self._init_chat_history()
         
         self.notifier = get_notifier()
@@ -53,14 +78,16 @@ class TmeBrain:
 
     def _init_vectorstore(self):
         try:
-            embeddings = HuggingFaceEmbeddings(
+            model = HuggingFaceEmbeddings(
                 model_name="all-MiniLM-L6-v2",
                 model_kwargs={'device': 'cpu'},
                 encode_kwargs={'normalize_embeddings': True}
             )
+            # Cache + gộp lô cho câu hỏi, dùng chung cho semantic cache và Chroma
+            self.embeddings = EmbeddingService(model)
             return Chroma(
                 persist_directory=DATA_DIR,
-                embedding_function=embeddings
+                embedding_function=self.embeddings
             )
         except Exception as e:
             print(f"Warning: Could not initialize vectorstore: {e}")
@@ -82,47 +109,14 @@ class TmeBrain:
 
     async def ask_tme(self, user_query: str, session_id: Optional[str] = None) -> dict:
         try:
-            # Tăng request count và kiểm tra cleanup mỗi N requests
-            self._request_count += 1
-            if self._request_count % self._cleanup_interval == 0:
-                await self._check_data_cleanup()
-            
-            # Lấy hoặc tạo session
             session_id = self.get_session_id(session_id)
-            session = self.database.get_or_create_session(session_id)
-            
-            # Thêm câu hỏi vào session history
-            self.database.add_question_to_session(session_id, user_query)
-            
-            # Kiểm tra trong lịch sử
-            historical_answer = self.database.check_history(user_query)
-            if historical_answer:
-                return {"answer": historical_answer, "session_id": session_id}
-
-            # Kiểm tra trong cache
-            cached_result = self.database.check_cache(user_query)
-            if cached_result:
-                response = await self._generate_response(user_query, cached_result, "cache", session)
-                return {"answer": response, "session_id": session_id}
-
-            # Tìm kiếm vector store
-            vector_result = self._search_vectorstore(user_query)
-            
-            # Nếu không có, tìm kiếm web
-            if not vector_result:
-                search_result = await self.search_manager.search(user_query)
-                vector_result = self._format_search_result(search_result)
-                self.database.save_cache(user_query, vector_result)
+            prepared = await self._prepare_answer(user_query, session_id)
+            if prepared.answer is not None:
+                return {"answer": prepared.answer, "session_id": session_id}
 
             # Tạo phản hồi với context từ session
-            response = await self._generate_response(user_query, vector_result, "search", session)
-            
-            # Lưu vào lịch sử
-            self.database.save_conversation(user_query, response, "search")
-            
-            # Cập nhật topic nếu phát hiện chủ đề mới
-            await self._update_session_topic(session_id, user_query, response)
-            
+            response = await self._generate_response(user_query, prepared.context, prepared.source, prepared.session)
+            self._finish_answer(prepared, user_query, response)
             return {"answer": response, "session_id": session_id}
 
         except Exception as e:
@@ -130,6 +124,104 @@ class TmeBrain:
             await self._notify_error(e, f"ask_tme: {user_query[:50]}")
             return {"answer": f"Error: {str(e)}", "session_id": session_id if session_id else ""}
 
+    async def ask_tme_stream(self, user_query: str, session_id: Optional[str] = None):
+        """Như ask_tme nhưng trả câu trả lời theo từng phần (async generator các event dict:
+        session, token, done hoặc error). Câu trả lời được lưu khi stream kết thúc."""
+        session_id = self.get_session_id(session_id)
+        yield {"type": "session", "session_id": session_id}
+        try:
+            prepared = await self._prepare_answer(user_query, session_id)
+            if prepared.answer is not None:
+                yield {"type": "token", "text": prepared.answer}
+                yield {"type": "done", "answer": prepared.answer, "session_id": session_id}
+                return
+
+            parts = []
+            async for text in self._generate_response_stream(user_query, prepared.context, prepared.source,
+                                                             prepared.session):
+                parts.append(text)
+                yield {"type": "token", "text": text}
+
+            response = "".join(parts).strip()
+            self._finish_answer(prepared, user_query, response)
+            yield {"type": "done", "answer": response, "session_id": session_id}
+
+        except Exception as e:
+            await self._notify_error(e, f"ask_tme_stream: {user_query[:50]}")
+            yield {"type": "error", "error": str(e), "session_id": session_id}
+
+    async def _prepare_answer(self, user_query: str, session_id: str) -> "PreparedAnswer":
+        """Các bước trước khi gọi LLM: session, lịch sử, semantic cache, cache, vectorstore, web"""
+        # Tăng request count và kiểm tra cleanup mỗi N requests
+        self._request_count += 1
+        if self._request_count % self._cleanup_interval == 0:
+            await self._check_data_cleanup()
+        
+        # Lấy hoặc tạo session, thêm câu hỏi vào session history (một commit)
+        with self.database.transaction():
+            session = self.database.get_or_create_session(session_id)
+            self.database.add_question_to_session(session_id, user_query)
+        prepared = PreparedAnswer(session_id=session_id, session=session)
+        
+        # Kiểm tra trong lịch sử
+        historical_answer = self.database.check_history(user_query)
+        if historical_answer:
+            prepared.answer = historical_answer
+            return prepared
+
+        # Câu hỏi cùng ý đã được trả lời gần đây (semantic cache)
+        prepared.query_vector = await self._embed_query(user_query)
+        if prepared.query_vector is not None:
+            hit = self.semantic_cache.lookup(prepared.query_vector)
+            if hit:
+                question, answer, score = hit
+                print(f"[SemanticCache] Hit ({score:.3f}): {user_query[:50]} ~ {question[:50]}")
+                prepared.answer = answer
+                return prepared
+
+        # Kiểm tra trong cache (L1 trong process, rồi SQLite)
+        cached_result = self.search_cache.get(user_query)
+        if cached_result:
+            prepared.context, prepared.source = cached_result, "cache"
+            return prepared
+
+        # Tìm kiếm vector store
+        vector_result = await self._search_vectorstore(user_query, query_vector=prepared.query_vector)
+        
+        # Nếu không có, tìm kiếm web
+        if not vector_result:
+            search_result = await self.search_manager.search(user_query)
+            vector_result = self._format_search_result(search_result)
+            self.search_cache.put(user_query, vector_result)
+
+        prepared.context, prepared.source = vector_result, "search"
+        return prepared
+
+    def _finish_answer(self, prepared: "PreparedAnswer", user_query: str, response: str):
+        """Ghi nhớ câu trả lời vừa tạo (semantic cache, lịch sử, topic)"""
+        self._remember_answer(user_query, response, prepared.query_vector)
+        if prepared.source != "search":
+            return
+        # Lưu lịch sử và topic trong một commit (không await trong transaction)
+        with self.database.transaction():
+            self.database.save_conversation(user_query, response, "search")
+            # Cập nhật topic nếu phát hiện chủ đề mới
+            self._update_session_topic(prepared.session_id, user_query, response)
+
+    async def _embed_query(self, query: str):
+        """Embedding câu hỏi (cache LRU, gộp lô, model chạy trong thread pool)"""
+        if self.embeddings is None:
+            return None
+        try:
+            return await self.embeddings.aembed_query(query)
+        except Exception as e:
+            print(f"Embedding error: {e}")
+            return None
+
+    def _remember_answer(self, query: str, response: str, query_vector):
+        if query_vector is not None and not response.startswith(LLM_ERROR_PREFIX):
+            self.semantic_cache.add(query, response, query_vector)
+
     async def _check_data_cleanup(self):
         try:
             if self.cleanup_service.needs_cleanup():
@@ -144,7 +236,7 @@ class TmeBrain:
         except Exception as e:
             print(f"Lỗi: {e}")
 
-    async def _update_session_topic(self, session_id: str, query: str, response: str):
+    def _update_session_topic(self, session_id: str, query: str, response: str):
         """Tự động phát hiện và cập nhật chủ đề từ câu hỏi"""
         # Phát hiện chủ đề đơn giản từ câu hỏi
         topic_keywords = {
@@ -161,11 +253,25 @@ class TmeBrain:
                 self.database.update_session_topic(session_id, topic)
                 break
 
-    def _search_vectorstore(self, query: str, k: int = 2) -> str:
+    async def _search_vectorstore(self, query: str, k: int = 2, query_vector=None) -> str:
         if self.vectorstore is None:
             return ""
+        return await self._vector_flight.run(
+            (normalize_query(query), k), self._similarity_search, query, k, query_vector
+        )
+
+    async def _similarity_search(self, query: str, k: int, query_vector=None) -> str:
         try:
-            results = self.vectorstore.similarity_search(query, k=k)
+            # Dùng lại embedding đã tính cho semantic cache, không embed lại câu hỏi
+            if query_vector is None:
+                query_vector = await self._embed_query(query)
+            if query_vector is None:
+                return ""
+            # Chroma chạy đồng bộ: đưa sang thread pool để không chặn event loop
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                None, lambda: self.vectorstore.similarity_search_by_vector(query_vector, k=k)
+            )
             return "\n".join(doc.page_content for doc in results) if results else ""
         except Exception as e:
             print(f"Vector search error: {e}")
@@ -173,11 +279,55 @@ class TmeBrain:
 
     async def _generate_response(self, query: str, context: str, source: str, 
                                    session: Optional[SessionContext] = None) -> str:
+        """Gọi LLM; các request cùng câu hỏi, nguồn và context đang chạy dùng chung một lần gọi
+        (câu trả lời theo ngữ cảnh session của request đến trước)"""
+        return await self._llm_flight.run(self._llm_key(query, context, source),
+                                          self._call_llm, query, context, source, session)
+
+    async def _generate_response_stream(self, query: str, context: str, source: str,
+                                        session: Optional[SessionContext] = None):
+        """Như _generate_response nhưng trả từng đoạn text; các request trùng khóa đang stream
+        dùng chung một lần gọi LLM (request đến sau nhận lại các đoạn đã sinh rồi theo tiếp)"""
+        async for text in self._llm_flight.stream(self._llm_key(query, context, source),
+                                                  self._stream_or_call_llm, query, context, source, session):
+            yield text
+
+    @staticmethod
+    def _llm_key(query: str, context: str, source: str):
+        return (normalize_query(query), source, hashlib.sha1(context.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def _trim_context(context: str, max_context_len: int = 1000) -> str:
         # Giới hạn độ dài context để response nhanh hơn
-        max_context_len = 1000
         if len(context) > max_context_len:
-            context = context[:max_context_len] + "..."
-        
+            return context[:max_context_len] + "..."
+        return context
+
+    async def _stream_llm(self, query: str, context: str, source: str,
+                          session: Optional[SessionContext] = None):
+        """Các đoạn text của câu trả lời theo thứ tự LLM sinh ra (llm.astream)"""
+        prompt = self._build_prompt(query, self._trim_context(context), source, session)
+        async for chunk in self.llm.astream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+    async def _stream_or_call_llm(self, query: str, context: str, source: str,
+                                  session: Optional[SessionContext] = None):
+        """_stream_llm; nếu stream lỗi trước khi có token thì dùng lời gọi thường (có thử lại, thông báo lỗi)"""
+        started = False
+        try:
+            async for text in self._stream_llm(query, context, source, session):
+                started = True
+                yield text
+        except Exception as e:
+            if started:
+                raise
+            print(f"LLM stream error: {e}")
+            yield await self._call_llm(query, context, source, session)
+
+    async def _call_llm(self, query: str, context: str, source: str,
+                        session: Optional[SessionContext] = None) -> str:
+        context = self._trim_context(context)
         prompt = self._build_prompt(query, context, source, session)
         
         try:
@@ -198,8 +348,8 @@ class TmeBrain:
                     return response.content.strip()
                 except Exception as e2:
                     await self._notify_error(e2, f"LLM Retry Error: {query[:50]}")
-                    return f"Xin lỗi, tôi không thể xử lý yêu cầu này. Lỗi: {str(e2)[:100]}"
-            return f"Xin lỗi, tôi không thể xử lý yêu cầu này. Lỗi: {error_msg[:100]}"
+                    return f"{LLM_ERROR_PREFIX} Lỗi: {str(e2)[:100]}"
+            return f"{LLM_ERROR_PREFIX} Lỗi: {error_msg[:100]}"
 
     def _build_prompt(self, query: str, context: str, source: str, 
                       session: Optional[SessionContext] = None) -> str:
@@ -275,6 +425,22 @@ Trả lời (nhớ giữ phong cách ngọt ngào nhé):"""
             print(f"Error getting news: {e}")
             return []
 
+    def get_cache_stats(self) -> dict:
+        stats = {
+            'search_cache': self.search_cache.get_stats(),
+            'semantic_cache': self.semantic_cache.get_stats(),
+            'single_flight': {
+                flight.name: flight.get_stats()
+                for flight in (self.search_manager.flight, self._vector_flight, self._llm_flight)
+            },
+        }
+        if self.embeddings is not None:
+            stats['embeddings'] = self.embeddings.get_stats()
+        return stats
+
     def cleanup(self):
         """Cleanup resources"""
+        self.search_cache.stop()
+        if self.embeddings is not None:
+            self.embeddings.close()
         self.database.close()
\ No newline at end of file
@@ -6,6 +6,7 @@ from typing import Tuple, Optional
 from dataclasses import dataclass
 
 from Search_OpenAI.telegram_service import get_notifier
+from Search_OpenAI.query_sqlite3 import Querry_massage
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
@@ -90,6 +91,12 @@ class DataCleanupService:
             deleted_sessions = cursor.rowcount
             
             conn.commit()
+            # Trigger đã xóa các dòng tương ứng trong conversations_fts, gộp lại segment
+            try:
+                cursor.execute(Querry_massage.optimize_history_fts)
+                conn.commit()
+            except sqlite3.OperationalError:
+                pass
             cursor.execute("VACUUM")
             
             conn.close()
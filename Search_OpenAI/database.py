@@ -1,7 +1,10 @@
 import sqlite3
 import os
 import json
+import re
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 from Search_OpenAI.query_sqlite3 import Querry_massage
@@ -15,6 +18,31 @@ DB_PATH = os.path.join(DATA_DIR, 'tme_mess.db')
 # Cache timeout (10 phút = 600 giây)
 CACHE_TIMEOUT_SECONDS = 600
 
+# Chờ tối đa bao lâu khi database đang bị khóa ghi (ms)
+CHAT_DB_BUSY_TIMEOUT_MS = int(os.getenv('CHAT_DB_BUSY_TIMEOUT_MS', '5000'))
+# Số câu lệnh đã biên dịch giữ lại trên mỗi kết nối
+CHAT_DB_STATEMENT_CACHE = int(os.getenv('CHAT_DB_STATEMENT_CACHE', '128'))
+
+# Tra cứu lịch sử: xét bấy nhiêu câu hỏi có điểm bm25 tốt nhất, chỉ dùng câu trả lời
+# nếu câu hỏi mới chiếm ít nhất CHAT_HISTORY_MIN_COVERAGE số từ của câu hỏi cũ
+CHAT_HISTORY_CANDIDATES = int(os.getenv('CHAT_HISTORY_CANDIDATES', '5'))
+CHAT_HISTORY_MIN_COVERAGE = float(os.getenv('CHAT_HISTORY_MIN_COVERAGE', '0.6'))
+
+# Tách từ giống tokenizer unicode61 của FTS5
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _utc_now() -> datetime:
+    """Giờ UTC, cùng múi giờ với CURRENT_TIMESTAMP của SQLite"""
+    return datetime.utcnow()
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 
 class SessionContext:
     """Class để quản lý ngữ cảnh của một session"""
@@ -50,11 +78,77 @@ class SessionContext:
 
 
 class DatabaseManager:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        self.cursor = self.conn.cursor()
+    """Truy cập tme_mess.db, mỗi thread một kết nối sqlite3 riêng.
+
+    Kết nối dùng WAL (đọc không chặn ghi), busy_timeout và cache câu lệnh đã biên
+    dịch. Các lệnh ghi tự commit, trừ khi nằm trong `with transaction():` thì
+    commit một lần khi ra khỏi block. Trên event loop (nhiều coroutine cùng một
+    thread) không được `await` bên trong transaction.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
         self._init_tables()
 
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=CHAT_DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=CHAT_DB_STATEMENT_CACHE,
+            check_same_thread=False,  # chỉ để close() từ thread khác
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={CHAT_DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Kết nối của thread hiện tại (tạo mới nếu chưa có hoặc vừa fork)"""
+        if self._pid != os.getpid():
+            # Kết nối mở trước khi fork không dùng được trong process con
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Gộp nhiều lệnh ghi thành một commit (lồng nhau được)"""
+        conn = self.conn
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.commit()
+
+    def _query(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self.conn.execute(sql, params)
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        conn = self.conn
+        cursor = conn.execute(sql, params)
+        if self._local.depth == 0:
+            conn.commit()
+        return cursor.rowcount
+
     def _init_tables(self):
         tables_and_indexes = [
             Querry_massage.create_table_history,
@@ -62,99 +156,128 @@ class DatabaseManager:
             Querry_massage.create_table_session,
             Querry_massage.create_index_cache,
             Querry_massage.create_index_history,
-            Querry_massage.create_index_session
+            Querry_massage.create_index_session,
+            Querry_massage.create_table_history_fts,
+            Querry_massage.create_trigger_history_insert,
+            Querry_massage.create_trigger_history_delete,
+            Querry_massage.create_trigger_history_update
         ]
         
-        for query in tables_and_indexes:
-            self.cursor.execute(query)
-        self.conn.commit()
+        with self.transaction() as conn:
+            has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'conversations_fts'"
+            ).fetchone()
+            for query in tables_and_indexes:
+                conn.execute(query)
+            if not has_fts:
+                # Database cũ: đánh index các hội thoại đã có
+                conn.execute(Querry_massage.rebuild_history_fts)
 
     def check_history(self, query: str) -> str:
-        self.cursor.execute(
-            "SELECT answer FROM conversations WHERE question LIKE ? LIMIT 1",
-            (f'%{query}%',)
-        )
-        result = self.cursor.fetchone()
-        return f"[From history] {result[0]}" if result else None
+        """Tìm câu trả lời cho câu hỏi tương tự trong lịch sử (FTS5, xếp hạng bm25)"""
+        tokens = set(_tokens(query))
+        if not tokens:
+            return None
+        # Câu hỏi cũ phải chứa mọi từ của câu hỏi mới
+        match = ' '.join(f'"{token}"' for token in tokens)
+        candidates = self._query(
+            Querry_massage.search_history, (match, CHAT_HISTORY_CANDIDATES)
+        ).fetchall()
+        for question, answer in candidates:
+            coverage = len(tokens) / max(len(set(_tokens(question))), 1)
+            if coverage >= CHAT_HISTORY_MIN_COVERAGE:
+                return f"[From history] {answer}"
+        return None
 
-    def check_cache(self, query: str) -> str:
-        """Kiểm tra cache, trả về None nếu cache quá 10 phút"""
-        self.cursor.execute(
+    def get_cache_entry(self, query: str) -> Optional[tuple]:
+        """(kết quả, tuổi tính bằng giây) của cache entry, None nếu không có"""
+        result = self._query(
             "SELECT result, timestamp FROM search_cache WHERE query = ?",
             (query,)
-        )
-        result = self.cursor.fetchone()
-        if result:
-            cache_result, cache_time = result
-            # Parse timestamp và kiểm tra timeout
-            try:
-                cache_datetime = datetime.strptime(cache_time, "%Y-%m-%d %H:%M:%S")
-                age_seconds = (datetime.now() - cache_datetime).total_seconds()
-                if age_seconds > CACHE_TIMEOUT_SECONDS:
-                    # Cache quá hạn, xóa và trả về None
-                    self.delete_cache(query)
-                    print(f"[Cache] Expired ({age_seconds:.0f}s > {CACHE_TIMEOUT_SECONDS}s): {query[:50]}")
-                    return None
-                print(f"[Cache] Hit ({age_seconds:.0f}s old): {query[:50]}")
-                return cache_result
-            except Exception as e:
-                print(f"[Cache] Parse error: {e}")
-                return cache_result
-        return None
+        ).fetchone()
+        if not result:
+            return None
+        cache_result, cache_time = result
+        try:
+            cache_datetime = datetime.strptime(cache_time, TIMESTAMP_FORMAT)
+            age_seconds = (_utc_now() - cache_datetime).total_seconds()
+        except (TypeError, ValueError) as e:
+            print(f"[Cache] Parse error: {e}")
+            age_seconds = 0.0
+        return cache_result, age_seconds
+
+    def check_cache(self, query: str) -> str:
+        """Kiểm tra cache, trả về None nếu cache quá 10 phút (entry hết hạn do sweep xóa)"""
+        entry = self.get_cache_entry(query)
+        if entry is None:
+            return None
+        cache_result, age_seconds = entry
+        if age_seconds > CACHE_TIMEOUT_SECONDS:
+            print(f"[Cache] Expired ({age_seconds:.0f}s > {CACHE_TIMEOUT_SECONDS}s): {query[:50]}")
+            return None
+        print(f"[Cache] Hit ({age_seconds:.0f}s old): {query[:50]}")
+        return cache_result
 
     def delete_cache(self, query: str):
         """Xóa một cache entry"""
-        self.cursor.execute("DELETE FROM search_cache WHERE query = ?", (query,))
-        self.conn.commit()
+        self._write("DELETE FROM search_cache WHERE query = ?", (query,))
 
-    def clear_expired_cache(self):
-        """Xóa tất cả cache quá 10 phút"""
-        cutoff_time = datetime.now() - timedelta(seconds=CACHE_TIMEOUT_SECONDS)
-        self.cursor.execute(
+    def clear_expired_cache(self, max_age: float = CACHE_TIMEOUT_SECONDS):
+        """Xóa tất cả cache quá max_age giây (mặc định 10 phút)"""
+        cutoff_time = _utc_now() - timedelta(seconds=max_age)
+        deleted = self._write(
             "DELETE FROM search_cache WHERE timestamp < ?",
-            (cutoff_time.strftime("%Y-%m-%d %H:%M:%S"),)
+            (cutoff_time.strftime(TIMESTAMP_FORMAT),)
         )
-        deleted = self.cursor.rowcount
-        self.conn.commit()
         if deleted > 0:
             print(f"[Cache] Cleared {deleted} expired entries")
         return deleted
 
     def clear_all_cache(self):
         """Xóa toàn bộ cache"""
-        self.cursor.execute("DELETE FROM search_cache")
-        deleted = self.cursor.rowcount
-        self.conn.commit()
+        deleted = self._write("DELETE FROM search_cache")
         print(f"[Cache] Cleared all {deleted} entries")
         return deleted
 
     def save_cache(self, query: str, result: str):
-        self.cursor.execute(
+        self._write(
             "INSERT OR REPLACE INTO search_cache (query, result) VALUES (?, ?)",
             (query, result)
         )
-        self.conn.commit()
+
+    def save_cache_many(self, entries: List[tuple]):
+        """Ghi nhiều cache entry (query, result, thời điểm UTC) trong một commit"""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO search_cache (query, result, timestamp) VALUES (?, ?, ?)",
+                [(query, result, created.strftime(TIMESTAMP_FORMAT)) for query, result, created in entries]
+            )
 
     def save_conversation(self, question: str, answer: str, source: str):
-        self.cursor.execute(
+        self._write(
             "INSERT INTO conversations (question, answer, source) VALUES (?, ?, ?)",
             (question, answer, source)
         )
-        self.conn.commit()
 
     def close(self):
-        if self.conn:
-            self.conn.close()
+        """Đóng kết nối của mọi thread"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
 
     # ==================== SESSION CONTEXT METHODS ====================
     
     def get_session(self, session_id: str) -> Optional[SessionContext]:
         """Lấy ngữ cảnh session từ database"""
-        self.cursor.execute(
+        result = self._query(
             "SELECT current_topic, last_questions, conversation_summary FROM session_context WHERE session_id = ?",
             (session_id,)
-        )
-        result = self.cursor.fetchone()
+        ).fetchone()
         if result:
             current_topic, last_questions_json, conversation_summary = result
             last_questions = json.loads(last_questions_json) if last_questions_json else []
@@ -168,11 +291,10 @@ class DatabaseManager:
     
     def create_session(self, session_id: str) -> SessionContext:
         """Tạo session mới"""
-        self.cursor.execute(
+        self._write(
             "INSERT OR IGNORE INTO session_context (session_id, last_questions) VALUES (?, ?)",
             (session_id, json.dumps([]))
         )
-        self.conn.commit()
         return SessionContext(session_id=session_id)
     
     def get_or_create_session(self, session_id: str) -> SessionContext:
@@ -184,13 +306,12 @@ class DatabaseManager:
     
     def update_session_topic(self, session_id: str, topic: str):
         """Cập nhật chủ đề hiện tại của session"""
-        self.cursor.execute(
+        self._write(
             """UPDATE session_context 
                SET current_topic = ?, updated_at = CURRENT_TIMESTAMP 
                WHERE session_id = ?""",
             (topic, session_id)
         )
-        self.conn.commit()
     
     def add_question_to_session(self, session_id: str, question: str, max_questions: int = 10):
         """Thêm câu hỏi vào lịch sử session (giới hạn số lượng)"""
@@ -200,35 +321,32 @@ class DatabaseManager:
         if len(session.last_questions) > max_questions:
             session.last_questions = session.last_questions[-max_questions:]
         
-        self.cursor.execute(
+        self._write(
             """UPDATE session_context 
                SET last_questions = ?, updated_at = CURRENT_TIMESTAMP 
                WHERE session_id = ?""",
             (json.dumps(session.last_questions), session_id)
         )
-        self.conn.commit()
     
     def update_session_summary(self, session_id: str, summary: str):
         """Cập nhật tóm tắt cuộc trò chuyện"""
-        self.cursor.execute(
+        self._write(
             """UPDATE session_context 
                SET conversation_summary = ?, updated_at = CURRENT_TIMESTAMP 
                WHERE session_id = ?""",
             (summary, session_id)
         )
-        self.conn.commit()
     
     def clear_session(self, session_id: str):
         """Xóa ngữ cảnh session"""
-        self.cursor.execute(
+        self._write(
             "DELETE FROM session_context WHERE session_id = ?",
             (session_id,)
         )
-        self.conn.commit()
     
     def get_session_history(self, session_id: str, limit: int = 5) -> List[Dict]:
         """Lấy lịch sử hội thoại của session từ bảng conversations"""
-        self.cursor.execute(
+        results = self._query(
             """SELECT question, answer, timestamp 
                FROM conversations 
                WHERE question IN (
@@ -238,9 +356,8 @@ class DatabaseManager:
                )
                ORDER BY timestamp DESC LIMIT ?""",
             (session_id, limit)
-        )
-        results = self.cursor.fetchall()
+        ).fetchall()
         return [
             {"question": r[0], "answer": r[1], "timestamp": r[2]}
             for r in results
-        ]
\ No newline at end of file
+        ]
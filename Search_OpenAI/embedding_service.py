@@ -0,0 +1,204 @@
+"""
+Dịch vụ embedding dùng chung cho ChatAI (semantic cache, vectorstore).
+
+- Cache LRU embedding câu hỏi (EMBEDDING_CACHE_SIZE mục, lưu float32): câu hỏi lặp
+  lại không phải chạy lại model.
+- Gộp lô (micro-batching): các câu hỏi chưa có trong cache đến trong vòng
+  EMBEDDING_BATCH_WAIT_MS được embed chung một lần forward (tối đa
+  EMBEDDING_MAX_BATCH câu); câu hỏi trùng nhau trong cùng lô chỉ embed một lần.
+- Model chạy trong thread pool riêng (EMBEDDING_WORKERS thread), không chặn event loop.
+
+Cài đặt interface Embeddings của langchain nên có thể truyền thẳng cho Chroma
+(add_documents cũng đi qua đây, chia lô EMBEDDING_MAX_BATCH văn bản).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '2048'))
+EMBEDDING_MAX_BATCH = int(os.getenv('EMBEDDING_MAX_BATCH', '32'))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '5'))
+EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', '1'))
+
+
+class EmbeddingService(Embeddings):
+    def __init__(self, model: Embeddings, cache_size: int = EMBEDDING_CACHE_SIZE,
+                 max_batch: int = EMBEDDING_MAX_BATCH, batch_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+                 workers: int = EMBEDDING_WORKERS):
+        # model.embed_documents phải cho cùng kết quả với embed_query
+        # (HuggingFaceEmbeddings không đặt query_encode_kwargs riêng)
+        self.model = model
+        self.cache_size = max(0, cache_size)
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = batch_wait_ms / 1000
+        self.workers = max(1, workers)
+        self._cache = OrderedDict()     # text -> np.ndarray float32
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        # Lô đang gom, gắn với event loop đang chạy
+        self._loop = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_handle = None
+        self._tasks = set()
+        self._latencies = deque(maxlen=1000)
+        self._stats = {
+            'requests': 0, 'cache_hits': 0, 'coalesced': 0,
+            'batches': 0, 'texts_embedded': 0, 'max_batch_seen': 0,
+            'documents': 0, 'model_seconds': 0.0, 'errors': 0,
+        }
+
+    # ==================== Cache ====================
+
+    def _cache_get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self._stats['requests'] += 1
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self._stats['cache_hits'] += 1
+            return vector
+
+    def _cache_put(self, text: str, vector: np.ndarray):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ==================== Model ====================
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Tạo lại sau fork (thread của process cha không còn)
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='embedding')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Một lần forward cho cả lô (chạy trong thread)"""
+        started = time.perf_counter()
+        try:
+            vectors = self.model.embed_documents(texts)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['texts_embedded'] += len(texts)
+            self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], len(texts))
+            self._stats['model_seconds'] += elapsed
+        return [np.asarray(vector, dtype=np.float32) for vector in vectors]
+
+    # ==================== Micro-batching ====================
+
+    async def _enqueue(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pending, self._flush_handle = loop, {}, None
+        future = self._pending.get(text)
+        if future is not None:
+            with self._lock:
+                self._stats['coalesced'] += 1
+        else:
+            future = loop.create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_wait, self._flush)
+        # shield: một request bị hủy không hủy kết quả các request khác đang chờ
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = self._loop.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: Dict[str, asyncio.Future]):
+        texts = list(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(self._get_executor(), self._embed_batch, texts)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # tránh cảnh báo nếu mọi người chờ đã bị hủy
+            return
+        for text, vector in zip(texts, vectors):
+            self._cache_put(text, vector)
+            if not batch[text].done():
+                batch[text].set_result(vector)
+
+    # ==================== Interface Embeddings ====================
+
+    async def aembed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        vector = self._cache_get(text)
+        if vector is None:
+            vector = await self._enqueue(text)
+        self._latencies.append(time.perf_counter() - started)
+        return vector.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Bản đồng bộ (Chroma.similarity_search, script): có cache, không gộp lô"""
+        started = time.perf_counter()
+        vector = self._cache_get(text)
+        if vector is None:
+            vector = self._embed_batch([text])[0]
+            self._cache_put(text, vector)
+        self._latencies.append(time.perf_counter() - started)
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed văn bản cho vectorstore theo lô EMBEDDING_MAX_BATCH (không đưa vào cache)"""
+        vectors = []
+        for start in range(0, len(texts), self.max_batch):
+            vectors.extend(vector.tolist() for vector in self._embed_batch(texts[start:start + self.max_batch]))
+        with self._lock:
+            self._stats['documents'] += len(texts)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self.embed_documents, texts)
+
+    def close(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'cache_entries': len(self._cache), 'cache_size': self.cache_size,
+                          'max_batch': self.max_batch, 'batch_wait_ms': self.batch_wait * 1000})
+            latencies = sorted(self._latencies)
+        model_seconds = stats.pop('model_seconds')
+        stats['cache_hit_ratio'] = round(stats['cache_hits'] / stats['requests'], 4) if stats['requests'] else 0
+        stats['avg_batch_size'] = round(stats['texts_embedded'] / stats['batches'], 2) if stats['batches'] else 0
+        stats['avg_batch_ms'] = round(model_seconds / stats['batches'] * 1000, 2) if stats['batches'] else 0
+        stats['texts_per_second'] = round(stats['texts_embedded'] / model_seconds, 1) if model_seconds else 0
+        if latencies:
+            stats['latency_p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 2)
+            stats['latency_p95_ms'] = round(latencies[int(len(latencies) * 0.95)] * 1000, 2)
+        return stats
@@ -42,5 +42,50 @@ class Querry_massage:
                     CREATE INDEX IF NOT EXISTS idx_session_context_updated 
                         ON session_context(updated_at)
                     """
-                    )  
-      
\ No newline at end of file
+                    )
+
+    # Full-text index cho câu hỏi (external content: không lưu lại nội dung),
+    # đồng bộ với bảng conversations bằng trigger
+    create_table_history_fts = ("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+                    question,
+                    content='conversations',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 0'
+                    )
+                    """)
+    create_trigger_history_insert = ("""
+                    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert
+                    AFTER INSERT ON conversations BEGIN
+                        INSERT INTO conversations_fts(rowid, question) VALUES (new.id, new.question);
+                    END
+                    """)
+    create_trigger_history_delete = ("""
+                    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete
+                    AFTER DELETE ON conversations BEGIN
+                        INSERT INTO conversations_fts(conversations_fts, rowid, question)
+                            VALUES ('delete', old.id, old.question);
+                    END
+                    """)
+    create_trigger_history_update = ("""
+                    CREATE TRIGGER IF NOT EXISTS conversations_fts_update
+                    AFTER UPDATE OF question ON conversations BEGIN
+                        INSERT INTO conversations_fts(conversations_fts, rowid, question)
+                            VALUES ('delete', old.id, old.question);
+                        INSERT INTO conversations_fts(rowid, question) VALUES (new.id, new.question);
+                    END
+                    """)
+    rebuild_history_fts = ("""
+                    INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')
+                    """)
+    optimize_history_fts = ("""
+                    INSERT INTO conversations_fts(conversations_fts) VALUES ('optimize')
+                    """)
+    search_history = ("""
+                    SELECT c.question, c.answer
+                    FROM conversations_fts
+                    JOIN conversations c ON c.id = conversations_fts.rowid
+                    WHERE conversations_fts MATCH ?
+                    ORDER BY bm25(conversations_fts)
+                    LIMIT ?
+                    """)
@@ -4,6 +4,7 @@ import os
 from typing import Union, List, Dict
 from langchain_tavily import TavilySearch
 from config import TAVILY_API_KEY
+from Search_OpenAI.single_flight import SingleFlight, normalize_query
 
 class SearchManager:
     def __init__(self):
@@ -11,12 +12,15 @@ class SearchManager:
             max_results=2, 
             tavily_api_key=TAVILY_API_KEY
         )
+        self.flight = SingleFlight('search')
     
     async def search(self, query: str) -> Union[str, Dict, List[Dict]]:
-        """Thực hiện tìm kiếm web"""
+        """Thực hiện tìm kiếm web (các câu hỏi giống nhau đang chạy dùng chung một lần gọi)"""
+        query = query[:500] if len(query) > 500 else query
+        return await self.flight.run(normalize_query(query), self._search, query)
+    
+    async def _search(self, query: str) -> Union[str, Dict, List[Dict]]:
         try:
-            query = query[:500] if len(query) > 500 else query
-            
             # Thử dùng async trước
             if hasattr(self.search_tool, "ainvoke"):
                 result = await self.search_tool.ainvoke(query)
@@ -0,0 +1,209 @@
+"""
+Cache kết quả tìm kiếm web hai tầng.
+
+- L1: LRU trong process (OrderedDict), giới hạn theo số mục và tổng số byte,
+  mỗi mục hết hạn sau CACHE_TIMEOUT_SECONDS tính từ lúc tìm kiếm.
+- L2: bảng search_cache trong SQLite (dùng chung giữa các process), ghi kiểu
+  write-behind: put() chỉ đưa vào hàng chờ, thread nền ghi theo lô mỗi
+  SEARCH_CACHE_FLUSH_INTERVAL giây.
+- Mục hết hạn không bị xóa trong request: thread nền quét L1 và xóa trong SQLite
+  mỗi SEARCH_CACHE_SWEEP_INTERVAL giây.
+
+Thread nền khởi động ở lần dùng đầu tiên trong mỗi process (an toàn với fork).
+"""
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from Search_OpenAI.database import DatabaseManager, CACHE_TIMEOUT_SECONDS, _utc_now
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1000'))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv('SEARCH_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+SEARCH_CACHE_FLUSH_INTERVAL = float(os.getenv('SEARCH_CACHE_FLUSH_INTERVAL', '1'))
+SEARCH_CACHE_SWEEP_INTERVAL = float(os.getenv('SEARCH_CACHE_SWEEP_INTERVAL', '60'))
+
+
+def _entry_size(query: str, result: str) -> int:
+    return len(query.encode('utf-8')) + len(result.encode('utf-8'))
+
+
+class TieredSearchCache:
+    def __init__(self, database: DatabaseManager, ttl: float = CACHE_TIMEOUT_SECONDS,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES, max_bytes: int = SEARCH_CACHE_MAX_BYTES,
+                 flush_interval: float = SEARCH_CACHE_FLUSH_INTERVAL,
+                 sweep_interval: float = SEARCH_CACHE_SWEEP_INTERVAL):
+        self.database = database
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()   # query -> (result, hết hạn lúc (monotonic), số byte)
+        self._bytes = 0
+        self._pending = {}              # query -> (result, thời điểm tìm kiếm UTC)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'l1_hits': 0, 'l2_hits': 0, 'misses': 0,
+            'l1_evictions': 0, 'flushed': 0, 'flushes': 0, 'swept': 0,
+        }
+
+    # ==================== L1 ====================
+
+    def _l1_get(self, query: str, now: float) -> Optional[str]:
+        entry = self._entries.get(query)
+        if entry is None:
+            return None
+        result, expires_at, _ = entry
+        if expires_at <= now:
+            return None
+        self._entries.move_to_end(query)
+        return result
+
+    def _l1_put(self, query: str, result: str, expires_at: float):
+        size = _entry_size(query, result)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(query, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[query] = (result, expires_at, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats['l1_evictions'] += 1
+
+    # ==================== API ====================
+
+    def get(self, query: str) -> Optional[str]:
+        """Kết quả còn hạn từ L1, rồi L2 (nâng lên L1); None nếu không có"""
+        self._ensure_worker()
+        now = time.monotonic()
+        with self._lock:
+            result = self._l1_get(query, now)
+            if result is not None:
+                self._stats['l1_hits'] += 1
+                return result
+            pending = self._pending.get(query)
+
+        if pending is not None:
+            # Chưa ghi xuống SQLite nhưng đã bị đẩy khỏi L1
+            result, created = pending
+            age = (_utc_now() - created).total_seconds()
+        else:
+            entry = self.database.get_cache_entry(query)
+            result, age = entry if entry else (None, 0.0)
+
+        with self._lock:
+            if result is None or age > self.ttl:
+                self._stats['misses'] += 1
+                return None
+            self._stats['l2_hits'] += 1
+            self._l1_put(query, result, now + self.ttl - age)
+        return result
+
+    def put(self, query: str, result: str):
+        """Ghi vào L1 ngay, vào SQLite ở lần flush kế tiếp"""
+        self._ensure_worker()
+        with self._lock:
+            self._l1_put(query, result, time.monotonic() + self.ttl)
+            self._pending[query] = (result, _utc_now())
+
+    def flush(self) -> int:
+        """Ghi các mục đang chờ xuống SQLite trong một commit"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self.database.save_cache_many([
+                (query, result, created) for query, (result, created) in pending.items()
+            ])
+        except Exception as e:
+            print(f"[SearchCache] Flush error: {e}")
+            with self._lock:
+                # Giữ lại để thử ở lần sau (không ghi đè kết quả mới hơn)
+                for query, value in pending.items():
+                    self._pending.setdefault(query, value)
+            return 0
+        with self._lock:
+            self._stats['flushed'] += len(pending)
+            self._stats['flushes'] += 1
+        return len(pending)
+
+    def sweep(self) -> int:
+        """Xóa mục hết hạn khỏi L1 và SQLite"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [query for query, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+            for query in expired:
+                self._bytes -= self._entries.pop(query)[2]
+        deleted = self.database.clear_expired_cache(self.ttl)
+        with self._lock:
+            self._stats['swept'] += len(expired) + deleted
+        return len(expired) + deleted
+
+    # ==================== Thread nền ====================
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='search-cache-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if time.monotonic() >= next_sweep:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[SearchCache] Sweep error: {e}")
+                next_sweep = time.monotonic() + self.sweep_interval
+
+    def stop(self, timeout: float = 5):
+        """Dừng thread nền và ghi nốt các mục đang chờ"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'l1_entries': len(self._entries),
+                'l1_bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'pending_writes': len(self._pending),
+            })
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        l2_lookups = stats['l2_hits'] + stats['misses']
+        stats['l1_hit_ratio'] = round(stats['l1_hits'] / lookups, 4) if lookups else 0
+        stats['l2_hit_ratio'] = round(stats['l2_hits'] / l2_lookups, 4) if l2_lookups else 0
+        stats['hit_ratio'] = round((stats['l1_hits'] + stats['l2_hits']) / lookups, 4) if lookups else 0
+        return stats
+
+
+def create_search_cache(database: DatabaseManager) -> TieredSearchCache:
+    cache = TieredSearchCache(database)
+    atexit.register(cache.stop)
+    return cache
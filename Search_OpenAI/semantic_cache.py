@@ -0,0 +1,140 @@
+"""
+Cache câu trả lời theo ngữ nghĩa: câu hỏi diễn đạt khác nhưng cùng ý dùng lại câu
+trả lời trước đó thay vì gọi Tavily + LLM.
+
+Embedding câu hỏi (all-MiniLM-L6-v2, đã chuẩn hóa) lưu trong một ma trận float32
+liền khối; tìm câu hỏi gần nhất bằng một phép nhân ma trận-vector (cosine = dot).
+Mục quá SEMANTIC_CACHE_TTL giây bị bỏ qua và dọn dần; khi đầy, mục hết hạn hoặc ít
+dùng nhất bị thay thế.
+"""
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_TTL = float(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '5000'))
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: float = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._vectors = None          # (capacity, dim) float32, chỉ dùng [:_size]
+        self._created = np.zeros(0)   # thời điểm thêm (monotonic)
+        self._last_used = np.zeros(0)
+        self._questions = []
+        self._answers = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector) -> Optional[Tuple[str, str, float]]:
+        """(câu hỏi, câu trả lời, độ tương đồng) gần nhất trên ngưỡng, None nếu không có"""
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None
+            scores = self._vectors[:self._size] @ query
+            scores[self._created[:self._size] < now - self.ttl] = -np.inf
+            index = int(np.argmax(scores))
+            score = float(scores[index])
+            if score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._last_used[index] = now
+            return self._questions[index], self._answers[index], score
+
+    def add(self, question: str, answer: str, vector):
+        vector = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None:
+                capacity = min(self.max_entries, 256)
+                self._vectors = np.zeros((capacity, vector.shape[0]), dtype=np.float32)
+                self._created = np.zeros(capacity)
+                self._last_used = np.zeros(capacity)
+            elif vector.shape[0] != self._vectors.shape[1]:
+                return
+
+            index = self._slot(now)
+            self._vectors[index] = vector
+            self._created[index] = now
+            self._last_used[index] = now
+            if index == len(self._questions):
+                self._questions.append(question)
+                self._answers.append(answer)
+            else:
+                self._questions[index] = question
+                self._answers[index] = answer
+
+    def _slot(self, now: float) -> int:
+        """Vị trí ghi mục mới: dọn mục hết hạn, tăng dung lượng, hoặc thay mục ít dùng nhất"""
+        if self._size == self.max_entries:
+            self._remove_expired(now)
+        if self._size < self.max_entries:
+            if self._size == self._vectors.shape[0]:
+                self._grow()
+            self._size += 1
+            return self._size - 1
+        self.evictions += 1
+        return int(np.argmin(self._last_used[:self._size]))
+
+    def _grow(self):
+        capacity = min(self.max_entries, self._vectors.shape[0] * 2)
+        vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        self._created = np.resize(self._created, capacity)
+        self._last_used = np.resize(self._last_used, capacity)
+
+    def _remove_expired(self, now: float):
+        keep = np.flatnonzero(self._created[:self._size] >= now - self.ttl)
+        removed = self._size - len(keep)
+        if not removed:
+            return
+        size = len(keep)
+        self._vectors[:size] = self._vectors[keep]
+        self._created[:size] = self._created[keep]
+        self._last_used[:size] = self._last_used[keep]
+        self._questions = [self._questions[i] for i in keep]
+        self._answers = [self._answers[i] for i in keep]
+        self._size = size
+        self.evictions += removed
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._questions = []
+            self._answers = []
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': self._size,
+                'max_entries': self.max_entries,
+                'bytes': self._vectors.nbytes if self._vectors is not None else 0,
+                'threshold': self.threshold,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / total, 4) if total else 0,
+            }
@@ -0,0 +1,110 @@
+"""
+Gộp các lời gọi trùng nhau đang chạy đồng thời (single-flight).
+
+Khi nhiều người hỏi cùng một câu cùng lúc, chỉ lời gọi đầu tiên thực sự gọi
+Tavily/vectorstore/LLM; các lời gọi trùng khóa chờ và dùng chung kết quả (hoặc
+lỗi). Lời gọi gốc chạy trong một task riêng nên một request bị hủy (timeout)
+không làm hỏng các request đang chờ cùng kết quả.
+
+stream() làm tương tự cho câu trả lời dạng stream: một task duy nhất đọc async
+generator gốc, mỗi request trùng khóa nhận lại các phần đã sinh rồi theo tiếp
+các phần mới (lỗi giữa chừng được báo cho mọi request).
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Khóa cho câu hỏi: chữ thường, gộp khoảng trắng, bỏ dấu câu ở cuối"""
+    return ' '.join(query.lower().split()).rstrip(' ?!.')
+
+
+class _SharedStream:
+    """Các phần đã sinh của một stream đang chạy, dùng chung giữa các request"""
+
+    def __init__(self):
+        self.parts: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Tránh cảnh báo "exception was never retrieved" khi mọi người chờ đã bị hủy
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: Hashable, fn: Callable[..., AsyncIterator], *args, **kwargs):
+        """Như run() nhưng cho async generator: trả lần lượt các phần của stream dùng chung"""
+        self.calls += 1
+        shared = self._streams.get(key)
+        if shared is not None and shared.task.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+        else:
+            shared = _SharedStream()
+            shared.task = asyncio.ensure_future(self._produce(key, shared, fn(*args, **kwargs)))
+            self._streams[key] = shared
+        index = 0
+        while True:
+            while index < len(shared.parts):
+                yield shared.parts[index]
+                index += 1
+            if shared.done:
+                if shared.error is not None:
+                    raise shared.error
+                return
+            await shared.wait()
+
+    async def _produce(self, key, shared: _SharedStream, parts: AsyncIterator):
+        # Chạy trong task riêng: request đầu tiên ngắt kết nối không dừng stream của các request khác
+        try:
+            async for part in parts:
+                shared.parts.append(part)
+                shared.notify()
+        except asyncio.CancelledError as e:
+            shared.error = e
+            raise
+        except Exception as e:
+            shared.error = e
+        finally:
+            shared.done = True
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+            shared.notify()
+
+    def get_stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'shared': self.shared,
+            'in_flight': len(self._inflight) + len(self._streams),
+            'shared_ratio': round(self.shared / self.calls, 4) if self.calls else 0,
+        }
@@ -6,6 +6,7 @@ from typing import Optional
 from functools import wraps
 import traceback
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from background_loop import get_background_loop
 
 TELEGRAM_ENABLED = bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)
 
@@ -19,7 +20,24 @@ class TelegramNotifier:
         self.chat_id = chat_id or TELEGRAM_CHAT_ID
         self.enabled = bool(self.bot_token and self.chat_id)
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self._session = None
+        self._session_loop = None
 
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """aiohttp session dùng chung (giữ kết nối tới Telegram), mỗi event loop một session"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+            self._session_loop = loop
+            background = get_background_loop()
+            if background.is_loop_thread():
+                background.add_closer(self.close)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
         
     async def send_message(self, message: str, parse_mode: str = "HTML") -> bool:
         """Gửi tin nhắn đến Telegram"""
@@ -35,14 +53,14 @@ class TelegramNotifier:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, timeout=10) as response:
-                    if response.status == 200:
-                        print(f"[Telegram] ✓ Notification sent")
-                        return True
-                    else:
-                        print(f"[Telegram] ✗ Failed: {response.status}")
-                        return False
+            session = await self._get_session()
+            async with session.post(url, json=payload) as response:
+                if response.status == 200:
+                    print(f"[Telegram] ✓ Notification sent")
+                    return True
+                else:
+                    print(f"[Telegram] ✗ Failed: {response.status}")
+                    return False
         except Exception as e:
             print(f"[Telegram] ✗ Error: {e}")
             return False
@@ -50,16 +68,17 @@ class TelegramNotifier:
     def send_message_sync(self, message: str) -> bool:
         """Sync version của send_message"""
         try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # Nếu đang trong async context
-                asyncio.create_task(self.send_message(message))
-                return True
-            else:
-                return loop.run_until_complete(self.send_message(message))
+            asyncio.get_running_loop()
         except RuntimeError:
-            # Không có event loop
-            return asyncio.run(self.send_message(message))
+            # Không ở trong async context: chạy trên background loop dùng chung
+            try:
+                return get_background_loop().run(self.send_message(message), timeout=15)
+            except Exception as e:
+                print(f"[Telegram] ✗ Error: {e}")
+                return False
+        # Nếu đang trong async context
+        asyncio.create_task(self.send_message(message))
+        return True
     
     async def send_error(self, error: Exception, context: str = "", 
                          include_traceback: bool = True) -> bool:
@@ -0,0 +1,206 @@
+"""
+Kiểm soát tải cho các endpoint nhận diện khuôn mặt (CPU-bound).
+
+- Token bucket theo client cho từng lớp endpoint: vượt giới hạn trả 429. Client là
+  IP thật (đặt TRUSTED_PROXY_HOPS khi chạy sau ngrok/nginx/Docker, nếu không mọi
+  client dùng chung IP của proxy); kiosk còn phân biệt theo header X-Kiosk-Id để
+  nhiều kiosk sau cùng một NAT không dùng chung bucket. X-Kiosk-Id do client tự
+  gửi nên lớp kiosk luôn có thêm bucket theo IP (ADMISSION_KIOSK_IP_RATE/BURST, đủ
+  cho vài kiosk sau một NAT): đổi X-Kiosk-Id mỗi request không vượt được giới hạn.
+- Giới hạn số request nhận diện chạy đồng thời trong process; lớp 'interactive'
+  (đăng nhập/khôi phục mật khẩu) không được dùng các slot dành riêng cho kiosk và
+  nhường khi có kiosk đang chờ. Hết slot trả 503 ngay thay vì xếp hàng.
+- Mọi response từ chối đều có header Retry-After; số liệu xem ở /admin/admission.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import jsonify, request
+
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', str(os.cpu_count() or 2)))
+ADMISSION_KIOSK_RESERVED = int(os.getenv('ADMISSION_KIOSK_RESERVED', str(max(1, ADMISSION_MAX_CONCURRENT // 4))))
+ADMISSION_MAX_CLIENTS = int(os.getenv('ADMISSION_MAX_CLIENTS', '10000'))
+
+# (số request/giây, burst, thời gian chờ slot tối đa)
+ADMISSION_CLASSES = {
+    'kiosk': (
+        float(os.getenv('ADMISSION_KIOSK_RATE', '2')),
+        float(os.getenv('ADMISSION_KIOSK_BURST', '5')),
+        float(os.getenv('ADMISSION_KIOSK_WAIT', '2')),
+    ),
+    # Trang đăng nhập/khôi phục mật khẩu tự quét mỗi 2 giây: rate không thấp hơn
+    # 0.5 request/giây để một trang đang mở không bị chặn (đăng nhập cần hai khung
+    # hình nhận diện liên tiếp); nhiều tab cùng client vượt giới hạn. Kiosk được
+    # bảo vệ bằng slot dành riêng và quyền ưu tiên khi đang chờ (PriorityGate).
+    'interactive': (
+        float(os.getenv('ADMISSION_INTERACTIVE_RATE', '0.5')),
+        float(os.getenv('ADMISSION_INTERACTIVE_BURST', '3')),
+        float(os.getenv('ADMISSION_INTERACTIVE_WAIT', '0')),
+    ),
+}
+
+# Giới hạn chung cho mọi kiosk cùng một IP (bucket riêng, không bị X-Kiosk-Id ngẫu nhiên đẩy ra khỏi LRU)
+ADMISSION_KIOSK_IP_RATE = float(os.getenv('ADMISSION_KIOSK_IP_RATE', '10'))
+ADMISSION_KIOSK_IP_BURST = float(os.getenv('ADMISSION_KIOSK_IP_BURST', '20'))
+
+KIOSK_ID_PATTERN = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+
+def _client_key(client, kiosk):
+    if kiosk:
+        kiosk_id = request.headers.get('X-Kiosk-Id', '')
+        if KIOSK_ID_PATTERN.match(kiosk_id):
+            return f'{client}/{kiosk_id}'
+    return client
+
+
+class TokenBuckets:
+    """Token bucket theo client, giữ tối đa max_clients client gần nhất (LRU)"""
+
+    def __init__(self, rate, burst, max_clients=ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Lấy một token; trả về 0 nếu được phép, ngược lại số giây cần chờ"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate if self.rate > 0 else 60
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class PriorityGate:
+    """Giới hạn số việc chạy đồng thời, giữ `reserved` slot cho lớp kiosk"""
+
+    def __init__(self, limit=ADMISSION_MAX_CONCURRENT, reserved=ADMISSION_KIOSK_RESERVED):
+        self.limit = max(1, limit)
+        self.reserved = min(reserved, self.limit - 1)
+        if reserved > 0 and self.reserved == 0:
+            print(f"[Admission] ADMISSION_MAX_CONCURRENT={self.limit}: không đủ slot để dành riêng "
+                  f"cho kiosk, kiosk chỉ được ưu tiên khi đang chờ (đặt >= 2 để giữ slot kiosk)")
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._kiosk_waiting = 0
+        self._cond = threading.Condition()
+
+    def _can_enter(self, kiosk):
+        if kiosk:
+            return self.in_flight < self.limit
+        return self._kiosk_waiting == 0 and self.in_flight < self.limit - self.reserved
+
+    def acquire(self, kiosk, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if kiosk:
+                self._kiosk_waiting += 1
+            try:
+                while not self._can_enter(kiosk):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                return True
+            finally:
+                if kiosk:
+                    self._kiosk_waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+
+_gate = PriorityGate()
+_buckets = {name: TokenBuckets(rate, burst) for name, (rate, burst, _) in ADMISSION_CLASSES.items()}
+_kiosk_ip_buckets = TokenBuckets(ADMISSION_KIOSK_IP_RATE, ADMISSION_KIOSK_IP_BURST)
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+
+def _count(endpoint, key, value=1):
+    with _metrics_lock:
+        stats = _metrics.setdefault(endpoint, {
+            'admitted': 0, 'rate_limited': 0, 'shed': 0, 'wait_seconds': 0.0
+        })
+        stats[key] += value
+
+
+def _reject(status, error_type, message, retry_after):
+    response = jsonify({'success': False, 'error': message, 'type': error_type})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admit(priority, concurrency=True):
+    """Decorator kiểm soát tải cho endpoint nhận diện.
+
+    priority: 'kiosk' (check-in/nhận diện tại kiosk) hoặc 'interactive'.
+    concurrency=False: chỉ áp dụng token bucket (endpoint không chạy nhận diện).
+    """
+    rate, burst, max_wait = ADMISSION_CLASSES[priority]
+    buckets = _buckets[priority]
+    kiosk = priority == 'kiosk'
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            endpoint = request.endpoint
+            client = request.remote_addr or 'unknown'
+            wait = _kiosk_ip_buckets.take(client) if kiosk else 0
+            if not wait:
+                wait = buckets.take(_client_key(client, kiosk))
+            if wait:
+                _count(endpoint, 'rate_limited')
+                return _reject(429, 'rate_limited', 'Quá nhiều yêu cầu, vui lòng thử lại sau', wait)
+
+            if not concurrency:
+                _count(endpoint, 'admitted')
+                return f(*args, **kwargs)
+
+            started = time.monotonic()
+            if not _gate.acquire(kiosk, max_wait):
+                _count(endpoint, 'shed')
+                return _reject(503, 'overloaded', 'Hệ thống đang bận, vui lòng thử lại sau', 1 if kiosk else 2)
+            _count(endpoint, 'admitted')
+            _count(endpoint, 'wait_seconds', time.monotonic() - started)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _gate.release()
+        return decorated_function
+    return decorator
+
+
+def get_admission_stats():
+    """Số liệu kiểm soát tải của process hiện tại"""
+    with _metrics_lock:
+        endpoints = {name: dict(stats) for name, stats in _metrics.items()}
+    for stats in endpoints.values():
+        stats['avg_wait_ms'] = round(stats.pop('wait_seconds') * 1000 / stats['admitted'], 2) if stats['admitted'] else 0
+    return {
+        'pid': os.getpid(),
+        'max_concurrent': _gate.limit,
+        'kiosk_reserved': _gate.reserved,
+        'in_flight': _gate.in_flight,
+        'max_in_flight': _gate.max_in_flight,
+        'endpoints': endpoints
+    }
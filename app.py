@@ -1,7 +1,19 @@
-from flask import Flask
+import signal
+import threading
+import click
+from flask import Flask, request
 from flask_login import LoginManager
-from config import Config, WORK_START_TIME, WORK_LATE_TIME
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config
 from models import db, User, Attendance
+from migrations import run_migrations
+from employee_cache import get_employee_cache
+from job_queue import init_app as init_job_queue, start_workers, JOB_WORKERS
+from static_assets import init_app as init_static_assets
+from images import send_image, upload_url, UPLOAD_MAX_AGE
+from attendance_summary import rebuild_summary
+from payroll import compute_payroll, iter_csv, iter_parquet
+from attendance_export import build_export_query, iter_export
 from face_utils import load_known_faces, get_face_count
 
 from routes.auth import auth_bp
@@ -9,13 +21,16 @@ from routes.attendance import attendance_bp
 from routes.admin import admin_bp
 from routes.employee import employee_bp
 from routes.chat import chat_bp 
-from flask import send_from_directory
 
 
 def create_app():
     """Factory function tạo Flask app"""
     app = Flask(__name__)
     app.config.from_object(Config)
+    if Config.TRUSTED_PROXY_HOPS:
+        # request.remote_addr là IP client thật (giới hạn tải theo client, log)
+        hops = Config.TRUSTED_PROXY_HOPS
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
     
     db.init_app(app)
     
@@ -25,7 +40,7 @@ def create_app():
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return get_employee_cache().get_by_id(int(user_id))
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(attendance_bp)
@@ -33,22 +48,80 @@ def create_app():
     app.register_blueprint(employee_bp)
     app.register_blueprint(chat_bp)
     
+    init_job_queue(app)
+    init_static_assets(app)
+    app.jinja_env.globals['upload_url'] = upload_url
+    
+    @app.route('/uploads/<path:filename>')
+    def uploaded_file(filename):
+        """Ảnh check-in/out, ?size=sm|md|lg để lấy thumbnail"""
+        return send_image(Config.UPLOAD_FOLDER, filename, request.args.get('size'), max_age=UPLOAD_MAX_AGE)
+    
+    @app.cli.command('rebuild-summary')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='Từ ngày (YYYY-MM-DD)')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Đến ngày (YYYY-MM-DD)')
+    def rebuild_summary_command(start, end):
+        """Tính lại bảng thống kê điểm danh theo ngày từ bảng attendance"""
+        days = rebuild_summary(start.date() if start else None, end.date() if end else None)
+        print(f"Đã tính lại thống kê cho {days} ngày")
+    
+    @app.cli.command('payroll')
+    @click.option('--month', type=click.DateTime(formats=['%Y-%m']), required=True, help='Tháng (YYYY-MM)')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default='csv')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False), required=True, help='File kết quả')
+    def payroll_command(month, fmt, output):
+        """Xuất bảng lương tháng của tất cả nhân viên"""
+        report = compute_payroll(month.year, month.month)
+        chunks = iter_parquet(report) if fmt == 'parquet' else iter_csv(report)
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        print(f"Đã xuất bảng lương {len(report)} nhân viên: {output}")
+    
+    @app.cli.command('export-attendance')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Từ ngày (YYYY-MM-DD)')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Đến ngày (YYYY-MM-DD)')
+    @click.option('--department', help='Lọc theo phòng ban')
+    @click.option('--employee-id', help='Lọc theo mã nhân viên')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv')
+    @click.option('--output', '-o', type=click.File('wb'), default='-', help='File kết quả (mặc định stdout)')
+    def export_attendance_command(start, end, department, employee_id, fmt, output):
+        """Xuất điểm danh theo khoảng ngày ra CSV/NDJSON (stream, bộ nhớ cố định)"""
+        stmt = build_export_query(start.date(), end.date(), department, employee_id)
+        for chunk in iter_export(stmt, fmt):
+            output.write(chunk)
+    
+    @app.cli.command('jobs-worker')
+    @click.option('--workers', type=int, default=max(JOB_WORKERS, 1), help='Số worker thread')
+    def jobs_worker_command(workers):
+        """Chạy job nền trong một tiến trình riêng (Ctrl+C/SIGTERM để dừng)"""
+        queue = init_job_queue(app)
+        queue.start(workers)
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+        try:
+            while not stopping.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        print("Đang dừng job worker, chờ các job đang chạy...")
+        queue.stop()
+    
     return app
 
-def init_database(app):
+def init_database(app, start_jobs=True):
     """Tạo  tài khoản admin mặc định và khởi tạo database nếu chưa có"""
     with app.app_context():
         db.create_all()
+        run_migrations(db.engine)
         load_known_faces() 
+    if start_jobs:
+        start_workers()
 app = create_app()
 
-@app.route('/uploads/<path:filename>')
-def uploaded_file(filename):
-    return send_from_directory('uploads', filename)
-
 
 if __name__ == '__main__':
     init_database(app)
     print("Server đang chạy tại: http://0.0.0.0:8080")
-    print("chạy: ngrok http 8080")
+    print("chạy: ngrok http 8080 (đặt TRUSTED_PROXY_HOPS=1 để lấy IP client thật)")
     app.run(debug=True, host='0.0.0.0', port=8080)
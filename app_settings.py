@@ -0,0 +1,104 @@
+"""
+Cài đặt hệ thống (giờ làm việc) lưu trong database, cache đã parse trong process.
+
+Mỗi lần cập nhật tăng bộ đếm change_sequence 'settings'. Các process kiểm tra bộ
+đếm tối đa mỗi SETTINGS_TTL giây và chỉ đọc lại/parse khi phiên bản thay đổi,
+nên check-in không phải parse giờ và mọi worker thấy thay đổi mà không cần restart.
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from models import db, AppSetting, ChangeSequence
+
+SETTINGS_TTL = float(os.getenv('SETTINGS_TTL', '2.0'))
+
+VERSION_NAME = 'settings'
+
+DEFAULTS = {
+    'WORK_START_TIME': '08:30',
+    'WORK_LATE_TIME': '09:00',
+    'WORK_END_TIME': '17:30',
+}
+
+TIME_PATTERN = re.compile(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$')
+
+_lock = threading.Lock()
+_cached = {'settings': None, 'checked_at': 0.0}
+
+
+class WorkSettings:
+    """Snapshot cài đặt đã parse (không sửa trực tiếp, dùng save_settings)"""
+
+    def __init__(self, values, version):
+        self.values = values
+        self.version = version
+        self.work_start_time = datetime.strptime(values['WORK_START_TIME'], '%H:%M').time()
+        self.work_late_time = datetime.strptime(values['WORK_LATE_TIME'], '%H:%M').time()
+        self.work_end_time = datetime.strptime(values['WORK_END_TIME'], '%H:%M').time()
+
+    def to_dict(self):
+        return {
+            'work_start_time': self.values['WORK_START_TIME'],
+            'work_late_time': self.values['WORK_LATE_TIME'],
+            'work_end_time': self.values['WORK_END_TIME']
+        }
+
+
+def _current_version():
+    return db.session.query(ChangeSequence.value).filter_by(name=VERSION_NAME).scalar() or 0
+
+
+def _load(version):
+    values = dict(DEFAULTS)
+    values.update(dict(db.session.query(AppSetting.key, AppSetting.value).all()))
+    return WorkSettings(values, version)
+
+
+def get_settings():
+    """Cài đặt hiện tại, chỉ truy vấn phiên bản tối đa mỗi SETTINGS_TTL giây"""
+    now = time.monotonic()
+    with _lock:
+        cached = _cached['settings']
+        if cached is not None and now - _cached['checked_at'] < SETTINGS_TTL:
+            return cached
+
+    version = _current_version()
+    if cached is None or cached.version != version:
+        cached = _load(version)
+    with _lock:
+        _cached['settings'] = cached
+        _cached['checked_at'] = now
+    return cached
+
+
+def validate_settings(values):
+    """Trả về thông báo lỗi đầu tiên, None nếu hợp lệ"""
+    labels = {
+        'WORK_START_TIME': 'Giờ vào làm',
+        'WORK_LATE_TIME': 'Giờ đi muộn',
+        'WORK_END_TIME': 'Giờ tan làm',
+    }
+    for key, label in labels.items():
+        if not TIME_PATTERN.match(values.get(key) or ''):
+            return f'{label} không hợp lệ (định dạng HH:MM)'
+    return None
+
+
+def save_settings(values):
+    """Ghi cài đặt vào database và tăng phiên bản (các process khác thấy sau tối đa SETTINGS_TTL)"""
+    for key, value in values.items():
+        db.session.merge(AppSetting(key=key, value=value))
+    updated = ChangeSequence.query.filter_by(name=VERSION_NAME).update(
+        {'value': ChangeSequence.value + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(ChangeSequence(name=VERSION_NAME, value=1))
+    db.session.commit()
+
+    settings = _load(_current_version())
+    with _lock:
+        _cached['settings'] = settings
+        _cached['checked_at'] = time.monotonic()
+    return settings
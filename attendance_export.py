@@ -0,0 +1,89 @@
+"""
+Xuất dữ liệu điểm danh theo khoảng ngày ra CSV hoặc NDJSON.
+
+Dùng server-side cursor (stream_results + yield_per) và generator nên bộ nhớ
+không phụ thuộc số dòng, byte đầu tiên được gửi ngay khi có khối dữ liệu đầu.
+"""
+import csv
+import io
+import json
+from sqlalchemy import select
+from models import db, Attendance
+
+EXPORT_BATCH_ROWS = 2000
+
+EXPORT_COLUMNS = [
+    'id', 'employee_id', 'full_name', 'department', 'position', 'date',
+    'check_in', 'check_out', 'time_lam', 'status', 'luong'
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def build_export_query(start, end, department=None, employee_id=None):
+    """Truy vấn điểm danh trong [start, end], lọc thêm theo phòng ban/nhân viên"""
+    columns = [getattr(Attendance, c) for c in EXPORT_COLUMNS]
+    stmt = select(*columns).where(Attendance.date >= start, Attendance.date <= end)
+    if department:
+        stmt = stmt.where(Attendance.department == department)
+    if employee_id:
+        stmt = stmt.where(Attendance.employee_id == employee_id)
+    # (employee_id, date) hoặc (date, check_in) index đều phục vụ được thứ tự này
+    return stmt.order_by(Attendance.date, Attendance.id)
+
+
+def _iter_batches(stmt, batch_rows):
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=batch_rows)
+    )
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if hasattr(value, 'hour') else value.isoformat()
+    return value
+
+
+def _to_json(value):
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return float(value)    # Decimal
+
+
+def iter_csv(stmt, batch_rows=EXPORT_BATCH_ROWS):
+    """Generator bytes CSV, mỗi khối yield_per dòng"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode('utf-8-sig')
+    for batch in _iter_batches(stmt, batch_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_to_text(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(stmt, batch_rows=EXPORT_BATCH_ROWS):
+    """Generator bytes NDJSON (mỗi dòng một object JSON)"""
+    for batch in _iter_batches(stmt, batch_rows):
+        lines = [
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_to_json, row))), ensure_ascii=False)
+            for row in batch
+        ]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_export(stmt, fmt):
+    return iter_ndjson(stmt) if fmt == 'ndjson' else iter_csv(stmt)
@@ -0,0 +1,105 @@
+"""
+Delta feed cho danh sách điểm danh hôm nay.
+
+Mỗi lần check-in/check-out gán attendance.seq = next_seq() trong cùng transaction,
+kiosk chỉ cần lấy các bản ghi có seq > cursor. Khi bản ghi bị xóa (delete_user),
+mark_reset() buộc client tải lại toàn bộ.
+
+current_seq() được cache trong process FEED_SEQ_TTL giây nên các lần poll không
+có thay đổi trả 304 mà không cần truy vấn database.
+"""
+import os
+import threading
+import time
+from models import db, Attendance, ChangeSequence
+
+FEED_SEQ_TTL = float(os.getenv('FEED_SEQ_TTL', '1.0'))
+
+SEQ_NAME = 'attendance'
+RESET_NAME = 'attendance_reset'
+
+_lock = threading.Lock()
+_cached = {'seq': None, 'reset': 0, 'checked_at': 0.0}
+
+
+def _bump(name):
+    """Tăng bộ đếm và trả về giá trị mới (UPDATE giữ khóa ghi nên không bị trùng)"""
+    updated = ChangeSequence.query.filter_by(name=name).update(
+        {'value': ChangeSequence.value + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(ChangeSequence(name=name, value=1))
+        db.session.flush()
+        return 1
+    return db.session.query(ChangeSequence.value).filter_by(name=name).scalar()
+
+
+def next_seq():
+    """Sequence mới cho một thay đổi điểm danh, gọi trước commit"""
+    seq = _bump(SEQ_NAME)
+    _pending_seqs().append(seq)
+    return seq
+
+
+def mark_reset():
+    """Đánh dấu có bản ghi bị xóa: client có cursor cũ hơn phải tải lại toàn bộ"""
+    seq = next_seq()
+    reset = ChangeSequence.query.filter_by(name=RESET_NAME).update(
+        {'value': seq}, synchronize_session=False
+    )
+    if not reset:
+        db.session.add(ChangeSequence(name=RESET_NAME, value=seq))
+    return seq
+
+
+def _pending_seqs():
+    return db.session.info.setdefault('attendance_seqs', [])
+
+
+def note_committed():
+    """Cập nhật cache sequence của process sau khi commit (thay đổi hiện ngay trong worker này)"""
+    seqs = db.session.info.pop('attendance_seqs', None)
+    if not seqs:
+        return
+    with _lock:
+        if _cached['seq'] is not None:
+            _cached['seq'] = max(_cached['seq'], max(seqs))
+
+
+def current_seq():
+    """(seq, reset_seq) mới nhất, đọc lại từ database tối đa mỗi FEED_SEQ_TTL giây"""
+    now = time.monotonic()
+    with _lock:
+        if _cached['seq'] is not None and now - _cached['checked_at'] < FEED_SEQ_TTL:
+            return _cached['seq'], _cached['reset']
+    values = dict(db.session.query(ChangeSequence.name, ChangeSequence.value).filter(
+        ChangeSequence.name.in_([SEQ_NAME, RESET_NAME])
+    ).all())
+    with _lock:
+        _cached['seq'] = values.get(SEQ_NAME, 0)
+        _cached['reset'] = values.get(RESET_NAME, 0)
+        _cached['checked_at'] = now
+        return _cached['seq'], _cached['reset']
+
+
+def make_etag(day, seq):
+    return f"att-{day.isoformat()}-{seq}"
+
+
+def serialize(att):
+    return {
+        'employee_id': att.employee_id,
+        'full_name': att.full_name,
+        'check_in': att.check_in.strftime('%H:%M:%S') if att.check_in else None,
+        'check_out': att.check_out.strftime('%H:%M:%S') if att.check_out else None,
+        'status': att.status,
+        'seq': att.seq
+    }
+
+
+def changes_since(day, since):
+    """Các bản ghi của ngày `day` thay đổi sau sequence `since`, theo thứ tự seq"""
+    return Attendance.query.filter(
+        Attendance.date == day,
+        Attendance.seq > since
+    ).order_by(Attendance.seq).all()
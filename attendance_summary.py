@@ -0,0 +1,117 @@
+"""
+Bảng thống kê điểm danh theo ngày (daily_summary, department_daily_summary).
+
+Các bộ đếm được cộng dồn trong cùng transaction với check-in/check-out nên
+/attendance/status và dashboard chỉ cần đọc một dòng theo primary key.
+rebuild_summary() tính lại từ bảng attendance cho các ngày cũ hoặc sau khi xóa dữ liệu.
+"""
+from datetime import date as date_cls
+from sqlalchemy import case, func
+from models import db, Attendance, DailySummary, DepartmentDailySummary, dialect_insert
+
+COUNTERS = ('total', 'checked_in', 'checked_out', 'late')
+
+
+def _increment(model, keys, deltas):
+    """UPSERT cộng dồn các bộ đếm cho một dòng thống kê"""
+    values = {**keys, **{c: deltas.get(c, 0) for c in COUNTERS}}
+    stmt = dialect_insert(model).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in COUNTERS if deltas.get(c)}
+    )
+    db.session.execute(stmt)
+
+
+def _apply(day, department, deltas):
+    _increment(DailySummary, {'date': day}, deltas)
+    _increment(DepartmentDailySummary, {'date': day, 'department': department or ''}, deltas)
+
+
+def record_check_in(day, department, status):
+    """Gọi ngay sau khi thêm bản ghi check-in, trước commit"""
+    _apply(day, department, {
+        'total': 1,
+        'checked_in': 1,
+        'late': 1 if status == 'late' else 0
+    })
+
+
+def record_check_out(day, department):
+    """Gọi ngay sau khi cập nhật check-out, trước commit"""
+    _apply(day, department, {'checked_out': 1})
+
+
+def get_day_summary(day=None):
+    """Thống kê một ngày (một lần đọc theo primary key)"""
+    day = day or date_cls.today()
+    row = db.session.get(DailySummary, day)
+    if row is None:
+        return {'total': 0, 'checked_in': 0, 'checked_out': 0, 'present_now': 0, 'late': 0}
+    return {
+        'total': row.total,
+        'checked_in': row.checked_in,
+        'checked_out': row.checked_out,
+        'present_now': row.present_now,
+        'late': row.late
+    }
+
+
+def get_department_summary(day=None):
+    """Thống kê theo phòng ban của một ngày"""
+    day = day or date_cls.today()
+    rows = DepartmentDailySummary.query.filter_by(date=day).order_by(
+        DepartmentDailySummary.department
+    ).all()
+    return [{
+        'department': r.department or 'Chưa phân công',
+        'total': r.total,
+        'checked_in': r.checked_in,
+        'checked_out': r.checked_out,
+        'present_now': r.present_now,
+        'late': r.late
+    } for r in rows]
+
+
+def rebuild_summary(start=None, end=None):
+    """Tính lại thống kê từ bảng attendance cho khoảng ngày [start, end] (mặc định: tất cả)"""
+    filters = []
+    if start:
+        filters.append(Attendance.date >= start)
+    if end:
+        filters.append(Attendance.date <= end)
+
+    for model in (DailySummary, DepartmentDailySummary):
+        query = model.query
+        if start:
+            query = query.filter(model.date >= start)
+        if end:
+            query = query.filter(model.date <= end)
+        query.delete(synchronize_session=False)
+
+    counters = [
+        func.count(Attendance.id).label('total'),
+        func.count(Attendance.check_in).label('checked_in'),
+        func.count(Attendance.check_out).label('checked_out'),
+        func.sum(case((Attendance.status == 'late', 1), else_=0)).label('late'),
+    ]
+    department = func.coalesce(Attendance.department, '')
+
+    days = db.session.query(Attendance.date, *counters).filter(
+        Attendance.date.isnot(None), *filters
+    ).group_by(Attendance.date).all()
+    db.session.bulk_insert_mappings(DailySummary, [row._asdict() for row in days])
+
+    departments = db.session.query(
+        Attendance.date, department.label('department'), *counters
+    ).filter(Attendance.date.isnot(None), *filters).group_by(Attendance.date, department).all()
+    db.session.bulk_insert_mappings(DepartmentDailySummary, [row._asdict() for row in departments])
+
+    db.session.commit()
+    return len(days)
+
+
+def rebuild_days(days):
+    """Tính lại thống kê cho từng ngày cụ thể (vd: sau khi xóa bản ghi điểm danh)"""
+    for day in sorted(set(d for d in days if d)):
+        rebuild_summary(day, day)
@@ -0,0 +1,143 @@
+"""
+Một event loop asyncio chạy lâu dài trên thread nền, dùng chung cho cả process.
+
+Flask handler (sync) gửi coroutine vào loop bằng run_async(..., timeout=...).
+Vì loop không bị đóng sau mỗi request, các client async (LLM, aiohttp session...)
+giữ được connection pool giữa các request. Sau fork (gunicorn), process con tự tạo
+loop mới ở lần dùng đầu tiên.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import queue
+import threading
+
+BACKGROUND_LOOP_TIMEOUT = float(os.getenv('BACKGROUND_LOOP_TIMEOUT', '60'))
+
+
+class BackgroundLoop:
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._closers = []
+        self._lock = threading.Lock()
+
+    def get_loop(self):
+        """Loop của process hiện tại, khởi động nếu chưa có (hoặc vừa fork)"""
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                ready = threading.Event()
+                loop = asyncio.new_event_loop()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name='background-loop', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                self._pid = os.getpid()
+                # Hàm đóng của loop trong process cha không dùng được ở đây
+                self._closers = []
+        return self._loop
+
+    def is_loop_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Gửi coroutine vào loop, trả về concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    def run(self, coro, timeout=BACKGROUND_LOOP_TIMEOUT):
+        """Chạy coroutine trên loop nền và chờ kết quả; hủy coroutine nếu quá timeout"""
+        if self.is_loop_thread():
+            raise RuntimeError("Không thể chờ coroutine ngay trên thread của background loop")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Quá thời gian chờ ({timeout}s)")
+
+    def iter_async(self, agen, timeout=BACKGROUND_LOOP_TIMEOUT):
+        """Duyệt async generator trên loop nền từ code đồng bộ (vd: response stream).
+
+        Mỗi phần tử chờ tối đa `timeout` giây; dừng duyệt giữa chừng (client ngắt kết
+        nối) hoặc quá thời gian sẽ hủy generator trên loop.
+        """
+        items = queue.Queue()
+        finished = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((True, item))
+            except Exception as e:
+                items.put((False, e))
+            else:
+                items.put((True, finished))
+
+        future = self.submit(pump())
+        try:
+            while True:
+                try:
+                    ok, item = items.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"Quá thời gian chờ ({timeout}s)")
+                if not ok:
+                    raise item
+                if item is finished:
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def add_closer(self, closer):
+        """Đăng ký hàm async đóng tài nguyên (vd: aiohttp session) khi dừng loop"""
+        self._closers.append(closer)
+
+    def stop(self, timeout=5):
+        if self._loop is None or self._pid != os.getpid():
+            return
+        loop = self._loop
+        if self._closers:
+            async def close_all():
+                for closer in self._closers:
+                    try:
+                        await closer()
+                    except Exception as e:
+                        print(f"Lỗi khi đóng tài nguyên async: {e}")
+            try:
+                asyncio.run_coroutine_threadsafe(close_all(), loop).result(timeout)
+            except Exception as e:
+                print(f"Lỗi khi dừng background loop: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            loop.close()
+        self._loop = None
+
+
+_background_loop = None
+
+
+def get_background_loop():
+    global _background_loop
+    if _background_loop is None:
+        _background_loop = BackgroundLoop()
+        atexit.register(_background_loop.stop)
+    return _background_loop
+
+
+def run_async(coro, timeout=BACKGROUND_LOOP_TIMEOUT):
+    return get_background_loop().run(coro, timeout)
+
+
+def iter_async(agen, timeout=BACKGROUND_LOOP_TIMEOUT):
+    return get_background_loop().iter_async(agen, timeout)
@@ -0,0 +1,98 @@
+"""
+Vẽ biểu đồ dashboard ngoài request.
+
+Mỗi ảnh được đặt tên theo hash của số liệu (chart_<hash>.png) nên chỉ vẽ lại khi
+số liệu thay đổi, nhiều admin cùng mở dashboard dùng chung một file bất biến.
+Dùng Figure API (không dùng pyplot) để vẽ an toàn trong job nền.
+"""
+import hashlib
+import json
+import os
+import threading
+from matplotlib.figure import Figure
+from job_queue import enqueue, job_handler
+
+CHART_DIR = os.path.join('static', 'public_databoard')
+CHART_KEEP = int(os.getenv('CHART_KEEP', 20))
+
+CHART_TITLE = 'Thống kê điểm danh hôm nay'
+CHART_LABELS = ['Tổng nhân viên', 'Điểm danh hôm nay', 'Đã check-in', 'Đã check-out']
+CHART_COLORS = ['#4e79a7', '#f28e2b', '#e15759', '#76b7b2']
+
+
+def chart_data(values):
+    """Số liệu biểu đồ dạng JSON (cho trình duyệt tự vẽ)"""
+    return {
+        'title': CHART_TITLE,
+        'labels': CHART_LABELS,
+        'colors': CHART_COLORS,
+        'values': [int(v) for v in values]
+    }
+
+
+def chart_key(values):
+    raw = json.dumps(chart_data(values), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def chart_filename(values):
+    """Đường dẫn ảnh trong thư mục static (dùng cho url_for('static', ...))"""
+    return f"public_databoard/chart_{chart_key(values)}.png"
+
+
+def _chart_path(key):
+    return os.path.join(CHART_DIR, f"chart_{key}.png")
+
+
+def render_chart(values):
+    """Vẽ biểu đồ ra file nếu chưa có, trả về đường dẫn file"""
+    key = chart_key(values)
+    path = _chart_path(key)
+    if os.path.exists(path):
+        return path
+
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot()
+    ax.bar(CHART_LABELS, [int(v) for v in values], color=CHART_COLORS)
+    ax.set_title(CHART_TITLE)
+    ax.set_ylabel('Số lượng')
+
+    os.makedirs(CHART_DIR, exist_ok=True)
+    # Ghi file tạm rồi đổi tên để không ai đọc được ảnh ghi dở
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp_path, format='png')
+    os.replace(tmp_path, path)
+    _prune(keep=path)
+    return path
+
+
+def _prune(keep):
+    """Chỉ giữ CHART_KEEP ảnh mới nhất"""
+    try:
+        charts = [
+            os.path.join(CHART_DIR, name) for name in os.listdir(CHART_DIR)
+            if name.startswith('chart_') and name.endswith('.png')
+        ]
+        charts.sort(key=os.path.getmtime, reverse=True)
+        for path in charts[CHART_KEEP:]:
+            if path != keep:
+                os.remove(path)
+    except OSError as e:
+        print(f"Lỗi khi dọn biểu đồ cũ: {e}")
+
+
+@job_handler('render_chart')
+def _render_job(payload):
+    return render_chart(payload['values'])
+
+
+def request_chart(values):
+    """
+    Trả về tên file ảnh nếu đã vẽ xong, nếu chưa thì enqueue job vẽ
+    (mỗi bộ số liệu chỉ có một job) và trả về None.
+    """
+    key = chart_key(values)
+    if os.path.exists(_chart_path(key)):
+        return chart_filename(values)
+    enqueue('render_chart', {'values': [int(v) for v in values]}, unique_key=f'chart:{key}')
+    return None
@@ -0,0 +1,130 @@
+"""
+Benchmark truy vấn điểm danh trên database cũ (không index) trước và sau khi chạy migration.
+
+Chạy: python check_acc/bench_attendance_indexes.py --rows 1000000 --employees 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from migrations import run_migrations
+
+# Schema trước khi có migration (chỉ có primary key)
+LEGACY_SCHEMA = [
+    """CREATE TABLE user (
+        id INTEGER PRIMARY KEY, username VARCHAR(80) UNIQUE NOT NULL,
+        password_hash VARCHAR(200) NOT NULL, role VARCHAR(20) NOT NULL,
+        full_name VARCHAR(100) NOT NULL, email VARCHAR(120), salary NUMERIC(10, 2) NOT NULL,
+        employee_id VARCHAR(50) UNIQUE, department VARCHAR(100), position VARCHAR(100),
+        face_registered BOOLEAN, created_at DATETIME)""",
+    """CREATE TABLE attendance (
+        id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES user(id), employee_id VARCHAR(50),
+        full_name VARCHAR(100), check_in DATETIME, check_out DATETIME, time_lam NUMERIC(5, 2),
+        date DATE, status VARCHAR(20), check_in_image VARCHAR(200), check_out_image VARCHAR(200),
+        department VARCHAR(100), position VARCHAR(100), luong NUMERIC(10, 2))""",
+]
+
+QUERIES = {
+    'recognition (employee_id, date)':
+        ("SELECT * FROM attendance WHERE employee_id = ? AND date = ? LIMIT 1", 'emp_day'),
+    'dashboard count(date)':
+        ("SELECT COUNT(*) FROM attendance WHERE date = ?", 'day'),
+    'view_attendance order by check_in':
+        ("SELECT * FROM attendance WHERE date = ? ORDER BY check_in DESC", 'day'),
+    'recent 5 by check_in':
+        ("SELECT * FROM attendance ORDER BY check_in DESC LIMIT 5", None),
+    'employee history':
+        ("SELECT * FROM attendance WHERE employee_id = ? ORDER BY date DESC LIMIT 7", 'emp'),
+}
+
+
+def build(path, rows, employees):
+    conn = sqlite3.connect(path)
+    for ddl in LEGACY_SCHEMA:
+        conn.execute(ddl)
+    conn.executemany(
+        "INSERT INTO user (id, username, password_hash, role, full_name, salary, employee_id) "
+        "VALUES (?, ?, 'x', 'employee', ?, 50000, ?)",
+        [(i, f"u{i}", f"User {i}", f"EMP{i:05d}") for i in range(1, employees + 1)]
+    )
+    days = max(1, rows // employees)
+    start_day = date.today() - timedelta(days=days)
+
+    def generate():
+        n = 0
+        for d in range(days):
+            day = start_day + timedelta(days=d)
+            for e in range(1, employees + 1):
+                if n >= rows:
+                    return
+                check_in = datetime.combine(day, datetime.min.time()) + timedelta(
+                    hours=8, minutes=random.randint(0, 90))
+                yield (e, f"EMP{e:05d}", f"User {e}", check_in.isoformat(' '),
+                       day.isoformat(), 'present', 'IT')
+                n += 1
+
+    conn.executemany(
+        "INSERT INTO attendance (user_id, employee_id, full_name, check_in, date, status, department) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", generate()
+    )
+    conn.commit()
+    conn.close()
+    return start_day, days
+
+
+def bench(path, start_day, days, employees, repeat):
+    conn = sqlite3.connect(path)
+    results = {}
+    for name, (sql, kind) in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            day = (start_day + timedelta(days=random.randrange(days))).isoformat()
+            emp = f"EMP{random.randint(1, employees):05d}"
+            params = {'emp_day': (emp, day), 'day': (day,), 'emp': (emp,), None: ()}[kind]
+            t = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - t)
+        timings.sort()
+        results[name] = timings[len(timings) // 2] * 1000
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index bảng attendance")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", help="Đường dẫn file database tạm")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    print(f"Tạo {args.rows:,} bản ghi điểm danh tại {path}...")
+    t = time.perf_counter()
+    start_day, days = build(path, args.rows, args.employees)
+    print(f"  xong trong {time.perf_counter() - t:.1f}s")
+
+    before = bench(path, start_day, days, args.employees, args.repeat)
+
+    t = time.perf_counter()
+    run_migrations(create_engine(f"sqlite:///{path}"))
+    print(f"Migration xong trong {time.perf_counter() - t:.1f}s")
+
+    after = bench(path, start_day, days, args.employees, args.repeat)
+
+    print(f"\n{'Truy vấn (median ms)':40} {'trước':>10} {'sau':>10} {'x':>8}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:40} {before[name]:10.2f} {after[name]:10.3f} {speedup:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark tra cứu lịch sử ChatAI: LIKE '%query%' (cách cũ) so với FTS5 (check_history).
+
+Tạo database tạm với --rows hội thoại sinh ngẫu nhiên (trigger đánh index FTS5 khi
+insert), rồi đo độ trễ tra cứu với câu hỏi đã có và câu hỏi chưa có.
+
+Chạy: python check_acc/bench_chat_history.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Search_OpenAI.database import DatabaseManager
+
+WORDS = (
+    "giá vàng hôm nay thời tiết hà nội ngày mai tin tức công nghệ ai phần mềm chứng khoán "
+    "cổ phiếu bitcoin học bài tập kiến thức giải thích lịch thi đấu bóng đá tỷ giá đô la "
+    "lãi suất ngân hàng du lịch đà nẵng món ăn ngon cách nấu phở sức khỏe tập thể dục "
+    "điện thoại mới laptop giá rẻ xe máy điện ô tô giao thông kẹt xe sân bay chuyến bay"
+).split()
+
+LEGACY_QUERY = "SELECT answer FROM conversations WHERE question LIKE ? LIMIT 1"
+
+
+def make_question(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))) + f' {rng.randint(0, 10**6)}'
+
+
+def fill(db, rows, batch=50000):
+    rng = random.Random(42)
+    questions = []
+    started = time.perf_counter()
+    done = 0
+    while done < rows:
+        size = min(batch, rows - done)
+        chunk = [(make_question(rng), f'câu trả lời {done + i}', 'search') for i in range(size)]
+        with db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO conversations (question, answer, source) VALUES (?, ?, ?)", chunk
+            )
+        questions.extend(q for q, _, _ in rng.sample(chunk, min(20, size)))
+        done += size
+        print(f"\r  đã tạo {done}/{rows} hội thoại", end='', flush=True)
+    print(f"\n  insert + index: {time.perf_counter() - started:.1f}s")
+    return questions
+
+
+def measure(fn, queries):
+    latencies = []
+    hits = 0
+    for query in queries:
+        started = time.perf_counter()
+        if fn(query):
+            hits += 1
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'hits': hits,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--legacy-queries', type=int, default=10, help='Số truy vấn LIKE (chậm)')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_chat.db')
+    db = DatabaseManager(db_path)
+    print(f"Tạo {args.rows} hội thoại tại {db_path}")
+    stored = fill(db, args.rows)
+
+    rng = random.Random(7)
+    existing = [q for q in rng.sample(stored, min(args.queries, len(stored)))]
+    missing = [make_question(rng) + ' không tồn tại' for _ in range(args.queries)]
+
+    def legacy(query):
+        return db._query(LEGACY_QUERY, (f'%{query}%',)).fetchone()
+
+    print(f"\n{'':30}{'p50 (ms)':>10}{'p95 (ms)':>10}{'tìm thấy':>10}")
+    for label, fn, queries in (
+        ('FTS5 - câu hỏi đã có', db.check_history, existing),
+        ('FTS5 - câu hỏi mới', db.check_history, missing),
+        ('LIKE - câu hỏi đã có', legacy, existing[:args.legacy_queries]),
+        ('LIKE - câu hỏi mới', legacy, missing[:args.legacy_queries]),
+    ):
+        result = measure(fn, queries)
+        print(f"{label:30}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['hits']:>6}/{len(queries)}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark embedding câu hỏi ChatAI: mỗi request một lần embed_query trong thread
+pool (cách cũ) so với EmbeddingService (cache LRU + gộp lô).
+
+Gửi --requests câu hỏi đồng thời theo từng đợt --concurrency, trong đó khoảng
+--repeat phần là câu hỏi lặp lại. Mặc định dùng model all-MiniLM-L6-v2 thật;
+--fake-ms mô phỏng model với chi phí cố định mỗi lần forward (không cần tải model).
+
+Chạy: python check_acc/bench_embeddings.py --requests 512 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+
+from Search_OpenAI.embedding_service import EmbeddingService
+
+WORDS = (
+    "giá vàng hôm nay thời tiết hà nội ngày mai tin tức công nghệ ai phần mềm chứng khoán "
+    "cổ phiếu bitcoin học bài tập kiến thức giải thích lịch thi đấu bóng đá tỷ giá đô la"
+).split()
+
+
+class SlowFakeEmbeddings(Embeddings):
+    """Model giả: mỗi lần forward tốn per_call_ms + per_text_ms * số câu"""
+
+    def __init__(self, per_call_ms, per_text_ms, dim=384):
+        self.per_call = per_call_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        time.sleep(self.per_call + self.per_text * len(texts))
+        return [[float(hash(text) % 1000)] * self.dim for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_model(args):
+    if args.fake_ms is not None:
+        return SlowFakeEmbeddings(args.fake_ms, args.fake_ms / 10)
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name="all-MiniLM-L6-v2",
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+def make_queries(count, repeat):
+    rng = random.Random(42)
+    unique = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))) + f' {i}' for i in range(count)]
+    return [rng.choice(unique[:max(1, i)]) if rng.random() < repeat else unique[i] for i in range(count)]
+
+
+async def run(embed, queries, concurrency):
+    latencies = []
+
+    async def one(query):
+        started = time.perf_counter()
+        await embed(query)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), concurrency):
+        await asyncio.gather(*(one(q) for q in queries[start:start + concurrency]))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'qps': len(queries) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=512)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--repeat', type=float, default=0.3, help='Tỉ lệ câu hỏi lặp lại')
+    parser.add_argument('--fake-ms', type=float, default=None, help='Dùng model giả, ms mỗi lần forward')
+    args = parser.parse_args()
+
+    model = load_model(args)
+    queries = make_queries(args.requests, args.repeat)
+    model.embed_query("khởi động model")
+
+    async def legacy(query):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, model.embed_query, query)
+
+    service = EmbeddingService(model)
+
+    print(f"{args.requests} câu hỏi, {args.concurrency} đồng thời, ~{args.repeat:.0%} lặp lại")
+    print(f"{'':28}{'câu/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for label, embed in (('embed_query từng câu', legacy), ('EmbeddingService', service.aembed_query)):
+        result = asyncio.run(run(embed, queries, args.concurrency))
+        print(f"{label:28}{result['qps']:>10.0f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+    stats = service.get_stats()
+    print(f"Service: {stats['batches']} lô, trung bình {stats['avg_batch_size']} câu/lô, "
+          f"cache hit {stats['cache_hit_ratio']:.0%}, gộp trùng {stats['coalesced']}, "
+          f"{stats['texts_per_second']} câu/s trong model")
+    service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Kiểm tra /chat/ask/stream với LLM giả (không cần Groq/Tavily/HuggingFace).
+
+Dựng TmeBrain với GenericFakeChatModel (trả từng token theo khoảng trắng), database
+tạm và SearchManager giả; gọi endpoint stream bằng Flask test client, in các event
+SSE, kiểm tra hội thoại đã được lưu vào lịch sử và các stream trùng câu hỏi chạy
+đồng thời chỉ gọi LLM một lần.
+
+Chạy: python check_acc/chat_stream_fake.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from itertools import cycle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_login import LoginManager
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from Search_OpenAI.brain import TmeBrain
+from Search_OpenAI.database import DatabaseManager
+from Search_OpenAI.search_cache import TieredSearchCache
+from Search_OpenAI.semantic_cache import SemanticCache
+from Search_OpenAI.single_flight import SingleFlight, normalize_query
+from routes.chat import chat_bp, set_brain
+
+ANSWER = "Chào bạn, hôm nay trời Hà Nội nắng nhẹ, nhiệt độ khoảng 28 độ."
+
+
+class CountingLLM:
+    """Bọc model giả: đếm số lần gọi, mỗi token chờ delay giây (giả lập LLM thật)"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.calls = 0
+        self.delay = 0.0
+
+    async def astream(self, prompt):
+        self.calls += 1
+        async for chunk in self.llm.astream(prompt):
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        return await self.llm.ainvoke(prompt)
+
+
+class FakeSearchManager:
+    def __init__(self):
+        self.flight = SingleFlight('search')
+
+    async def search(self, query):
+        return await self.flight.run(normalize_query(query), self._search, query)
+
+    async def _search(self, query):
+        await asyncio.sleep(0.01)
+        return f"Kết quả tìm kiếm giả cho: {query}"
+
+
+class FakeNotifier:
+    async def send_error(self, error, context=""):
+        print(f"  [notifier] {context}: {error}")
+
+
+class FakeCleanup:
+    def needs_cleanup(self):
+        return False
+
+
+def make_brain(db_path):
+    brain = TmeBrain.__new__(TmeBrain)
+    brain.llm = CountingLLM(GenericFakeChatModel(messages=cycle([AIMessage(content=ANSWER)])))
+    brain.search_manager = FakeSearchManager()
+    brain.database = DatabaseManager(db_path)
+    brain.search_cache = TieredSearchCache(brain.database)
+    brain.embeddings = None
+    brain.vectorstore = None
+    brain.semantic_cache = SemanticCache()
+    brain._vector_flight = SingleFlight('vectorstore')
+    brain._llm_flight = SingleFlight('llm')
+    brain.notifier = FakeNotifier()
+    brain.cleanup_service = FakeCleanup()
+    brain._request_count = 0
+    brain._cleanup_interval = 100
+    return brain
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='check', LOGIN_DISABLED=True)
+    LoginManager(app)
+    app.register_blueprint(chat_bp)
+    return app
+
+
+def read_events(client, query, session_id=None):
+    started = time.perf_counter()
+    first_token = None
+    events = []
+    response = client.post('/chat/ask/stream', json={'query': query, 'session_id': session_id},
+                           buffered=False)
+    assert response.status_code == 200, response.status_code
+    assert response.mimetype == 'text/event-stream', response.mimetype
+    for line in response.response:
+        line = line.decode('utf-8') if isinstance(line, bytes) else line
+        for chunk in line.split('\n\n'):
+            if not chunk.startswith('data: '):
+                continue
+            event = json.loads(chunk[6:])
+            if event['type'] == 'token' and first_token is None:
+                first_token = time.perf_counter() - started
+            events.append(event)
+    total = time.perf_counter() - started
+    return events, first_token, total
+
+
+def main():
+    db_path = os.path.join(tempfile.mkdtemp(), 'chat_stream.db')
+    brain = make_brain(db_path)
+    set_brain(brain)
+    client = make_app().test_client()
+    query = "Thời tiết Hà Nội hôm nay thế nào?"
+    ok = True
+
+    events, first_token, total = read_events(client, query)
+    tokens = [e['text'] for e in events if e['type'] == 'token']
+    done = events[-1]
+    print(f"Lần 1: {len(tokens)} token, token đầu sau {first_token * 1000:.1f} ms, "
+          f"xong sau {total * 1000:.1f} ms")
+    print(f"  event: {[e['type'] for e in events[:4]]} ... {done['type']}")
+    print(f"  câu trả lời: {done.get('answer')}")
+    ok &= events[0]['type'] == 'session' and done['type'] == 'done'
+    ok &= len(tokens) > 1 and ''.join(tokens).strip() == ANSWER == done['answer']
+
+    brain.search_cache.flush()
+    saved = brain.database.check_history(query)
+    print(f"  đã lưu lịch sử: {saved}")
+    ok &= saved is not None and saved.endswith(ANSWER)
+
+    # Lần 2 cùng session: trả từ lịch sử, một token duy nhất
+    session_id = events[0]['session_id']
+    events, _, total = read_events(client, query, session_id)
+    print(f"Lần 2 (lịch sử): {[e['type'] for e in events]} sau {total * 1000:.1f} ms")
+    ok &= [e['type'] for e in events] == ['session', 'token', 'done'] and events[0]['session_id'] == session_id
+
+    # Nhiều người hỏi cùng câu cùng lúc: một lần gọi LLM, ai cũng nhận đủ token
+    brain.llm.calls, brain.llm.delay = 0, 0.01
+    query = "Giá vàng hôm nay bao nhiêu?"
+    barrier = threading.Barrier(4)
+    results = []
+
+    def one():
+        barrier.wait()
+        results.append(read_events(make_app().test_client(), query)[0])
+
+    threads = [threading.Thread(target=one) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    answers = [''.join(e['text'] for e in events if e['type'] == 'token').strip() for events in results]
+    stats = brain._llm_flight.get_stats()
+    print(f"4 stream đồng thời: {brain.llm.calls} lần gọi LLM, single-flight {stats}")
+    ok &= brain.llm.calls == 1 and stats['shared'] == 3 and answers == [ANSWER] * 4
+
+    response = client.post('/chat/ask/stream', json={'query': '  '})
+    print(f"Câu hỏi rỗng: HTTP {response.status_code}")
+    ok &= response.status_code == 400
+
+    brain.cleanup()
+    print("OK" if ok else "FAIL")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
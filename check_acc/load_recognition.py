@@ -0,0 +1,127 @@
+"""
+Load test endpoint nhận diện: đo throughput khi tăng số worker gunicorn.
+
+Với mỗi giá trị --workers, script khởi động gunicorn (gunicorn.conf.py) trên cổng
+riêng, gửi ảnh tới /attendance/recognize từ nhiều thread trong --duration giây và in
+request/giây, độ trễ p50/p95. Giới hạn theo client (admission.py) được nới rộng vì
+mọi request đều đến từ cùng một IP.
+
+Chạy: python check_acc/load_recognition.py --image faces/NV001.jpg --workers 1,2,4
+"""
+import argparse
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers, port):
+    env = dict(os.environ)
+    env.update({
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_ACCESS_LOG': '/dev/null',
+        'ADMISSION_KIOSK_RATE': '1000000',
+        'ADMISSION_KIOSK_BURST': '1000000',
+        'ADMISSION_KIOSK_WAIT': '30',
+    })
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}/attendance'
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError('gunicorn không khởi động được')
+
+
+def run_load(url, body, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(request, timeout=60).read()
+                ok = True
+            except urllib.error.HTTPError as e:
+                # 400 (không nhận diện được) vẫn là một lần nhận diện hoàn chỉnh
+                ok = e.code < 500 and e.code != 429
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors[0],
+        'rps': count / duration,
+        'p50_ms': latencies[count // 2] * 1000 if count else 0,
+        'p95_ms': latencies[int(count * 0.95)] * 1000 if count else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', required=True, help='Ảnh JPEG có khuôn mặt')
+    parser.add_argument('--workers', default='1,2,4', help='Danh sách số worker, vd: 1,2,4')
+    parser.add_argument('--concurrency', type=int, default=0, help='Số client (mặc định 2 x worker)')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image = 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii')
+    body = json.dumps({'image': image}).encode('utf-8')
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        process = start_server(workers, args.port)
+        try:
+            url = f'http://127.0.0.1:{args.port}/attendance/recognize'
+            run_load(url, body, workers, 3)    # warm-up
+            result = run_load(url, body, args.concurrency or workers * 2, args.duration)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(60)
+        results.append((workers, result))
+        print(f"workers={workers}: {result['rps']:.1f} req/s, p50 {result['p50_ms']:.0f} ms, "
+              f"p95 {result['p95_ms']:.0f} ms, lỗi {result['errors']}")
+
+    base = results[0][1]['rps'] or 1
+    print('\nworkers  req/s   tăng tốc')
+    for workers, result in results:
+        print(f"{workers:>7}  {result['rps']:>6.1f}  x{result['rps'] / base:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Kiểm tra gửi email hàng loạt qua pool SMTP với máy chủ SMTP giả lập (aiosmtpd).
+
+Cần: pip install aiosmtpd
+Chạy: python check_acc/smtp_broadcast.py --recipients 500 --pool 4 --rate 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller
+
+
+class CountingHandler:
+    """Đếm email và số phiên SMTP, từ chối địa chỉ có chữ 'reject'"""
+
+    def __init__(self):
+        self.messages = 0
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if 'reject' in address:
+            return '550 No such mailbox'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.messages += 1
+            self.sessions.add(id(session))
+        return '250 Message accepted'
+
+
+def run(recipients, pool_size, rate, port):
+    handler = CountingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+
+    from config import email
+    email.EMAIL_NAME = 'noreply@example.com'
+    email.SMTP_HOST = '127.0.0.1'
+    email.SMTP_PORT = port
+    email.SMTP_STARTTLS = False
+    email.SMTP_AUTH = False
+    email.SMTP_POOL_SIZE = pool_size
+    email.SMTP_RATE_PER_SECOND = rate
+
+    from routes.annou import broadcast
+
+    addresses = [f'nv{i}@example.com' for i in range(recipients)] + ['reject@example.com']
+    started = time.perf_counter()
+    result = broadcast(
+        addresses, 'Thông báo', 'Nội dung kiểm thử',
+        progress=lambda sent, failed, total: print(f"  {sent + failed}/{total} (lỗi {failed})")
+    )
+    elapsed = time.perf_counter() - started
+    controller.stop()
+
+    print(f"Gửi {result['sent']}/{result['total']} email trong {elapsed:.2f}s "
+          f"({result['sent'] / elapsed:.0f} email/s)")
+    print(f"Máy chủ nhận {handler.messages} email qua {len(handler.sessions)} phiên SMTP")
+    failed = [r for r in result['recipients'] if r['status'] == 'failed']
+    assert [r['email'] for r in failed] == ['reject@example.com'], failed
+    assert handler.messages == recipients
+    print("OK")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipients', type=int, default=200)
+    parser.add_argument('--pool', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=0, help='email/giây, 0 = không giới hạn')
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+    run(args.recipients, args.pool, args.rate, args.port)
@@ -0,0 +1,112 @@
+"""
+Stress test DatabaseManager (Search_OpenAI): nhiều session chat đồng thời.
+
+Mỗi thread mô phỏng request /chat/ask với chuỗi thao tác database của ask_tme
+(tạo session + thêm câu hỏi, kiểm tra lịch sử/cache, lưu cache + hội thoại + topic).
+Thêm --coroutines session chạy xen kẽ trên một event loop (như background loop).
+Cuối cùng kiểm tra số bản ghi và lịch sử câu hỏi của từng session.
+
+Chạy: python check_acc/stress_chat_db.py --threads 32 --sessions 4 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Search_OpenAI.database import DatabaseManager
+
+
+def ask(db, session_id, round_no):
+    """Các thao tác database của một lần ask_tme"""
+    question = f'{session_id} câu hỏi {round_no}'
+    with db.transaction():
+        db.get_or_create_session(session_id)
+        db.add_question_to_session(session_id, question)
+    db.check_history(question)
+    db.check_cache(question)
+    with db.transaction():
+        db.save_cache(question, f'kết quả {round_no}')
+        db.save_conversation(question, f'trả lời {round_no}', 'search')
+        db.update_session_topic(session_id, 'công nghệ')
+
+
+async def ask_async(db, session_id, rounds):
+    for round_no in range(rounds):
+        ask(db, session_id, round_no)
+        await asyncio.sleep(0)  # nhường cho coroutine khác (như khi chờ LLM)
+
+
+def run(threads, sessions, rounds, coroutines):
+    db_path = os.path.join(tempfile.mkdtemp(), 'stress_chat.db')
+    db = DatabaseManager(db_path)
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(thread_no):
+        try:
+            for round_no in range(rounds):
+                for s in range(sessions):
+                    started = time.perf_counter()
+                    ask(db, f't{thread_no}-s{s}', round_no)
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(repr(e))
+
+    def loop_worker():
+        async def main():
+            await asyncio.gather(*(ask_async(db, f'c{i}', rounds) for i in range(coroutines)))
+        try:
+            asyncio.run(main())
+        except Exception as e:
+            errors.append(repr(e))
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    pool.append(threading.Thread(target=loop_worker))
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    session_ids = [f't{t}-s{s}' for t in range(threads) for s in range(sessions)]
+    session_ids += [f'c{i}' for i in range(coroutines)]
+    expected = len(session_ids) * rounds
+    conversations = db._query("SELECT COUNT(*) FROM conversations").fetchone()[0]
+    cache = db._query("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+    bad_sessions = [
+        sid for sid in session_ids
+        if len(db.get_session(sid).last_questions) != min(rounds, 10)
+    ]
+    db.close()
+
+    latencies.sort()
+    print(f"{threads} thread x {sessions} session + {coroutines} coroutine, {rounds} lượt: "
+          f"{expected} request trong {elapsed:.2f}s ({expected / elapsed:.0f} request/s)")
+    if latencies:
+        print(f"Độ trễ p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"Hội thoại: {conversations}/{expected}, cache: {cache}/{expected}, "
+          f"session sai lịch sử: {len(bad_sessions)}, lỗi: {len(errors)}")
+    for error in errors[:5]:
+        print(f"  {error}")
+    ok = not errors and not bad_sessions and conversations == expected and cache == expected
+    print("OK" if ok else "FAIL")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--sessions', type=int, default=4, help='Số session mỗi thread')
+    parser.add_argument('--rounds', type=int, default=20, help='Số câu hỏi mỗi session')
+    parser.add_argument('--coroutines', type=int, default=16, help='Số session chạy trên event loop')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.threads, args.sessions, args.rounds, args.coroutines) else 1)
@@ -0,0 +1,97 @@
+"""
+Stress test check-in đồng thời: nhiều thread cùng check-in cho cùng nhóm nhân viên,
+kiểm tra không có bản ghi điểm danh trùng (employee_id, date).
+
+Chạy: python check_acc/stress_checkin.py --threads 32 --employees 20 --rounds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+def run(threads, employees, rounds):
+    db_path = os.path.join(tempfile.mkdtemp(), 'stress.db')
+    Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+
+    from app import create_app, init_database
+    from models import db, User, Attendance
+    from routes.attendance import _process_check
+
+    app = create_app()
+    init_database(app)
+
+    with app.app_context():
+        for i in range(employees):
+            user = User(
+                username=f"stress_{i}",
+                role="employee",
+                full_name=f"Stress {i}",
+                salary=Decimal("50000.00"),
+                employee_id=f"ST{i:04d}",
+            )
+            user.set_password("123456")
+            db.session.add(user)
+        db.session.commit()
+        user_ids = [u.id for u in User.query.all()]
+
+    barrier = threading.Barrier(threads)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def worker(index):
+        barrier.wait()
+        with app.app_context():
+            for r in range(rounds):
+                user_id = user_ids[(index + r) % len(user_ids)]
+                user = db.session.get(User, user_id)
+                try:
+                    result = _process_check(user, datetime.now(), 'uploads/stress.jpg', 100.0)
+                    db.session.commit()
+                    key = result['type']
+                except Exception as e:
+                    db.session.rollback()
+                    key = f"error:{type(e).__name__}"
+                with lock:
+                    outcomes[key] += 1
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        rows = db.session.query(Attendance.employee_id, Attendance.date).all()
+    duplicates = [k for k, v in Counter(rows).items() if v > 1]
+
+    total = threads * rounds
+    print(f"{total} check-in trong {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    for key, count in sorted(outcomes.items()):
+        print(f"  {key}: {count}")
+    print(f"Số bản ghi: {len(rows)} / {employees} nhân viên")
+    if duplicates:
+        print(f"LỖI: {len(duplicates)} bản ghi trùng: {duplicates[:5]}")
+        return 1
+    print("oke - không có bản ghi trùng")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test check-in đồng thời")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--employees", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(run(args.threads, args.employees, args.rounds))
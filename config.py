@@ -7,18 +7,50 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'fallback-secret-key-change-in-production')
     SQLALCHEMY_DATABASE_URI = 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite: chờ tối đa bao lâu khi database đang bị khóa ghi (ms)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '15000'))
+    # Số proxy tin cậy phía trước app (ngrok, nginx, Docker...): lấy IP client từ
+    # X-Forwarded-For thay vì IP của proxy. 0 nếu client kết nối trực tiếp.
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+        'connect_args': {
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            'check_same_thread': False,
+        },
+    }
     UPLOAD_FOLDER = 'uploads'
     FACES_FOLDER = 'faces'
+    # Thumbnail ảnh khuôn mặt/check-in tạo khi cần (xem images.py)
+    THUMBNAIL_FOLDER = os.getenv('THUMBNAIL_FOLDER', 'thumbnails')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  
+    # Phân trang keyset cho lịch sử điểm danh và danh sách nhân viên
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', '50'))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '500'))
 
 class email:
     EMAIL_NAME = os.getenv("EMAIL_NAME")
     EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+    # Máy chủ SMTP (có thể trỏ tới SMTP giả lập như aiosmtpd khi kiểm thử)
+    SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    SMTP_AUTH = os.getenv("SMTP_AUTH", "true").lower() == "true"
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+    # Số kết nối SMTP dùng chung (cũng là số luồng gửi song song)
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+    # Mở lại kết nối sau bấy nhiêu email (nhiều máy chủ giới hạn số email mỗi phiên)
+    SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+    SMTP_RATE_PER_SECOND = float(os.getenv("SMTP_RATE_PER_SECOND", "10"))
+    SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "50"))
     
     
-WORK_START_TIME = os.getenv('WORK_START_TIME')
-WORK_LATE_TIME = os.getenv('WORK_LATE_TIME')
-WORK_END_TIME = os.getenv('WORK_END_TIME')
+# Giờ làm việc (WORK_*_TIME trong .env) chỉ dùng để khởi tạo bảng app_setting
+# lần đầu (migration 5); đọc giá trị hiện tại qua app_settings.get_settings()
 
 os.makedirs('faces', exist_ok=True)
 os.makedirs('uploads', exist_ok=True)
@@ -0,0 +1,187 @@
+"""
+Cache thông tin nhân viên trong process (read-through, LRU) cho luồng nhận diện và load_user.
+
+Lưu snapshot bất biến thay vì đối tượng ORM để dùng được an toàn giữa các request/thread.
+Các route sửa User phải gọi invalidate() sau khi commit: hàm này tăng bộ đếm
+change_sequence 'employees'; mỗi worker process kiểm tra bộ đếm tối đa mỗi
+EMPLOYEE_VERSION_TTL giây và xóa cache khi phiên bản thay đổi, nên user bị xóa
+hoặc hạ quyền mất quyền truy cập ở mọi worker sau tối đa EMPLOYEE_VERSION_TTL giây.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from models import db, User, ChangeSequence
+
+EMPLOYEE_CACHE_SIZE = int(os.getenv('EMPLOYEE_CACHE_SIZE', '5000'))
+EMPLOYEE_CACHE_TTL = float(os.getenv('EMPLOYEE_CACHE_TTL', '300'))
+EMPLOYEE_VERSION_TTL = float(os.getenv('EMPLOYEE_VERSION_TTL', '1.0'))
+
+VERSION_NAME = 'employees'
+
+_FIELDS = (
+    'id', 'username', 'role', 'full_name', 'email', 'salary', 'employee_id',
+    'department', 'position', 'face_registered', 'created_at'
+)
+
+
+class EmployeeRecord(UserMixin):
+    """Snapshot chỉ đọc của User (không gồm password_hash), dùng được làm current_user"""
+    __slots__ = _FIELDS
+
+    def __init__(self, user):
+        for field in _FIELDS:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EmployeeRecord là snapshot chỉ đọc")
+
+    def __repr__(self):
+        return f"<EmployeeRecord {self.employee_id} ({self.id})>"
+
+
+class EmployeeCache:
+    def __init__(self, max_size=EMPLOYEE_CACHE_SIZE, ttl=EMPLOYEE_CACHE_TTL,
+                 version_ttl=EMPLOYEE_VERSION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self._by_id = OrderedDict()       # id -> (record, expires_at)
+        self._id_by_employee = {}         # employee_id -> id
+        self._lock = threading.Lock()
+        self._version = None              # bộ đếm 'employees' lúc cache được nạp
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.version_clears = 0
+
+    def _check_version(self):
+        """Xóa cache nếu process khác đã sửa User (đọc bộ đếm tối đa mỗi version_ttl giây)"""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_ttl:
+            return
+        version = db.session.query(ChangeSequence.value).filter_by(name=VERSION_NAME).scalar() or 0
+        with self._lock:
+            self._version_checked_at = now
+            if version != self._version:
+                if self._version is not None:
+                    self._by_id.clear()
+                    self._id_by_employee.clear()
+                    self.version_clears += 1
+                self._version = version
+
+    def _get_cached(self, user_id):
+        entry = self._by_id.get(user_id)
+        if entry is None:
+            return None
+        record, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(user_id)
+            return None
+        self._by_id.move_to_end(user_id)
+        return record
+
+    def _remove(self, user_id):
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None:
+            self._id_by_employee.pop(entry[0].employee_id, None)
+
+    def _put(self, user):
+        record = EmployeeRecord(user)
+        with self._lock:
+            self._remove(record.id)
+            self._by_id[record.id] = (record, time.monotonic() + self.ttl)
+            if record.employee_id:
+                self._id_by_employee[record.employee_id] = record.id
+            while len(self._by_id) > self.max_size:
+                oldest_id = next(iter(self._by_id))
+                self._remove(oldest_id)
+        return record
+
+    def get_by_id(self, user_id):
+        """Lấy nhân viên theo User.id, truy vấn database nếu chưa có trong cache"""
+        self._check_version()
+        with self._lock:
+            record = self._get_cached(user_id)
+            if record is not None:
+                self.hits += 1
+                return record
+            self.misses += 1
+        user = db.session.get(User, user_id)
+        return self._put(user) if user else None
+
+    def get_by_employee_id(self, employee_id):
+        """Lấy nhân viên theo mã nhân viên, truy vấn database nếu chưa có trong cache"""
+        self._check_version()
+        with self._lock:
+            user_id = self._id_by_employee.get(employee_id)
+            record = self._get_cached(user_id) if user_id is not None else None
+            if record is not None:
+                self.hits += 1
+                return record
+            self.misses += 1
+        user = User.query.filter_by(employee_id=employee_id).first()
+        return self._put(user) if user else None
+
+    def get_many_by_employee_id(self, employee_ids):
+        """Lấy nhiều nhân viên, gom các mã chưa có trong cache vào một truy vấn"""
+        found = {}
+        missing = []
+        self._check_version()
+        with self._lock:
+            for employee_id in employee_ids:
+                user_id = self._id_by_employee.get(employee_id)
+                record = self._get_cached(user_id) if user_id is not None else None
+                if record is not None:
+                    self.hits += 1
+                    found[employee_id] = record
+                else:
+                    self.misses += 1
+                    missing.append(employee_id)
+        if missing:
+            for user in User.query.filter(User.employee_id.in_(missing)).all():
+                found[user.employee_id] = self._put(user)
+        return found
+
+    def invalidate(self, user_id=None, employee_id=None):
+        """Xóa một nhân viên khỏi cache và báo các process khác (gọi sau khi thêm/sửa/xóa User)"""
+        with self._lock:
+            if user_id is None and employee_id is not None:
+                user_id = self._id_by_employee.get(employee_id)
+            if user_id is not None:
+                self._remove(user_id)
+        updated = ChangeSequence.query.filter_by(name=VERSION_NAME).update(
+            {'value': ChangeSequence.value + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(ChangeSequence(name=VERSION_NAME, value=1))
+        db.session.commit()
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._id_by_employee.clear()
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._by_id),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'version': self._version,
+                'version_clears': self.version_clears,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+# Singleton instance
+_employee_cache = None
+
+def get_employee_cache() -> EmployeeCache:
+    global _employee_cache
+    if _employee_cache is None:
+        _employee_cache = EmployeeCache()
+    return _employee_cache
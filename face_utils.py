@@ -4,46 +4,156 @@ import base64
 import numpy as np
 from PIL import Image
 import io
+import threading
+import time
 import face_recognition
 from datetime import datetime
+from job_queue import enqueue, job_handler
+from app_settings import get_settings
+from models import db, ChangeSequence
 
 # Cache lưu face encodings để tăng tốc độ
 known_face_encodings = []
 known_face_ids = []
+_known_face_matrix = None
+
+# Ngưỡng khoảng cách để coi là cùng một người
+FACE_MATCH_TOLERANCE = 0.5
+# Ảnh nhóm cần độ phân giải cao hơn để bắt được các khuôn mặt ở xa
+MULTI_FACE_MAX_SIZE = 800
+
+# Job cập nhật file encodings tăng bộ đếm change_sequence 'faces'; mỗi worker
+# kiểm tra bộ đếm tối đa mỗi FACES_VERSION_TTL giây và load lại gallery khi đổi
+FACES_VERSION_TTL = float(os.getenv('FACES_VERSION_TTL', '1.0'))
+VERSION_NAME = 'faces'
+
+_gallery_lock = threading.Lock()
+_gallery = {'version': None, 'checked_at': 0.0}
 
 
 def load_known_faces():
-    """Load tất cả face encodings từ file vào memory"""
+    """Load tất cả face encodings từ file vào memory (cần app context)"""
     global known_face_encodings, known_face_ids
-    known_face_encodings = []
-    known_face_ids = []
+    # Đọc phiên bản trước file: job ghi file xong mới tăng bộ đếm, nên thay đổi
+    # xảy ra sau thời điểm này sẽ được load lại ở lần kiểm tra tiếp theo
+    _gallery['version'] = _current_gallery_version()
+    _gallery['checked_at'] = time.monotonic()
     
     encoding_file = os.path.join('faces', 'encodings.pkl')
-    if os.path.exists(encoding_file):
-        try:
-            with open(encoding_file, 'rb') as f:
-                data = pickle.load(f)
-                known_face_encodings = data.get('encodings', [])
-                known_face_ids = data.get('employee_ids', [])
-            print(f"Đã load {len(known_face_encodings)} khuôn mặt từ database")
-        except Exception as e:
-            print(f"Lỗi load encodings: {e}")
+    if not os.path.exists(encoding_file):
+        known_face_encodings, known_face_ids = [], []
+        _invalidate_known_matrix()
+        return
+    try:
+        with open(encoding_file, 'rb') as f:
+            data = pickle.load(f)
+        # Gán cả hai list một lần để request đang nhận diện không thấy gallery rỗng
+        known_face_encodings = data.get('encodings', [])
+        known_face_ids = data.get('employee_ids', [])
+        _invalidate_known_matrix()
+        print(f"Đã load {len(known_face_encodings)} khuôn mặt từ database")
+    except Exception as e:
+        print(f"Lỗi load encodings: {e}")
+
+
+def _current_gallery_version():
+    return db.session.query(ChangeSequence.value).filter_by(name=VERSION_NAME).scalar() or 0
+
+
+def _bump_gallery_version():
+    """Báo các process khác file encodings đã đổi (gọi sau khi ghi file)"""
+    updated = ChangeSequence.query.filter_by(name=VERSION_NAME).update(
+        {'value': ChangeSequence.value + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(ChangeSequence(name=VERSION_NAME, value=1))
+    db.session.commit()
+
+
+def _check_gallery_version():
+    """Load lại gallery nếu process khác đã cập nhật file encodings (tối đa mỗi FACES_VERSION_TTL giây)"""
+    if time.monotonic() - _gallery['checked_at'] < FACES_VERSION_TTL:
+        return
+    with _gallery_lock:
+        if time.monotonic() - _gallery['checked_at'] < FACES_VERSION_TTL:
+            return
+        version = _current_gallery_version()
+        _gallery['checked_at'] = time.monotonic()
+        if version != _gallery['version']:
+            load_known_faces()
+
+
+def _write_encodings(encodings, employee_ids):
+    """Ghi file encodings (ghi file tạm rồi đổi tên để không bị đọc dở)"""
+    encoding_file = os.path.join('faces', 'encodings.pkl')
+    tmp_file = f'{encoding_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({
+            'encodings': encodings,
+            'employee_ids': employee_ids
+        }, f)
+    os.replace(tmp_file, encoding_file)
 
 
 def save_known_faces():
     """Lưu face encodings vào file"""
-    encoding_file = os.path.join('faces', 'encodings.pkl')
     try:
-        with open(encoding_file, 'wb') as f:
-            pickle.dump({
-                'encodings': known_face_encodings,
-                'employee_ids': known_face_ids
-            }, f)
+        _write_encodings(known_face_encodings, known_face_ids)
         print(f"Đã lưu {len(known_face_encodings)} khuôn mặt")
     except Exception as e:
         print(f"Lỗi lưu encodings: {e}")
 
 
+def _read_encodings():
+    encoding_file = os.path.join('faces', 'encodings.pkl')
+    if not os.path.exists(encoding_file):
+        return [], []
+    with open(encoding_file, 'rb') as f:
+        data = pickle.load(f)
+    return list(data.get('encodings', [])), list(data.get('employee_ids', []))
+
+
+# Các job cập nhật file encodings dùng chung serial_key để chạy lần lượt,
+# mỗi job đọc file hiện tại rồi áp dụng thay đổi của một nhân viên
+FACE_GALLERY_KEY = 'face_gallery'
+
+
+@job_handler('face_gallery_upsert')
+def _gallery_upsert_job(payload):
+    employee_id = payload['employee_id']
+    encodings, employee_ids = _read_encodings()
+    if employee_id in employee_ids:
+        idx = employee_ids.index(employee_id)
+        encodings.pop(idx)
+        employee_ids.pop(idx)
+    encodings.append(np.array(payload['encoding'], dtype=np.float64))
+    employee_ids.append(employee_id)
+    _write_encodings(encodings, employee_ids)
+
+    face_image_path = os.path.join('faces', f'{employee_id}.jpg')
+    with open(face_image_path, 'wb') as f:
+        f.write(base64.b64decode(payload['image']))
+    _bump_gallery_version()
+    return {'faces': len(employee_ids)}
+
+
+@job_handler('face_gallery_delete')
+def _gallery_delete_job(payload):
+    employee_id = payload['employee_id']
+    encodings, employee_ids = _read_encodings()
+    if employee_id in employee_ids:
+        idx = employee_ids.index(employee_id)
+        encodings.pop(idx)
+        employee_ids.pop(idx)
+        _write_encodings(encodings, employee_ids)
+
+    face_path = os.path.join('faces', f'{employee_id}.jpg')
+    if os.path.exists(face_path):
+        os.remove(face_path)
+    _bump_gallery_version()
+    return {'faces': len(employee_ids)}
+
+
 def encode_face_from_image(image_path):
     """Tạo face encoding từ ảnh"""
     try:
@@ -124,13 +234,16 @@ def register_face(employee_id, image_data_or_path):
         # Thêm encoding mới
         known_face_encodings.append(encoding)
         known_face_ids.append(employee_id)
+        _invalidate_known_matrix()
         
-        # Lưu vào file
-        save_known_faces()
-        
-        # Lưu ảnh gốc dưới dạng JPEG đúng chuẩn
-        face_image_path = os.path.join('faces', f'{employee_id}.jpg')
-        pil_image.save(face_image_path, 'JPEG', quality=95)
+        # Ghi file encodings và ảnh gốc (JPEG) trong job nền
+        buffer = io.BytesIO()
+        pil_image.save(buffer, 'JPEG', quality=95)
+        enqueue('face_gallery_upsert', {
+            'employee_id': employee_id,
+            'encoding': np.asarray(encoding, dtype=np.float64).tolist(),
+            'image': base64.b64encode(buffer.getvalue()).decode('ascii')
+        }, serial_key=FACE_GALLERY_KEY)
         
         return True, "Đăng ký khuôn mặt thành công"
         
@@ -138,72 +251,98 @@ def register_face(employee_id, image_data_or_path):
         return False, f"Lỗi: {str(e)}"
 
 
+def _invalidate_known_matrix():
+    """Đánh dấu ma trận gallery cần dựng lại sau khi danh sách encodings thay đổi"""
+    global _known_face_matrix
+    _known_face_matrix = None
+
+
+def _get_known_matrix():
+    """Ma trận (N, 128) của toàn bộ encodings đã đăng ký, dựng lại khi có thay đổi"""
+    global _known_face_matrix
+    if _known_face_matrix is None or len(_known_face_matrix) != len(known_face_encodings):
+        _known_face_matrix = np.asarray(known_face_encodings, dtype=np.float64).reshape(-1, 128)
+    return _known_face_matrix
+
+
+def _decode_image(image_data, max_size=400):
+    """Decode ảnh base64 thành numpy array RGB (resize để giảm RAM)"""
+    if ',' in image_data:
+        image_data = image_data.split(',')[1]
+    image_bytes = base64.b64decode(image_data)
+    
+    pil_image = Image.open(io.BytesIO(image_bytes))
+    
+    if pil_image.width > max_size or pil_image.height > max_size:
+        ratio = min(max_size / pil_image.width, max_size / pil_image.height)
+        new_size = (int(pil_image.width * ratio), int(pil_image.height * ratio))
+        pil_image = pil_image.resize(new_size, Image.LANCZOS)
+    
+    if pil_image.mode != 'RGB':
+        pil_image = pil_image.convert('RGB')
+    
+    rgb_img = np.array(pil_image, dtype=np.uint8)
+    return np.ascontiguousarray(rgb_img)
+
+
+def _detect_and_encode(rgb_img):
+    """Detect + encode tất cả khuôn mặt trong ảnh, trả về (locations, encodings, error)"""
+    # Detect faces với model HOG (nhẹ hơn CNN)
+    try:
+        face_locations = face_recognition.face_locations(rgb_img, model="hog", number_of_times_to_upsample=1)
+    except Exception as e:
+        print(f"Face detection error: {e}")
+        return None, None, "Lỗi phát hiện khuôn mặt"
+    
+    if len(face_locations) == 0:
+        return None, None, "Không phát hiện khuôn mặt"
+    
+    try:
+        face_encodings = face_recognition.face_encodings(rgb_img, face_locations, num_jitters=1)
+    except Exception as e:
+        print(f"Face encoding error: {e}")
+        return None, None, "Lỗi mã hóa khuôn mặt"
+    
+    if len(face_encodings) == 0:
+        return None, None, "Không thể nhận diện khuôn mặt"
+    
+    return face_locations, face_encodings, None
+
+
+def _batch_face_distances(face_encodings):
+    """Khoảng cách Euclid giữa M khuôn mặt và N encodings đã biết trong một phép tính ma trận (M, N)"""
+    known = _get_known_matrix()
+    probes = np.asarray(face_encodings, dtype=np.float64).reshape(-1, 128)
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab, tránh tạo mảng trung gian (M, N, 128)
+    sq = (
+        np.einsum('ij,ij->i', probes, probes)[:, None]
+        + np.einsum('ij,ij->i', known, known)[None, :]
+        - 2.0 * probes @ known.T
+    )
+    return np.sqrt(np.maximum(sq, 0.0))
+
+
 def recognize_face_from_image(image_data):
     """Nhận diện khuôn mặt từ ảnh base64"""
-    global known_face_encodings, known_face_ids
-    
+    _check_gallery_version()
     if len(known_face_encodings) == 0:
         return None, "Chưa có dữ liệu khuôn mặt nào được đăng ký"
     
     try:
-        # Decode base64 image
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
-        
-        # Đọc ảnh bằng PIL
-        pil_image = Image.open(io.BytesIO(image_bytes))
-        
-        # Resize nhỏ hơn để giảm RAM (max 400px)
-        max_size = 400
-        if pil_image.width > max_size or pil_image.height > max_size:
-            ratio = min(max_size / pil_image.width, max_size / pil_image.height)
-            new_size = (int(pil_image.width * ratio), int(pil_image.height * ratio))
-            pil_image = pil_image.resize(new_size, Image.LANCZOS)
-        
-        # Chuyển sang RGB
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
-        
-        # Chuyển thành numpy array
-        rgb_img = np.array(pil_image, dtype=np.uint8)
-        rgb_img = np.ascontiguousarray(rgb_img)
-        
-        # Detect faces với model HOG (nhẹ hơn CNN)
-        try:
-            face_locations = face_recognition.face_locations(rgb_img, model="hog", number_of_times_to_upsample=1)
-        except Exception as e:
-            print(f"Face detection error: {e}")
-            return None, "Lỗi phát hiện khuôn mặt"
+        rgb_img = _decode_image(image_data)
         
-        if len(face_locations) == 0:
-            return None, "Không phát hiện khuôn mặt"
+        _, face_encodings, error = _detect_and_encode(rgb_img)
+        if error:
+            return None, error
         
-        # Encode face
-        try:
-            face_encodings = face_recognition.face_encodings(rgb_img, face_locations, num_jitters=1)
-        except Exception as e:
-            print(f"Face encoding error: {e}")
-            return None, "Lỗi mã hóa khuôn mặt"
-        
-        if len(face_encodings) == 0:
-            return None, "Không thể nhận diện khuôn mặt"
-        
-        # So sánh với known faces
-        for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(
-                known_face_encodings, face_encoding, tolerance=0.5
-            )
-            face_distances = face_recognition.face_distance(
-                known_face_encodings, face_encoding
-            )
-            
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    confidence = 1 - face_distances[best_match_index]
-                    employee_id = known_face_ids[best_match_index]
-                    return employee_id, confidence
+        # So sánh với known faces, lấy khuôn mặt đầu tiên khớp
+        distances = _batch_face_distances(face_encodings)
+        for row in distances:
+            best_match_index = int(np.argmin(row))
+            if row[best_match_index] <= FACE_MATCH_TOLERANCE:
+                confidence = 1 - row[best_match_index]
+                employee_id = known_face_ids[best_match_index]
+                return employee_id, confidence
         
         return None, "Không nhận diện được - khuôn mặt chưa được đăng ký"
         
@@ -212,13 +351,56 @@ def recognize_face_from_image(image_data):
         return None, f"Lỗi: {str(e)}"
 
 
+def recognize_faces_from_image(image_data):
+    """Nhận diện tất cả khuôn mặt trong một khung hình (check-in theo nhóm)
+    
+    Trả về (matches, error) với matches là list dict gồm employee_id (None nếu
+    không nhận ra), confidence và location (top, right, bottom, left).
+    Mỗi nhân viên chỉ xuất hiện một lần, giữ lại khuôn mặt khớp nhất.
+    """
+    _check_gallery_version()
+    if len(known_face_encodings) == 0:
+        return None, "Chưa có dữ liệu khuôn mặt nào được đăng ký"
+    
+    try:
+        rgb_img = _decode_image(image_data, max_size=MULTI_FACE_MAX_SIZE)
+        
+        face_locations, face_encodings, error = _detect_and_encode(rgb_img)
+        if error:
+            return None, error
+        
+        distances = _batch_face_distances(face_encodings)
+        best_indices = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(len(best_indices)), best_indices]
+        
+        matches = []
+        seen = {}
+        for location, idx, dist in zip(face_locations, best_indices, best_distances):
+            if dist > FACE_MATCH_TOLERANCE:
+                matches.append({'employee_id': None, 'confidence': 0.0, 'location': location})
+                continue
+            employee_id = known_face_ids[int(idx)]
+            confidence = float(1 - dist)
+            if employee_id in seen:
+                prev = matches[seen[employee_id]]
+                if confidence > prev['confidence']:
+                    prev['confidence'] = confidence
+                    prev['location'] = location
+                continue
+            seen[employee_id] = len(matches)
+            matches.append({'employee_id': employee_id, 'confidence': confidence, 'location': location})
+        
+        return matches, None
+        
+    except Exception as e:
+        print(f"Recognition error: {e}")
+        return None, f"Lỗi: {str(e)}"
+
+
 def get_attendance_status(check_in_time):
     """Xác định trạng thái điểm danh dựa trên giờ check-in"""
-    # Đọc cấu hình động từ environment
-    work_late_time = os.getenv('WORK_LATE_TIME', '09:00')
-    late_time = datetime.strptime(work_late_time, '%H:%M').time()
-    
-    if check_in_time.time() <= late_time:
+    # Giờ đi muộn lấy từ cache cài đặt (đã parse, tự cập nhật khi admin sửa)
+    if check_in_time.time() <= get_settings().work_late_time:
         return 'present'  # Đúng giờ
     else:
         return 'late'  # Đi trễ
@@ -228,17 +410,14 @@ def delete_face_encoding(employee_id):
     """Xóa face encoding của nhân viên"""
     global known_face_encodings, known_face_ids
     
+    # File encodings và ảnh face được xóa trong job nền
+    enqueue('face_gallery_delete', {'employee_id': employee_id}, serial_key=FACE_GALLERY_KEY)
+    
     if employee_id in known_face_ids:
         idx = known_face_ids.index(employee_id)
         known_face_encodings.pop(idx)
         known_face_ids.pop(idx)
-        save_known_faces()
-        
-        # Xóa ảnh face nếu có
-        face_path = os.path.join('faces', f'{employee_id}.jpg')
-        if os.path.exists(face_path):
-            os.remove(face_path)
-        
+        _invalidate_known_matrix()
         return True
     return False
 
@@ -0,0 +1,58 @@
+"""
+Cấu hình gunicorn cho production: gunicorn -c gunicorn.conf.py wsgi:app
+
+Nhận diện khuôn mặt tốn CPU nên mỗi core một process (GIL không cho thread dùng
+nhiều core), vài thread mỗi process cho phần I/O (database, upload).
+App được preload trong master: encodings nạp một lần và chia sẻ copy-on-write,
+init_database chạy đúng một lần. Search AI (TmeBrain) được tạo trong từng worker.
+
+Reload: `kill -HUP <master>` khởi động lại worker lần lượt (không rớt request).
+Vì preload_app, code mới cần `kill -USR2 <master>` rồi `kill -QUIT <master cũ>`.
+"""
+import multiprocessing
+import os
+
+# Mỗi process chỉ dùng một thread BLAS/OpenMP, tránh N process x M thread tranh CPU.
+# Phải đặt trước khi wsgi (numpy, dlib) được import.
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8080')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Mỗi process chỉ chạy bấy nhiêu request nhận diện cùng lúc (xem admission.py).
+# Tối thiểu 2: một slot dành riêng cho kiosk, một slot dùng chung với đăng nhập
+# (với 1 slot không còn slot nào để dành riêng cho kiosk).
+os.environ.setdefault('ADMISSION_MAX_CONCURRENT', os.getenv('GUNICORN_RECOGNITION_CONCURRENCY', '2'))
+
+preload_app = True
+
+# Khởi động lại worker sau một số request để giới hạn bộ nhớ tăng dần (dlib/numpy),
+# jitter để các worker không khởi động lại cùng lúc
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+# Heartbeat của worker ghi vào RAM thay vì đĩa (Docker)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Tài nguyên không dùng chung được qua fork: kết nối database, thread nền"""
+    from wsgi import app, start_worker_services
+    start_worker_services(app)
+
+
+def worker_exit(server, worker):
+    from wsgi import stop_worker_services
+    stop_worker_services()
@@ -0,0 +1,107 @@
+"""
+Phục vụ ảnh khuôn mặt (faces/) và ảnh check-in/out (uploads/).
+
+- Thumbnail ở vài kích thước cố định (?size=sm|md|lg) được tạo khi có request đầu
+  tiên và cache trên đĩa (THUMBNAIL_FOLDER). Tên file chứa mtime của ảnh gốc nên
+  ảnh gốc thay đổi (đăng ký lại khuôn mặt) sẽ tự tạo thumbnail mới.
+- Trả về bằng send_file(conditional=True): hỗ trợ ETag/If-None-Match,
+  Last-Modified/If-Modified-Since và Range.
+"""
+import hashlib
+import os
+import threading
+from flask import abort, send_file, url_for
+from PIL import Image, ImageOps
+from werkzeug.security import safe_join
+from config import Config
+
+THUMBNAIL_SIZES = {'sm': 64, 'md': 160, 'lg': 480}
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+# Ảnh upload không bao giờ bị ghi đè (tên có timestamp) nên cache được lâu
+UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', str(7 * 24 * 3600)))
+
+_locks_guard = threading.Lock()
+_locks = {}
+
+
+def _lock_for(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _thumbnail_path(source, size):
+    """Đường dẫn thumbnail: <THUMBNAIL_FOLDER>/<size>/<tên ảnh gốc>-<phiên bản>.jpg"""
+    stat = os.stat(source)
+    stem = os.path.relpath(source).replace(os.sep, '__').rsplit('.', 1)[0]
+    version = hashlib.sha1(f'{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()[:10]
+    return os.path.join(Config.THUMBNAIL_FOLDER, size, f'{stem}-{version}.jpg'), stem
+
+
+def get_thumbnail(source, size):
+    """Tạo thumbnail nếu chưa có, trả về đường dẫn file"""
+    path, stem = _thumbnail_path(source, size)
+    if os.path.exists(path):
+        return path
+    with _lock_for(path):
+        if os.path.exists(path):
+            return path
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((THUMBNAIL_SIZES[size], THUMBNAIL_SIZES[size]))
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            image.save(tmp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+        # Xóa thumbnail của phiên bản cũ
+        name = os.path.basename(path)
+        for other in os.listdir(folder):
+            if other.startswith(f'{stem}-') and other != name and other.endswith('.jpg'):
+                try:
+                    os.remove(os.path.join(folder, other))
+                except OSError:
+                    pass
+    with _locks_guard:
+        _locks.pop(path, None)
+    return path
+
+
+def send_image(folder, filename, size=None, max_age=None):
+    """Trả ảnh gốc hoặc thumbnail với conditional GET/Range"""
+    if size is not None and size not in THUMBNAIL_SIZES:
+        abort(404)
+    source = safe_join(folder, filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+    path = source
+    if size is not None:
+        try:
+            path = get_thumbnail(source, size)
+        except (OSError, Image.DecompressionBombError) as e:
+            print(f"Lỗi tạo thumbnail {source}: {e}")
+            abort(404)
+    # Đường dẫn tuyệt đối: send_file hiểu đường dẫn tương đối theo root của app
+    response = send_file(os.path.abspath(path), conditional=True, etag=True, max_age=max_age)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if max_age is None:
+        # Ảnh có thể bị thay đổi: luôn kiểm tra lại bằng ETag (trả 304 nếu không đổi)
+        response.cache_control.no_cache = True
+    return response
+
+
+def face_image_url(employee_id, size='md'):
+    """URL ảnh khuôn mặt của nhân viên, None nếu chưa có ảnh"""
+    if not os.path.exists(os.path.join(Config.FACES_FOLDER, f'{employee_id}.jpg')):
+        return None
+    return url_for('admin.face_image', employee_id=employee_id, size=size)
+
+
+def upload_url(image_path, size=None):
+    """URL của ảnh check-in/out từ đường dẫn lưu trong bản ghi điểm danh"""
+    if not image_path:
+        return None
+    filename = os.path.relpath(image_path.replace('\\', '/'), Config.UPLOAD_FOLDER).replace(os.sep, '/')
+    if size:
+        return url_for('uploaded_file', filename=filename, size=size)
+    return url_for('uploaded_file', filename=filename)
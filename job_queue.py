@@ -0,0 +1,372 @@
+"""
+Hàng đợi công việc nền chạy trên một máy, lưu bền trong SQLite (jobs.db).
+
+Request chỉ enqueue rồi trả về ngay; worker thread (hoặc tiến trình riêng qua
+`flask --app app jobs-worker`) lấy job ra chạy, thử lại với backoff khi lỗi.
+Job đang chạy giữ một lease, được gia hạn định kỳ (heartbeat) và mỗi lần
+report_progress trong lúc handler chạy; nếu tiến trình chết giữa chừng job sẽ được
+chạy lại khi lease hết hạn, trừ khi đã hết số lần thử (max_attempts) thì bị đánh
+dấu failed (vd: gửi email hàng loạt max_attempts=1 không bao giờ gửi lại).
+
+- unique_key: bỏ qua job mới nếu đã có job cùng key đang chờ/chạy (vd: vẽ biểu đồ)
+- serial_key: các job cùng key chạy lần lượt theo thứ tự enqueue (vd: file encodings)
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime
+
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE = float(os.getenv('JOB_RETRY_BASE', '2'))
+JOB_RETRY_MAX = float(os.getenv('JOB_RETRY_MAX', '600'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+JOB_SHUTDOWN_TIMEOUT = float(os.getenv('JOB_SHUTDOWN_TIMEOUT', '30'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    unique_key TEXT,
+    serial_key TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    result TEXT,
+    progress TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_serial_key ON jobs (serial_key, id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_active_unique_key
+    ON jobs (unique_key) WHERE status IN ('queued', 'running');
+"""
+
+# Job sẵn sàng: đến giờ chạy (hoặc lease đã hết) và không có job nào trước nó cùng serial_key
+CLAIM_SQL = """
+SELECT id, name, payload, attempts FROM jobs
+WHERE ((status = 'queued' AND run_at <= :now)
+       OR (status = 'running' AND lease_until < :now AND attempts < max_attempts))
+  AND (serial_key IS NULL OR NOT EXISTS (
+      SELECT 1 FROM jobs prev
+      WHERE prev.serial_key = jobs.serial_key AND prev.id < jobs.id
+        AND prev.status IN ('queued', 'running')
+  ))
+ORDER BY run_at, id
+LIMIT 1
+"""
+
+# Job chạy dở (lease hết hạn) đã dùng hết số lần thử
+EXPIRE_SQL = """
+UPDATE jobs SET status = 'failed', lease_until = NULL, finished_at = :now,
+                last_error = 'Lease hết hạn (tiến trình dừng giữa chừng), đã hết số lần thử'
+WHERE status = 'running' AND lease_until < :now AND attempts >= max_attempts
+"""
+
+_handlers = {}
+_current = threading.local()
+
+
+def job_handler(name):
+    """Decorator đăng ký hàm xử lý cho một loại job, hàm nhận payload (dict)"""
+    def decorator(f):
+        _handlers[name] = f
+        return f
+    return decorator
+
+
+def report_progress(**data):
+    """Ghi tiến độ cho job đang chạy trên thread hiện tại (xem ở /admin/jobs/<id>)"""
+    job_id = getattr(_current, 'job_id', None)
+    if job_id is not None:
+        # Gia hạn lease luôn: job còn đang chạy
+        get_job_queue()._execute(
+            """UPDATE jobs SET progress = ?, lease_until = ?
+               WHERE id = ? AND status = 'running' AND attempts = ?""",
+            (json.dumps(data, ensure_ascii=False), time.time() + JOB_LEASE_SECONDS,
+             job_id, _current.attempts)
+        )
+
+
+def _to_iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class JobQueue:
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self.app = None
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._last_purge = 0
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        atexit.register(self.stop)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # Mỗi thread (và mỗi tiến trình sau fork) dùng kết nối riêng
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _execute(self, sql, params=()):
+        return self._conn().execute(sql, params)
+
+    def enqueue(self, name, payload=None, unique_key=None, serial_key=None,
+                max_attempts=JOB_MAX_ATTEMPTS, delay=0):
+        """Thêm job vào hàng đợi, trả về id job (id job đang chờ nếu trùng unique_key)"""
+        now = time.time()
+        cursor = self._execute(
+            """INSERT OR IGNORE INTO jobs
+               (name, payload, unique_key, serial_key, max_attempts, run_at, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (name, json.dumps(payload or {}, ensure_ascii=False), unique_key, serial_key,
+             max_attempts, now + delay, now)
+        )
+        if cursor.rowcount:
+            if self.app is not None:
+                self.start()
+            self._wakeup.set()
+            return cursor.lastrowid
+        row = self._execute(
+            "SELECT id FROM jobs WHERE unique_key = ? AND status IN ('queued', 'running')",
+            (unique_key,)
+        ).fetchone()
+        return row['id'] if row else None
+
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute(EXPIRE_SQL, {'now': now}).rowcount
+            if expired:
+                print(f"{expired} job hết lease và đã hết số lần thử, đánh dấu failed")
+            row = conn.execute(CLAIM_SQL, {'now': now}).fetchone()
+            if row:
+                row = dict(row, attempts=row['attempts'] + 1)
+                conn.execute(
+                    """UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                                      lease_until = ?, progress = NULL
+                       WHERE id = ?""",
+                    (now + JOB_LEASE_SECONDS, row['id'])
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _finish(self, job_id, result):
+        # Xóa payload (có thể chứa ảnh) khi đã xong để jobs.db không phình to
+        self._execute(
+            """UPDATE jobs SET status = 'done', result = ?, payload = NULL,
+                              lease_until = NULL, finished_at = ?
+               WHERE id = ?""",
+            (json.dumps(result, ensure_ascii=False, default=str), time.time(), job_id)
+        )
+
+    def _fail(self, job_id, error):
+        row = self._execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        now = time.time()
+        if row['attempts'] >= row['max_attempts']:
+            self._execute(
+                """UPDATE jobs SET status = 'failed', last_error = ?, lease_until = NULL,
+                                  finished_at = ?
+                   WHERE id = ?""",
+                (error, now, job_id)
+            )
+            print(f"Job {job_id} thất bại sau {row['attempts']} lần: {error}")
+            return
+        backoff = min(JOB_RETRY_BASE ** row['attempts'], JOB_RETRY_MAX)
+        self._execute(
+            """UPDATE jobs SET status = 'queued', last_error = ?, lease_until = NULL, run_at = ?
+               WHERE id = ?""",
+            (error, now + backoff, job_id)
+        )
+
+    def run_one(self):
+        """Lấy và chạy một job, trả về False nếu không có job nào sẵn sàng"""
+        row = self._claim()
+        if row is None:
+            return False
+
+        job_id, name = row['id'], row['name']
+        handler = _handlers.get(name)
+        if handler is None:
+            self._fail(job_id, f"Không có handler cho job '{name}'")
+            return True
+
+        _current.job_id = job_id
+        _current.attempts = row['attempts']
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job_id, row['attempts'], done),
+            name=f'job-heartbeat-{job_id}', daemon=True
+        )
+        heartbeat.start()
+        try:
+            payload = json.loads(row['payload'] or '{}')
+            if self.app is not None:
+                with self.app.app_context():
+                    result = handler(payload)
+            else:
+                result = handler(payload)
+            self._finish(job_id, result)
+        except Exception as e:
+            traceback.print_exc()
+            self._fail(job_id, f"{type(e).__name__}: {e}")
+        finally:
+            done.set()
+            heartbeat.join()
+            _current.job_id = None
+        return True
+
+    def _heartbeat(self, job_id, attempts, done):
+        """Gia hạn lease trong lúc handler chạy (job dài hơn JOB_LEASE_SECONDS
+        không bị worker khác lấy lại)"""
+        interval = max(1, JOB_LEASE_SECONDS / 3)
+        while not done.wait(interval):
+            try:
+                self._execute(
+                    """UPDATE jobs SET lease_until = ?
+                       WHERE id = ? AND status = 'running' AND attempts = ?""",
+                    (time.time() + JOB_LEASE_SECONDS, job_id, attempts)
+                )
+            except Exception as e:
+                print(f"Lỗi gia hạn lease job {job_id}: {e}")
+
+    def _purge(self):
+        """Xóa job đã xong/thất bại quá JOB_RETENTION_DAYS ngày"""
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        self._execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (now - JOB_RETENTION_DAYS * 86400,)
+        )
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                if self.run_one():
+                    continue
+                self._purge()
+            except Exception as e:
+                print(f"Lỗi job worker: {e}")
+            self._wakeup.wait(JOB_POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def start(self, workers=JOB_WORKERS):
+        """Khởi động worker thread (mỗi tiến trình một lần, an toàn sau fork)"""
+        if workers <= 0 or (self._pid == os.getpid() and any(t.is_alive() for t in self._threads)):
+            return
+        self._pid = os.getpid()
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+        print(f"Đã khởi động {workers} job worker")
+
+    def stop(self, timeout=JOB_SHUTDOWN_TIMEOUT):
+        """Dừng nhận job mới và chờ các job đang chạy hoàn tất"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.time() + timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.time()))
+        self._threads = []
+
+    def get_job(self, job_id):
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, status=None, limit=50):
+        if status:
+            rows = self._execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self._execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get_stats(self):
+        rows = self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'last_error': row['last_error'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'progress': json.loads(row['progress']) if row['progress'] else None,
+            'run_at': _to_iso(row['run_at']),
+            'created_at': _to_iso(row['created_at']),
+            'finished_at': _to_iso(row['finished_at'])
+        }
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+
+def enqueue(name, payload=None, **kwargs):
+    return get_job_queue().enqueue(name, payload, **kwargs)
+
+
+def init_app(app):
+    """Gắn app để job chạy trong app context.
+
+    Worker thread được khởi động khi gọi start_workers() hoặc lần enqueue đầu tiên
+    trong tiến trình, nên các lệnh CLI không enqueue sẽ không chạy worker.
+    """
+    queue = get_job_queue()
+    queue.app = app
+    return queue
+
+
+def start_workers(workers=JOB_WORKERS):
+    get_job_queue().start(workers)
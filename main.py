@@ -1,5 +1,5 @@
 from app import app, init_database
-from config import WORK_START_TIME, WORK_LATE_TIME
+from app_settings import get_settings
 from face_utils import get_face_count
 
 _brain_instance = None
@@ -33,12 +33,14 @@ def get_brain_instance():
 
 if __name__ == '__main__':
     init_database(app)
-    print(f"Giờ bắt đầu làm việc: {WORK_START_TIME}")
-    print(f"Giờ tính đi trễ: {WORK_LATE_TIME}")
+    with app.app_context():
+        work_settings = get_settings().to_dict()
+    print(f"Giờ bắt đầu làm việc: {work_settings['work_start_time']}")
+    print(f"Giờ tính đi trễ: {work_settings['work_late_time']}")
     
     # Khởi tạo hệ thống Search AI
     init_search_system()
     
     print("Server đang chạy tại: http://0.0.0.0:8080")
-    print("Để sử dụng với ngrok, chạy: ngrok http 8080")
+    print("Để sử dụng với ngrok, chạy: ngrok http 8080 (đặt TRUSTED_PROXY_HOPS=1 để lấy IP client thật)")
     app.run(debug=True, host='0.0.0.0', port=8080)
@@ -0,0 +1,183 @@
+"""
+Migration schema có đánh số phiên bản, chạy một lần khi khởi động (init_database).
+
+db.create_all() chỉ tạo bảng mới, không thêm index/cột cho database đã tồn tại.
+Mỗi migration phải idempotent (IF NOT EXISTS, ON CONFLICT DO NOTHING...) để nhiều
+worker khởi động cùng lúc vẫn an toàn.
+
+Hỗ trợ SQLite và PostgreSQL (như models.dialect_insert): kiểm tra schema bằng
+sqlalchemy.inspect, insert bỏ qua trùng khóa qua _insert_ignore.
+"""
+import os
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, column, inspect, table, text
+
+
+def _insert_ignore(conn, table_name, key, values):
+    """INSERT ... ON CONFLICT (key) DO NOTHING theo database đang dùng"""
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    target = table(table_name, *(column(col) for col in values))
+    conn.execute(insert(target).values(**values).on_conflict_do_nothing(index_elements=[key]))
+
+
+def _merge_attendance_group(conn, rows):
+    """Gộp các bản ghi cùng (employee_id, date) vào bản ghi check-in sớm nhất:
+    giữ check-in sớm nhất, check-out muộn nhất, tính lại time_lam và lương"""
+    keep = min(rows, key=lambda r: (r.check_in is None, r.check_in or datetime.max, r.id))
+    with_out = [r for r in rows if r.check_out is not None]
+    last_out = max(with_out, key=lambda r: r.check_out) if with_out else None
+
+    values = {'id': keep.id, 'check_out': None, 'check_out_image': None,
+              'time_lam': keep.time_lam, 'luong': keep.luong}
+    if last_out is not None:
+        values.update(check_out=last_out.check_out, check_out_image=last_out.check_out_image)
+        if keep.check_in is not None and last_out.check_out > keep.check_in:
+            minutes = int((last_out.check_out - keep.check_in).total_seconds() // 60)
+            values['time_lam'] = minutes
+            values['luong'] = round(minutes / 60 * float(keep.salary or 0), 2)
+    conn.execute(text(
+        """UPDATE attendance SET check_out = :check_out, check_out_image = :check_out_image,
+                  time_lam = :time_lam, luong = :luong
+           WHERE id = :id"""
+    ).bindparams(bindparam('check_out', type_=DateTime)), values)
+
+    removed = [r for r in rows if r.id != keep.id]
+    conn.execute(
+        text("DELETE FROM attendance WHERE id = :id"),
+        [{'id': r.id} for r in removed]
+    )
+    print(f"  {keep.employee_id} {keep.date}: giữ #{keep.id} "
+          f"(vào {keep.check_in}, ra {values['check_out']}), gộp và xóa "
+          + ', '.join(f"#{r.id} (vào {r.check_in}, ra {r.check_out})" for r in removed))
+
+
+def _attendance_unique_employee_date(conn):
+    """Unique (employee_id, date), gộp các bản ghi trùng trước khi tạo index"""
+    rows = conn.execute(text(
+        """SELECT a.id, a.employee_id, a.date, a.check_in, a.check_out, a.check_out_image,
+                  a.time_lam, a.luong, u.salary
+           FROM attendance a
+           LEFT JOIN "user" u ON u.id = a.user_id
+           WHERE a.employee_id IS NOT NULL
+             AND EXISTS (
+                 SELECT 1 FROM attendance b
+                 WHERE b.employee_id = a.employee_id AND b.date = a.date AND b.id <> a.id
+             )
+           ORDER BY a.employee_id, a.date, a.id"""
+    ).columns(check_in=DateTime, check_out=DateTime)).fetchall()
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.employee_id, row.date), []).append(row)
+    if groups:
+        print(f"Gộp {len(rows)} bản ghi điểm danh trùng (employee_id, date) thành {len(groups)} bản ghi:")
+    for group in groups.values():
+        _merge_attendance_group(conn, group)
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_employee_date "
+        "ON attendance (employee_id, date)"
+    ))
+
+
+def _attendance_hot_path_indexes(conn):
+    """Index cho dashboard (lọc theo date, sắp xếp theo check_in) và đếm nhân viên"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_date_check_in "
+        "ON attendance (date, check_in)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_check_in "
+        "ON attendance (check_in)"
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_user_role ON "user" (role)'
+    ))
+
+
+def _backfill_daily_summary(conn):
+    """Tính thống kê theo ngày/phòng ban cho dữ liệu điểm danh đã có"""
+    conn.execute(text("DELETE FROM daily_summary"))
+    conn.execute(text("DELETE FROM department_daily_summary"))
+    conn.execute(text(
+        """INSERT INTO daily_summary (date, total, checked_in, checked_out, late)
+           SELECT date, COUNT(id), COUNT(check_in), COUNT(check_out),
+                  SUM(CASE WHEN status = 'late' THEN 1 ELSE 0 END)
+           FROM attendance WHERE date IS NOT NULL
+           GROUP BY date"""
+    ))
+    conn.execute(text(
+        """INSERT INTO department_daily_summary (date, department, total, checked_in, checked_out, late)
+           SELECT date, COALESCE(department, ''), COUNT(id), COUNT(check_in), COUNT(check_out),
+                  SUM(CASE WHEN status = 'late' THEN 1 ELSE 0 END)
+           FROM attendance WHERE date IS NOT NULL
+           GROUP BY date, COALESCE(department, '')"""
+    ))
+
+
+def _has_column(conn, table_name, column_name):
+    return any(col['name'] == column_name for col in inspect(conn).get_columns(table_name))
+
+
+def _attendance_change_sequence(conn):
+    """Cột attendance.seq cho delta feed, gán seq = id cho dữ liệu cũ"""
+    if not _has_column(conn, 'attendance', 'seq'):
+        conn.execute(text("ALTER TABLE attendance ADD COLUMN seq INTEGER"))
+    conn.execute(text("UPDATE attendance SET seq = id WHERE seq IS NULL"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_date_seq ON attendance (date, seq)"
+    ))
+    last_seq = conn.execute(text("SELECT COALESCE(MAX(seq), 0) FROM attendance")).scalar()
+    _insert_ignore(conn, 'change_sequence', 'name', {'name': 'attendance', 'value': last_seq})
+    _insert_ignore(conn, 'change_sequence', 'name', {'name': 'attendance_reset', 'value': 0})
+
+
+def _seed_app_settings(conn):
+    """Chuyển giờ làm việc từ .env (WORK_*_TIME) vào bảng app_setting"""
+    defaults = {'WORK_START_TIME': '08:30', 'WORK_LATE_TIME': '09:00', 'WORK_END_TIME': '17:30'}
+    for key, default in defaults.items():
+        _insert_ignore(conn, 'app_setting', 'key',
+                       {'key': key, 'value': os.getenv(key) or default, 'updated_at': datetime.utcnow()})
+    _insert_ignore(conn, 'change_sequence', 'name', {'name': 'settings', 'value': 1})
+
+
+# (version, mô tả, hàm) - chỉ thêm vào cuối, không sửa migration đã phát hành
+MIGRATIONS = [
+    (1, 'attendance unique (employee_id, date)', _attendance_unique_employee_date),
+    (2, 'attendance (date, check_in), (check_in); user (role)', _attendance_hot_path_indexes),
+    (3, 'backfill daily_summary, department_daily_summary', _backfill_daily_summary),
+    (4, 'attendance.seq, change_sequence', _attendance_change_sequence),
+    (5, 'app_setting (giờ làm việc từ .env)', _seed_app_settings),
+]
+
+
+def get_schema_version(conn):
+    """Phiên bản schema hiện tại (0 nếu chưa chạy migration nào)"""
+    conn.execute(text(
+        """CREATE TABLE IF NOT EXISTS schema_version (
+               version INTEGER PRIMARY KEY,
+               description TEXT,
+               applied_at DATETIME
+           )"""
+    ))
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def run_migrations(engine):
+    """Chạy các migration chưa áp dụng, mỗi migration trong một transaction riêng"""
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            _insert_ignore(conn, 'schema_version', 'version',
+                           {'version': version, 'description': description, 'applied_at': datetime.now()})
+        applied.append(version)
+        print(f"Migration {version}: {description}")
+
+    return applied
@@ -1,16 +1,50 @@
+import sqlite3
 from datetime import datetime, date
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
 
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Bật WAL để kiosk check-in không bị chặn bởi các truy vấn đọc của dashboard"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
+def dialect_insert(model):
+    """insert() hỗ trợ ON CONFLICT theo database đang dùng"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def insert_or_ignore(model, conflict_columns, values):
+    """INSERT ... ON CONFLICT DO NOTHING, trả về True nếu bản ghi mới được thêm"""
+    stmt = dialect_insert(model).values(**values).on_conflict_do_nothing(
+        index_elements=conflict_columns
+    )
+    return db.session.execute(stmt).rowcount == 1
+
 class User(UserMixin, db.Model):
     """Model người dùng (Admin và Nhân viên)"""
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # 'admin' hoặc 'employee'
+    role = db.Column(db.String(20), nullable=False, index=True)  # 'admin' hoặc 'employee'
     full_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120))
     salary = db.Column(db.Numeric(10, 2), nullable=False) 
@@ -29,6 +63,16 @@ class User(UserMixin, db.Model):
 
 class Attendance(db.Model):
     """Model điểm danh"""
+    __table_args__ = (
+        # Mỗi nhân viên chỉ có một bản ghi mỗi ngày
+        db.Index('uq_attendance_employee_date', 'employee_id', 'date', unique=True),
+        # Dashboard lọc theo ngày và sắp xếp theo giờ check-in
+        db.Index('ix_attendance_date_check_in', 'date', 'check_in'),
+        db.Index('ix_attendance_check_in', 'check_in'),
+        # Delta feed: các bản ghi trong ngày thay đổi sau một sequence
+        db.Index('ix_attendance_date_seq', 'date', 'seq'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     employee_id = db.Column(db.String(50))
@@ -43,6 +87,8 @@ class Attendance(db.Model):
     department = db.Column(db.String(100))
     position = db.Column(db.String(100))
     luong = db.Column(db.Numeric(10, 2)) 
+    # Số thứ tự thay đổi tăng dần, gán lại mỗi lần check-in/check-out
+    seq = db.Column(db.Integer)
     
     user = db.relationship('User', backref=db.backref('attendances', lazy=True))
 
@@ -51,4 +97,49 @@ class Attendance(db.Model):
         salary_per_hour = self.user.salary if self.user and self.user.salary else 0
         luong = round(hours * salary_per_hour, 2)
         self.luong = luong
-        return luong
\ No newline at end of file
+        return luong
+
+
+
+class DailySummary(db.Model):
+    """Thống kê điểm danh theo ngày, cập nhật cùng transaction với check-in/check-out"""
+    __tablename__ = 'daily_summary'
+    date = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    checked_in = db.Column(db.Integer, nullable=False, default=0)
+    checked_out = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def present_now(self):
+        return self.checked_in - self.checked_out
+
+
+class DepartmentDailySummary(db.Model):
+    """Thống kê điểm danh theo ngày và phòng ban ('' nếu chưa phân công)"""
+    __tablename__ = 'department_daily_summary'
+    date = db.Column(db.Date, primary_key=True)
+    department = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    checked_in = db.Column(db.Integer, nullable=False, default=0)
+    checked_out = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def present_now(self):
+        return self.checked_in - self.checked_out
+
+
+class ChangeSequence(db.Model):
+    """Bộ đếm tăng dần cho delta feed ('attendance', 'attendance_reset'), phiên bản cài đặt ('settings'), cache nhân viên ('employees') và gallery khuôn mặt ('faces')"""
+    __tablename__ = 'change_sequence'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AppSetting(db.Model):
+    """Cài đặt hệ thống dạng key/value (giờ làm việc...), sửa qua trang cài đặt admin"""
+    __tablename__ = 'app_setting'
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
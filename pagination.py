@@ -0,0 +1,86 @@
+"""
+Phân trang keyset (seek): thay vì OFFSET, mỗi trang bắt đầu sau giá trị khóa sắp xếp
+của dòng cuối trang trước, nên thời gian tải trang không tăng theo lượng dữ liệu.
+
+Page token là giá trị các cột sắp xếp của dòng cuối, mã hóa base64 JSON.
+"""
+import base64
+import json
+from datetime import date, datetime
+from flask import request
+from sqlalchemy import literal, tuple_
+from config import Config
+
+
+class Page:
+    def __init__(self, items, next_token, page_size):
+        self.items = items
+        self.next_token = next_token
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(value, column):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_token(values):
+    raw = json.dumps([_to_json(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token, columns):
+    """Giải mã page token, trả về None nếu token không hợp lệ (quay về trang đầu)"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [_from_json(v, c) for v, c in zip(values, columns)]
+    except (ValueError, TypeError):
+        return None
+
+
+def get_page_args():
+    """(page_token, page_size) từ query string, page_size bị giới hạn bởi MAX_PAGE_SIZE"""
+    page_size = request.args.get('page_size', Config.PAGE_SIZE, type=int)
+    page_size = max(1, min(page_size, Config.MAX_PAGE_SIZE))
+    return request.args.get('page_token'), page_size
+
+
+def keyset_page(query, columns, token=None, page_size=None, descending=True):
+    """Lấy một trang của query, sắp xếp theo `columns` (cột cuối phải unique, vd: id)"""
+    page_size = page_size or Config.PAGE_SIZE
+    after = decode_token(token, columns)
+    if after is not None:
+        key = tuple_(*columns)
+        bound = tuple_(*[literal(v, c.type) for v, c in zip(after, columns)])
+        query = query.filter(key < bound if descending else key > bound)
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(page_size + 1).all()
+
+    next_token = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_token = encode_token([getattr(last, c.key) for c in columns])
+    return Page(rows, next_token, page_size)
@@ -0,0 +1,217 @@
+"""
+Tính lương tháng cho toàn bộ nhân viên bằng NumPy.
+
+Điểm danh của tháng được đọc bằng một truy vấn (theo từng khối yield_per) và cộng dồn
+vào các mảng theo nhân viên bằng np.bincount, nên bộ nhớ tỉ lệ với số nhân viên chứ
+không phải số dòng điểm danh. Kết quả được xuất dần ra CSV, hoặc Parquet nếu có pyarrow.
+"""
+import csv
+import io
+from calendar import monthrange
+from datetime import date
+import numpy as np
+from sqlalchemy import select
+from models import db, User, Attendance
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+CHUNK_ROWS = 10000
+
+COLUMNS = [
+    'employee_id', 'full_name', 'department', 'working_days', 'days_present',
+    'on_time', 'late', 'absent', 'work_minutes', 'work_hours', 'salary_per_hour', 'total_salary'
+]
+
+
+def parquet_available():
+    return pa is not None
+
+
+def month_bounds(year, month, today=None):
+    """(ngày đầu, ngày cuối) của tháng, ngày cuối không vượt quá hôm nay"""
+    today = today or date.today()
+    start = date(year, month, 1)
+    end = date(year, month, monthrange(year, month)[1])
+    return start, min(end, today)
+
+
+class PayrollReport:
+    """Kết quả tính lương, mỗi cột là một mảng NumPy theo thứ tự nhân viên"""
+
+    def __init__(self, year, month, start, end, employees, arrays):
+        self.year = year
+        self.month = month
+        self.start = start
+        self.end = end
+        self.employees = employees    # list (employee_id, full_name, department)
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.employees)
+
+    def row(self, i):
+        employee_id, full_name, department = self.employees[i]
+        a = self.arrays
+        return {
+            'employee_id': employee_id,
+            'full_name': full_name,
+            'department': department or '',
+            'working_days': int(a['working_days'][i]),
+            'days_present': int(a['days_present'][i]),
+            'on_time': int(a['on_time'][i]),
+            'late': int(a['late'][i]),
+            'absent': int(a['absent'][i]),
+            'work_minutes': float(a['work_minutes'][i]),
+            'work_hours': float(a['work_hours'][i]),
+            'salary_per_hour': float(a['salary_per_hour'][i]),
+            'total_salary': float(a['total_salary'][i])
+        }
+
+    def iter_chunks(self, chunk_size=CHUNK_ROWS):
+        """Các khối (start, stop) để xuất dần"""
+        for offset in range(0, len(self), chunk_size):
+            yield offset, min(offset + chunk_size, len(self))
+
+
+def compute_payroll(year, month, employee_ids=None, today=None):
+    """Tính lương tháng cho tất cả nhân viên (hoặc danh sách employee_ids)"""
+    start, end = month_bounds(year, month, today)
+
+    user_query = db.session.query(
+        User.employee_id, User.full_name, User.department, User.salary, User.created_at
+    )
+    if employee_ids is None:
+        user_query = user_query.filter(User.role == 'employee')
+    else:
+        user_query = user_query.filter(User.employee_id.in_(employee_ids))
+    users = user_query.order_by(User.id).all()
+
+    n = len(users)
+    codes = {u.employee_id: i for i, u in enumerate(users)}
+    work_minutes = np.zeros(n, dtype=np.float64)
+    days_present = np.zeros(n, dtype=np.int64)
+    late = np.zeros(n, dtype=np.int64)
+    on_time = np.zeros(n, dtype=np.int64)
+
+    stmt = select(Attendance.employee_id, Attendance.time_lam, Attendance.status).where(
+        Attendance.date >= start, Attendance.date <= end
+    )
+    if employee_ids is not None:
+        stmt = stmt.where(Attendance.employee_id.in_(employee_ids))
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_ROWS))
+    for partition in result.partitions():
+        emp_ids, minutes, statuses = zip(*partition)
+        idx = np.fromiter((codes.get(e, -1) for e in emp_ids), dtype=np.int64, count=len(emp_ids))
+        known = idx >= 0
+        idx = idx[known]
+        minutes = np.fromiter((float(m or 0) for m in minutes), dtype=np.float64, count=len(emp_ids))[known]
+        statuses = np.asarray(statuses, dtype=object)[known]
+        work_minutes += np.bincount(idx, weights=minutes, minlength=n)
+        days_present += np.bincount(idx, minlength=n)
+        late += np.bincount(idx, weights=(statuses == 'late'), minlength=n).astype(np.int64)
+        on_time += np.bincount(idx, weights=(statuses == 'present'), minlength=n).astype(np.int64)
+
+    salary_per_hour = np.fromiter((float(u.salary or 0) for u in users), dtype=np.float64, count=n)
+
+    # Ngày làm việc (thứ 2 - thứ 6) từ max(đầu tháng, ngày tạo tài khoản) tới ngày cuối
+    month_start = np.datetime64(start, 'D')
+    period_end = np.datetime64(end, 'D') + 1
+    created = np.array(
+        [np.datetime64(u.created_at.date(), 'D') if u.created_at else month_start for u in users],
+        dtype='datetime64[D]'
+    ).reshape(n)
+    first_day = np.maximum(created, month_start)
+    working_days = np.where(first_day < period_end, np.busday_count(first_day, period_end), 0)
+
+    work_hours = np.round(work_minutes / 60, 2)
+    arrays = {
+        'working_days': working_days,
+        'days_present': days_present,
+        'on_time': on_time,
+        'late': late,
+        'absent': np.maximum(working_days - days_present, 0),
+        'work_minutes': work_minutes,
+        'work_hours': work_hours,
+        'salary_per_hour': salary_per_hour,
+        'total_salary': np.round(work_hours * salary_per_hour, 2)
+    }
+    employees = [(u.employee_id, u.full_name, u.department) for u in users]
+    return PayrollReport(year, month, start, end, employees, arrays)
+
+
+def iter_csv(report, chunk_size=CHUNK_ROWS):
+    """Xuất báo cáo ra CSV theo từng khối (generator bytes)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue().encode('utf-8-sig')
+    for offset, stop in report.iter_chunks(chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        for i in range(offset, stop):
+            row = report.row(i)
+            writer.writerow([row[c] for c in COLUMNS])
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink:
+    """File-like cho ParquetWriter: gom bytes đã ghi để generator trả dần ra"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(report, chunk_size=CHUNK_ROWS):
+    """Xuất báo cáo ra Parquet, mỗi khối là một row group (cần pyarrow)"""
+    if pa is None:
+        raise RuntimeError("Chưa cài pyarrow, không thể xuất Parquet")
+
+    sink = _ChunkSink()
+    ids = [e[0] for e in report.employees]
+    names = [e[1] for e in report.employees]
+    departments = [e[2] or '' for e in report.employees]
+    writer = None
+    # Báo cáo rỗng vẫn ghi một file Parquet hợp lệ (chỉ có schema)
+    for offset, stop in list(report.iter_chunks(chunk_size)) or [(0, 0)]:
+        columns = {
+            'employee_id': pa.array(ids[offset:stop], pa.string()),
+            'full_name': pa.array(names[offset:stop], pa.string()),
+            'department': pa.array(departments[offset:stop], pa.string()),
+        }
+        for name in COLUMNS[3:]:
+            columns[name] = pa.array(report.arrays[name][offset:stop])
+        table = pa.table(columns)
+        if writer is None:
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
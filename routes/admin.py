@@ -1,23 +1,29 @@
 from calendar import monthrange
-import matplotlib
 from pendulum import today
-matplotlib.use("Agg")
 
 from datetime import datetime, date
 import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from flask_login import login_required, current_user
 from models import db, User, Attendance
 from face_utils import register_face, delete_face_encoding
-import matplotlib.pyplot as plt
+from employee_cache import get_employee_cache
+from attendance_summary import get_day_summary, get_department_summary, rebuild_days
+from attendance_feed import mark_reset, note_committed
+from pagination import keyset_page, get_page_args
+from payroll import compute_payroll, iter_csv, iter_parquet, parquet_available
+from attendance_export import build_export_query, iter_export, EXPORT_FORMATS
+from chart_renderer import chart_data, request_chart
+from job_queue import enqueue, job_handler, get_job_queue
+from routes.annou import check_email
+from app_settings import get_settings, save_settings, validate_settings
+from admission import get_admission_stats
+from images import send_image, face_image_url
+from config import Config
 import numpy as np 
-import re
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 
-ENV_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-
-
 def admin_required(f):
     """Decorator kiểm tra quyền admin"""
     from functools import wraps
@@ -38,68 +44,127 @@ def dashboard():
     today = date.today()
     
     total_users = User.query.filter_by(role='employee').count()
-    today_attendances = Attendance.query.filter_by(date=today).count()
-    checked_in_today = Attendance.query.filter_by(date=today).filter(
-        Attendance.check_in.isnot(None)
-    ).count()
-    checked_out_today = Attendance.query.filter_by(date=today).filter(
-        Attendance.check_out.isnot(None)
-    ).count()
+    summary = get_day_summary(today)
+    today_attendances = summary['total']
+    checked_in_today = summary['checked_in']
+    checked_out_today = summary['checked_out']
     
 
     recent_attendance = Attendance.query.order_by(
         Attendance.check_in.desc()
     ).limit(5).all()
-    data_sodo = [total_users, today_attendances, checked_in_today, checked_out_today] 
-    labels = ['Tổng nhân viên', 'Điểm danh hôm nay', 'Đã check-in', 'Đã check-out']
-    colors = ['#4e79a7', '#f28e2b', '#e15759', '#76b7b2']
-    plt.figure(figsize=(8,6))
-    plt.bar(labels, data_sodo, color=colors)
-    try:
-        if not os.path.exists('static/public_databoard/chart.png'):
-            plt.title('Thống kê điểm danh hôm nay')
-            plt.ylabel('Số lượng') 
-            plt.savefig('static/public_databoard/chart.png')
-            plt.close() 
-        else:
-            os.remove('static/public_databoard/chart.png')
-            plt.title('Thống kê điểm danh hôm nay')
-            plt.ylabel('Số lượng') 
-            plt.savefig('static/public_databoard/chart.png')
-            plt.close()
-    except Exception as e:
-        print(f"Lỗi khi lưu biểu đồ: {e}")
+    chart_file = request_chart([total_users, today_attendances, checked_in_today, checked_out_today])
     return render_template('admin_dashboard.html',                         
                          total_users=total_users,
                          today_attendances=today_attendances,
                          checked_in_today=checked_in_today,
                          checked_out_today=checked_out_today,
+                         late_today=summary['late'],
+                         departments=get_department_summary(today),
+                         chart_file=chart_file,
                          recent_attendance=recent_attendance ) 
+
+
+@admin_bp.route('/dashboard/data')
+@login_required
+@admin_required
+def dashboard_data():
+    """Số liệu dashboard (JSON) để trình duyệt tự vẽ biểu đồ"""
+    today = date.today()
+    summary = get_day_summary(today)
+    values = [
+        User.query.filter_by(role='employee').count(),
+        summary['total'], summary['checked_in'], summary['checked_out']
+    ]
+    return jsonify({
+        'date': today.strftime('%Y-%m-%d'),
+        'chart': chart_data(values),
+        'chart_file': request_chart(values),
+        'late': summary['late'],
+        'departments': get_department_summary(today)
+    })
     
 @admin_bp.route('/attendance')
 @login_required
 @admin_required
 def view_attendance():
     """Xem lịch sử điểm danh"""
-    date_filter = request.args.get('date', date.today().strftime('%Y-%m-%d'))
-    selected_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-    
-    attendances = Attendance.query.filter_by(date=selected_date).order_by(
-        Attendance.check_in.desc()
-    ).all()
-    
+    date_filter, page = _attendance_page()
     return render_template('view_attendance.html', 
-                         attendances=attendances, 
+                         attendances=page.items, 
+                         page=page,
                          selected_date=date_filter)
 
 
+def _attendance_page():
+    """Một trang điểm danh của ngày được chọn, keyset theo (check_in, id)"""
+    date_filter = request.args.get('date', date.today().strftime('%Y-%m-%d'))
+    selected_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
+    page_token, page_size = get_page_args()
+    query = Attendance.query.filter_by(date=selected_date)
+    return date_filter, keyset_page(query, [Attendance.check_in, Attendance.id], page_token, page_size)
+
+
+@admin_bp.route('/api/attendance')
+@login_required
+@admin_required
+def view_attendance_json():
+    """API điểm danh theo ngày (JSON, phân trang keyset)"""
+    date_filter, page = _attendance_page()
+    return jsonify({
+        'date': date_filter,
+        'items': [{
+            'id': a.id,
+            'employee_id': a.employee_id,
+            'full_name': a.full_name,
+            'department': a.department,
+            'check_in': a.check_in.strftime('%H:%M:%S') if a.check_in else None,
+            'check_out': a.check_out.strftime('%H:%M:%S') if a.check_out else None,
+            'time_lam': float(a.time_lam) if a.time_lam is not None else None,
+            'status': a.status
+        } for a in page.items],
+        'next_token': page.next_token,
+        'page_size': page.page_size
+    })
+
+
+def _users_page():
+    """Một trang nhân viên, keyset theo id"""
+    page_token, page_size = get_page_args()
+    query = User.query.filter_by(role='employee')
+    return keyset_page(query, [User.id], page_token, page_size, descending=False)
+
+
 @admin_bp.route('/users')
 @login_required
 @admin_required
 def manage_users():
     """Quản lý nhân viên"""
-    users = User.query.filter_by(role='employee').all()
-    return render_template('manage_users.html', users=users)
+    page = _users_page()
+    total_users = User.query.filter_by(role='employee').count()
+    return render_template('manage_users.html', users=page.items, page=page, total_users=total_users)
+
+
+@admin_bp.route('/api/users')
+@login_required
+@admin_required
+def manage_users_json():
+    """API danh sách nhân viên (JSON, phân trang keyset)"""
+    page = _users_page()
+    return jsonify({
+        'items': [{
+            'id': u.id,
+            'employee_id': u.employee_id,
+            'username': u.username,
+            'full_name': u.full_name,
+            'email': u.email,
+            'department': u.department,
+            'position': u.position,
+            'face_registered': u.face_registered
+        } for u in page.items],
+        'next_token': page.next_token,
+        'page_size': page.page_size
+    })
 
 
 @admin_bp.route('/add_user', methods=['GET', 'POST'])
@@ -147,6 +212,7 @@ def add_user():
             
             db.session.add(new_user)
             db.session.commit()
+            get_employee_cache().invalidate(new_user.id)
             
             # Đăng ký khuôn mặt nếu có ảnh
             if face_image:
@@ -154,6 +220,7 @@ def add_user():
                 if success:
                     new_user.face_registered = True
                     db.session.commit()
+                    get_employee_cache().invalidate(new_user.id)
                     return jsonify({
                         'success': True, 
                         'message': 'Thêm nhân viên và đăng ký khuôn mặt thành công'
@@ -196,6 +263,7 @@ def register_employee_face(employee_id):
         if success:
             user.face_registered = True
             db.session.commit()
+            get_employee_cache().invalidate(user.id)
             return jsonify({'success': True, 'message': message})
         else:
             return jsonify({'success': False, 'error': message}), 400
@@ -204,6 +272,14 @@ def register_employee_face(employee_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/face_image/<employee_id>')
+@login_required
+@admin_required
+def face_image(employee_id):
+    """Ảnh khuôn mặt đã đăng ký, ?size=sm|md|lg để lấy thumbnail"""
+    return send_image(Config.FACES_FOLDER, f'{employee_id}.jpg', request.args.get('size'))
+
+
 @admin_bp.route('/user_info/<int:user_id>')
 @login_required
 @admin_required
@@ -214,59 +290,22 @@ def user_info(user_id):
         if not user:
             return jsonify({'success': False, 'error': 'Không tìm thấy nhân viên'}), 404
         
-        # Lấy thống kê điểm danh tháng này
-       
-        
-        
-        
-        from calendar import monthrange
-         
-        from datetime import date
- 
+        # Thống kê điểm danh tháng này (dùng chung engine tính lương)
         today = date.today()
-        created_date = user.created_at.date()
-        if today.year == created_date.year and today.month == created_date.month:
-            start_date = created_date
-        else:
-            start_date = today.replace(day=1)
-
-        """Ngày của tháng"""
-        days_in_month = monthrange(today.year, today.month)[1]
-
-        working_days = 0
-        for day in range(start_date.day, min(today.day, days_in_month) + 1):
-            d = date(today.year, today.month, day)
-            if d.weekday() < 5:
-                working_days += 1
-
-        attendances = Attendance.query.filter(
-            Attendance.employee_id == user.employee_id,
-            Attendance.date >= start_date,
-            Attendance.date <= today
-        ).all()
-
+        report = compute_payroll(today.year, today.month, employee_ids=[user.employee_id], today=today)
+        stats = report.row(0) if len(report) else None
         
-        # Tính tổng lương tháng này
-        total_work_minutes = sum(float(a.time_lam) for a in attendances if a.time_lam)
-        total_work_hours = round(total_work_minutes / 60, 2)
-        salary_per_hour = float(user.salary) if user.salary else 0
-        total_salary = round(total_work_hours * salary_per_hour, 2)
+        total_work_minutes = stats['work_minutes'] if stats else 0
+        total_work_hours = stats['work_hours'] if stats else 0
+        total_salary = stats['total_salary'] if stats else 0
+        on_time = stats['on_time'] if stats else 0
+        late = stats['late'] if stats else 0
+        total_attendance = stats['days_present'] if stats else 0
+        working_days = stats['working_days'] if stats else 0
+        absent = stats['absent'] if stats else 0
         
-        on_time = sum(1 for a in attendances if a.status == 'on_time')
-        late = sum(1 for a in attendances if a.status == 'late')
-        total_attendance = len(attendances)
-        absent = working_days - total_attendance
-        if absent < 0:
-            absent = 0
-        
-        # Lấy ảnh khuôn mặt nếu có
-        face_image = None
-        face_path = f'faces/{user.employee_id}.jpg'
-        if os.path.exists(face_path):
-            import base64
-            with open(face_path, 'rb') as f:
-                face_data = base64.b64encode(f.read()).decode('utf-8')
-                face_image = f'data:image/jpeg;base64,{face_data}'
+        # URL ảnh khuôn mặt (thumbnail), trình duyệt tự cache theo ETag
+        face_image = face_image_url(user.employee_id)
         
         return jsonify({
             'success': True,
@@ -303,6 +342,63 @@ def user_info(user_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@admin_bp.route('/payroll/export')
+@login_required
+@admin_required
+def export_payroll():
+    """Xuất bảng lương tháng của tất cả nhân viên (?month=YYYY-MM&format=csv|parquet)"""
+    try:
+        month = datetime.strptime(request.args.get('month', date.today().strftime('%Y-%m')), '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'Tháng không hợp lệ (định dạng YYYY-MM)'}), 400
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Chưa cài pyarrow, không thể xuất Parquet'}), 400
+    if fmt not in ('csv', 'parquet'):
+        return jsonify({'error': 'Định dạng không hỗ trợ'}), 400
+    
+    report = compute_payroll(month.year, month.month)
+    filename = f"payroll_{month.strftime('%Y_%m')}.{fmt}"
+    if fmt == 'parquet':
+        body, mimetype = iter_parquet(report), 'application/vnd.apache.parquet'
+    else:
+        body, mimetype = iter_csv(report), 'text/csv'
+    
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+
+@admin_bp.route('/attendance/export')
+@login_required
+@admin_required
+def export_attendance():
+    """Xuất điểm danh theo khoảng ngày (?start=&end=&department=&employee_id=&format=csv|ndjson)"""
+    try:
+        today = date.today().strftime('%Y-%m-%d')
+        start = datetime.strptime(request.args.get('start', today), '%Y-%m-%d').date()
+        end = datetime.strptime(request.args.get('end', today), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Ngày không hợp lệ (định dạng YYYY-MM-DD)'}), 400
+    if start > end:
+        return jsonify({'error': 'Ngày bắt đầu phải trước ngày kết thúc'}), 400
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Định dạng không hỗ trợ'}), 400
+    
+    stmt = build_export_query(
+        start, end,
+        department=request.args.get('department'),
+        employee_id=request.args.get('employee_id')
+    )
+    filename = f"attendance_{start:%Y%m%d}_{end:%Y%m%d}.{fmt}"
+    return Response(stream_with_context(iter_export(stmt, fmt)), mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+
 @admin_bp.route('/delete_user/<int:user_id>', methods=['DELETE'])
 @login_required
 @admin_required
@@ -319,38 +415,86 @@ def delete_user(user_id):
         # Xóa face encoding
         delete_face_encoding(user.employee_id)
         
-        # Xóa attendance records
-        Attendance.query.filter_by(employee_id=user.employee_id).delete()
-        
-        # Xóa user
-        db.session.delete(user)
+        # Xóa user (bulk delete, không để ORM nạp và cập nhật từng bản ghi attendance)
+        employee_id = user.employee_id
+        User.query.filter_by(id=user_id).delete()
         db.session.commit()
+        get_employee_cache().invalidate(user_id)
+        
+        # Xóa attendance và tính lại thống kê trong job nền
+        job_id = enqueue('delete_user_data', {'employee_id': employee_id})
         
-        return jsonify({'success': True, 'message': 'Đã xóa nhân viên'})
+        return jsonify({'success': True, 'message': 'Đã xóa nhân viên', 'job_id': job_id})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+@job_handler('delete_user_data')
+def delete_user_data_job(payload):
+    """Xóa bản ghi điểm danh của nhân viên đã xóa và tính lại thống kê các ngày liên quan"""
+    employee_id = payload['employee_id']
+    if User.query.filter_by(employee_id=employee_id).first():
+        # Mã nhân viên đã được cấp lại cho người khác, giữ nguyên dữ liệu
+        return {'deleted': 0, 'skipped': True}
+    
+    affected_days = [d for (d,) in db.session.query(Attendance.date).filter_by(
+        employee_id=employee_id
+    ).distinct()]
+    deleted = Attendance.query.filter_by(employee_id=employee_id).delete()
+    if affected_days:
+        mark_reset()
+    db.session.commit()
+    note_committed()
+    rebuild_days(affected_days)
+    return {'deleted': deleted, 'days': len(affected_days)}
+
+
+@admin_bp.route('/jobs')
+@login_required
+@admin_required
+def list_jobs():
+    """API danh sách job nền gần đây (lọc theo ?status=)"""
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    queue = get_job_queue()
+    return jsonify({
+        'jobs': queue.list_jobs(request.args.get('status'), limit),
+        'stats': queue.get_stats()
+    })
+
+
+@admin_bp.route('/admission')
+@login_required
+@admin_required
+def admission_stats():
+    """API số liệu kiểm soát tải nhận diện (theo process)"""
+    return jsonify(get_admission_stats())
+
+
+@admin_bp.route('/jobs/<int:job_id>')
+@login_required
+@admin_required
+def job_status(job_id):
+    """API trạng thái một job nền"""
+    job = get_job_queue().get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Không tìm thấy job'}), 404
+    return jsonify(job)
+
+
 @admin_bp.route('/settings')
 @login_required
 @admin_required
 def settings():
     """Trang cài đặt hệ thống"""
-    # Đọc cấu hình hiện tại từ .env
-    work_start_time = os.getenv('WORK_START_TIME', '08:30')
-    work_late_time = os.getenv('WORK_LATE_TIME', '09:00')
-    work_end_time = os.getenv('WORK_END_TIME', '17:30')
+    # Đọc cấu hình hiện tại từ database
+    current = get_settings().to_dict()
     
     return render_template('settings.html',
-                         work_start_time=work_start_time,
-                         work_late_time=work_late_time,
-                         work_end_time=work_end_time)
-
-
-
-
+                         work_start_time=current['work_start_time'],
+                         work_late_time=current['work_late_time'],
+                         work_end_time=current['work_end_time'])
 
 
 @admin_bp.route('/settings/update', methods=['POST'])
@@ -360,61 +504,28 @@ def update_settings():
     """API cập nhật cài đặt hệ thống"""
     try:
         data = request.json
-        work_start_time = data.get('work_start_time', '08:30')
-        work_late_time = data.get('work_late_time', '09:00')
-        work_end_time = data.get('work_end_time', '17:30')
+        values = {
+            'WORK_START_TIME': data.get('work_start_time', '08:30'),
+            'WORK_LATE_TIME': data.get('work_late_time', '09:00'),
+            'WORK_END_TIME': data.get('work_end_time', '17:30')
+        }
         
         # Validate format HH:MM
+        error = validate_settings(values)
+        if error:
+            return jsonify({'error': error}), 400
         
-        time_pattern = re.compile(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$')
-        
-        if not time_pattern.match(work_start_time):
-            return jsonify({'error': 'Giờ vào làm không hợp lệ (định dạng HH:MM)'}), 400
-        if not time_pattern.match(work_late_time):
-            return jsonify({'error': 'Giờ đi muộn không hợp lệ (định dạng HH:MM)'}), 400
-        if not time_pattern.match(work_end_time):
-            return jsonify({'error': 'Giờ tan làm không hợp lệ (định dạng HH:MM)'}), 400
-        
-        # Đọc file .env hiện tại
-        env_content = {}
-        if os.path.exists(ENV_FILE_PATH):
-            with open(ENV_FILE_PATH, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and '=' in line and not line.startswith('#'):
-                        key, value = line.split('=', 1)
-                        env_content[key] = value
-        
-        # Cập nhật giá trị
-        env_content['WORK_START_TIME'] = work_start_time
-        env_content['WORK_LATE_TIME'] = work_late_time
-        env_content['WORK_END_TIME'] = work_end_time
-        
-        # Ghi lại file .env
-        with open(ENV_FILE_PATH, 'w', encoding='utf-8') as f:
-            for key, value in env_content.items():
-                f.write(f'{key}={value}\n')
-        
-        # Cập nhật biến môi trường trong runtime
-        os.environ['WORK_START_TIME'] = work_start_time
-        os.environ['WORK_LATE_TIME'] = work_late_time
-        os.environ['WORK_END_TIME'] = work_end_time
-        
-        # Reload config
-        from config import load_dotenv
-        load_dotenv(override=True)
+        # Lưu vào database, các worker khác nhận thay đổi qua phiên bản cài đặt
+        updated = save_settings(values)
         
         return jsonify({
             'success': True,
             'message': 'Cập nhật cài đặt thành công',
-            'settings': {
-                'work_start_time': work_start_time,
-                'work_late_time': work_late_time,
-                'work_end_time': work_end_time
-            }
+            'settings': updated.to_dict()
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
@@ -440,6 +551,7 @@ def update_user(user_id):
             except:
                 pass
         db.session.commit()
+        get_employee_cache().invalidate(user.id)
         flash('Cập nhật thông tin thành công!', 'success')
         return redirect(url_for('admin.manage_users'))
     return render_template('update_user.html', user=user)
@@ -450,14 +562,13 @@ def update_user(user_id):
 @admin_required
 def send_email_all():
     """Gửi email cho tất cả nhân viên"""
-    from routes.annou import check_email, send_to_email
     if request.method == 'POST':
         subject = request.form.get('subject')
         content = request.form.get('content')
         if not check_email():
             flash('Chưa cấu hình email hoặc mật khẩu!', 'danger')
             return redirect(url_for('admin.send_email_all'))
-        send_to_email(subject, content)
-        flash('Đã gửi email cho tất cả nhân viên!', 'success')
-        return redirect(url_for('admin.send_email_all'))
-    return render_template('send_email_all.html')
\ No newline at end of file
+        job_id = enqueue('send_email_all', {'subject': subject, 'content': content}, max_attempts=1)
+        flash(f'Đang gửi email cho tất cả nhân viên (job #{job_id})', 'success')
+        return redirect(url_for('admin.send_email_all', job=job_id))
+    return render_template('send_email_all.html', job_id=request.args.get('job', type=int))
\ No newline at end of file
@@ -1,12 +1,18 @@
 import smtplib
+import ssl
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import sqlite3
 import asyncio
 from config import email
+from job_queue import job_handler, report_progress
 
 def check_email():
-    if not email.EMAIL_NAME or not email.EMAIL_PASSWORD:
+    if not email.EMAIL_NAME or (email.SMTP_AUTH and not email.EMAIL_PASSWORD):
         print("Chưa nhập email hoặc mật khẩu")
         return False
     return True
@@ -19,29 +25,182 @@ def read_email_fromdb():
     conn.close()
     return emails
 
-def send_email(to_email, subject, content):
+def build_message(to_email, subject, content):
     msg = MIMEMultipart()
     msg['From'] = email.EMAIL_NAME
     msg['To'] = to_email
     msg['Subject'] = subject
     msg.attach(MIMEText(content, 'plain', 'utf-8'))
+    return msg
+
+
+class SMTPPool:
+    """Pool kết nối SMTP đã đăng nhập, dùng lại giữa các email thay vì mở/đóng mỗi lần"""
+
+    def __init__(self, size=None, host=None, port=None, starttls=None, auth=None):
+        self.size = size or email.SMTP_POOL_SIZE
+        self.host = host or email.SMTP_HOST
+        self.port = port or email.SMTP_PORT
+        self.starttls = email.SMTP_STARTTLS if starttls is None else starttls
+        self.auth = email.SMTP_AUTH if auth is None else auth
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=email.SMTP_TIMEOUT)
+        if self.starttls:
+            server.starttls(context=ssl.create_default_context())
+        if self.auth:
+            server.login(email.EMAIL_NAME, email.EMAIL_PASSWORD)
+        server.sent_count = 0
+        return server
+
+    def acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_open = self._created < self.size
+                if can_open:
+                    self._created += 1
+            if can_open:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            # Pool đã đầy: chờ kết nối được trả lại (hoặc có chỗ khi kết nối hỏng bị bỏ)
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def release(self, server, broken=False):
+        if broken or server.sent_count >= email.SMTP_MAX_MESSAGES_PER_CONNECTION:
+            self._discard(server)
+        else:
+            self._idle.put(server)
+
+    def _discard(self, server):
+        try:
+            server.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def send(self, to_email, msg):
+        """Gửi một email, thử lại một lần với kết nối mới nếu kết nối cũ bị đóng"""
+        for attempt in range(2):
+            server = self.acquire()
+            try:
+                server.sendmail(email.EMAIL_NAME, to_email, msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                self.release(server, broken=True)
+                if attempt:
+                    raise
+                continue
+            except smtplib.SMTPException:
+                # Lỗi theo người nhận (vd: địa chỉ bị từ chối), kết nối vẫn dùng được
+                self.release(server)
+                raise
+            except OSError:
+                # Lỗi mạng: bỏ kết nối, thử lại với kết nối mới
+                self.release(server, broken=True)
+                if attempt:
+                    raise
+                continue
+            server.sent_count += 1
+            self.release(server)
+            return
+
+    def close(self):
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(server)
+
+
+class RateLimiter:
+    """Giới hạn số email gửi mỗi giây trên tất cả luồng"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def broadcast(recipients, subject, content, progress=None, pool=None):
+    """Gửi cùng một email tới nhiều người nhận, song song theo từng lô.
+
+    Trả về tổng kết và trạng thái từng người nhận; `progress(sent, failed, total)`
+    được gọi sau mỗi lô.
+    """
+    own_pool = pool is None
+    pool = pool or SMTPPool()
+    limiter = RateLimiter(email.SMTP_RATE_PER_SECOND)
+    total = len(recipients)
+    results = []
+
+    def send_one(to_email):
+        limiter.wait()
+        try:
+            pool.send(to_email, build_message(to_email, subject, content))
+            return {'email': to_email, 'status': 'sent'}
+        except Exception as e:
+            print(f"Lỗi gửi {to_email}: {e}")
+            return {'email': to_email, 'status': 'failed', 'error': str(e)}
+
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(email.EMAIL_NAME, email.EMAIL_PASSWORD)  
-        server.sendmail(email.EMAIL_NAME, to_email, msg.as_string())
-        server.quit()
-        print(f"Đã gửi: {to_email}")
-    except Exception as e:
-        print(f"Lỗi gửi {to_email}: {e}")
+        with ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix='smtp') as executor:
+            for offset in range(0, total, email.SMTP_BATCH_SIZE):
+                batch = recipients[offset:offset + email.SMTP_BATCH_SIZE]
+                results.extend(executor.map(send_one, batch))
+                if progress:
+                    failed = sum(1 for r in results if r['status'] == 'failed')
+                    progress(len(results) - failed, failed, total)
+    finally:
+        if own_pool:
+            pool.close()
+
+    failed = sum(1 for r in results if r['status'] == 'failed')
+    print(f"Đã gửi {total - failed}/{total} email")
+    return {'total': total, 'sent': total - failed, 'failed': failed, 'recipients': results}
+
+def send_email(to_email, subject, content):
+    result = broadcast([to_email], subject, content)
+    return result['failed'] == 0
 
 def send_to_email(subject, content):
-    emails = read_email_fromdb()                                                                       
-    for email in emails:
-        send_email(email, subject, content)
+    emails = read_email_fromdb()
+    return broadcast(
+        emails, subject, content,
+        progress=lambda sent, failed, total: report_progress(sent=sent, failed=failed, total=total)
+    )
+
+@job_handler('send_email_all')
+def send_email_all_job(payload):
+    """Job nền gửi email cho tất cả nhân viên"""
+    return send_to_email(payload['subject'], payload['content'])
 
 if __name__ == "__main__":
     subject = input("Nhập tiêu đề: ")
     content = input("Nhập nội dung: ")
     if check_email():
-        send_to_email(subject, content)
\ No newline at end of file
+        send_to_email(subject, content)
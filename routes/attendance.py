@@ -1,16 +1,23 @@
 import os
+import json
 import base64
 from datetime import datetime, date
-from flask import Blueprint, render_template, request, jsonify
-from models import db, User, Attendance
-from face_utils import recognize_face_from_image, get_attendance_status
-from config import WORK_START_TIME, WORK_LATE_TIME, WORK_END_TIME 
+from decimal import Decimal
+from flask import Blueprint, Response, render_template, request, jsonify
+from models import db, User, Attendance, insert_or_ignore
+from face_utils import recognize_face_from_image, recognize_faces_from_image, get_attendance_status
+from employee_cache import get_employee_cache
+from uploads import save_upload
+from admission import admit
+from attendance_summary import record_check_in, record_check_out, get_day_summary
+from attendance_feed import (
+    next_seq, note_committed, current_seq, make_etag, changes_since,
+    serialize as serialize_attendance
+)
+from app_settings import get_settings
 import time
 attendance_bp = Blueprint('attendance', __name__)
 
-work_start_time = datetime.strptime(WORK_START_TIME, '%H:%M').time()
-work_end_time = datetime.strptime(WORK_END_TIME, '%H:%M').time()
-
 @attendance_bp.route('/')
 def index():
     """Trang chủ - chuyển đến trang điểm danh"""
@@ -23,14 +30,201 @@ def check_page():
     return render_template('attendance_public.html')
 
 
+MIN_WORK_MINUTES = 30
+
+
+def _process_check(user, now, image_path, confidence_percent):
+    """Check-in hoặc check-out cho một nhân viên, chỉ thay đổi session (chưa commit)
+    
+    Check-in dùng INSERT ... ON CONFLICT DO NOTHING trên unique (employee_id, date)
+    nên hai request đồng thời không thể tạo hai bản ghi cho cùng một ngày.
+    Chỉ lấy sequence (next_seq) khi bản ghi thật sự được thêm/cập nhật, để các lần
+    quét lặp lại không làm đổi ETag của /attendance/today.
+    Trả về dict kết quả giống response của /attendance/check.
+    """
+    today = now.date()
+    status = get_attendance_status(now)
+    
+    inserted = insert_or_ignore(Attendance, ['employee_id', 'date'], dict(
+        user_id=user.id,
+        employee_id=user.employee_id,
+        full_name=user.full_name,
+        check_in=now,
+        date=today,
+        check_in_image=image_path,
+        status=status,
+        department=user.department,
+        position=user.position,
+        time_lam=0,
+        luong=0.0,
+        seq=None
+    ))
+    
+    if inserted:
+        Attendance.query.filter_by(employee_id=user.employee_id, date=today).update(
+            {'seq': next_seq()}, synchronize_session=False
+        )
+        record_check_in(today, user.department, status)
+        status_text = 'Đúng giờ' if status == 'present' else 'Đi trễ'
+        return {
+            'success': True,
+            'type': 'check_in',
+            'message': f'Check-in thành công! ({status_text})',
+            'confidence': confidence_percent,
+            'status': status,
+            'employee': {
+                'id': user.employee_id,
+                'name': user.full_name,
+                'department': user.department or 'N/A',
+                'check_in': now.strftime('%H:%M:%S')
+            }
+        }
+    
+    """Đã check-in, thực hiện check-out"""
+    existing_attendance = Attendance.query.filter_by(
+        employee_id=user.employee_id,
+        date=today
+    ).first()
+    
+    already_checked_out = {
+        'success': False,
+        'message': 'Bạn đã check-out hôm nay rồi!',
+        'type': 'already_checked_out',
+        'employee': {'id': user.employee_id, 'name': user.full_name}
+    }
+    if existing_attendance.check_out:
+        return already_checked_out
+    
+    time_since_checkin = (now - existing_attendance.check_in).total_seconds() / 60
+    if time_since_checkin < MIN_WORK_MINUTES:
+        remaining = int(MIN_WORK_MINUTES - time_since_checkin)
+        return {
+            'success': False,
+            'message': f'Chưa đủ thời gian làm việc! Còn {remaining} phút nữa mới được check-out.',
+            'type': 'too_early_checkout',
+            'employee': {'id': user.employee_id, 'name': user.full_name}
+        }
+    
+    """Thêm các chỉ số khi check_out, time làm việc"""
+    check_in = existing_attendance.check_in
+    check_out = now
+    settings = get_settings()
+    if check_in.time() < settings.work_start_time:
+        check_in = datetime.combine(check_in.date(), settings.work_start_time)
+    if check_out.time() > settings.work_end_time:
+        check_out = datetime.combine(check_out.date(), settings.work_end_time)
+    time_lam_date = check_out - check_in
+    work_hours = time_lam_date.seconds // 3600
+    work_minutes = (time_lam_date.seconds % 3600) // 60
+    time_lam = Decimal(work_hours * 60 + work_minutes)
+    
+    # Chỉ cập nhật nếu chưa có request nào khác check-out trước
+    updated = Attendance.query.filter(
+        Attendance.id == existing_attendance.id,
+        Attendance.check_out.is_(None)
+    ).update({
+        'check_in': check_in,
+        'check_out': check_out,
+        # check_out_image luôn cập nhật
+        'check_out_image': image_path,
+        'time_lam': time_lam,
+        'luong': (time_lam / Decimal(60)) * Decimal(user.salary or 0)
+    }, synchronize_session=False)
+    if not updated:
+        return already_checked_out
+    Attendance.query.filter_by(id=existing_attendance.id).update(
+        {'seq': next_seq()}, synchronize_session=False
+    )
+    record_check_out(today, existing_attendance.department)
+    
+    return {
+        'success': True,
+        'type': 'check_out',
+        'message': f'Check-out thành công! Làm việc: {work_hours}h {work_minutes}p',
+        'confidence': confidence_percent,
+        'employee': {
+            'id': user.employee_id,
+            'name': user.full_name,
+            'department': user.department or 'N/A',
+            'check_in': check_in.strftime('%H:%M:%S'),
+            'check_out': check_out.strftime('%H:%M:%S')
+        }
+    }
+
+
+def _check_attendance_group(image_data):
+    """Check-in/out cho tất cả nhân viên nhận diện được trong cùng một khung hình"""
+    matches, error = recognize_faces_from_image(image_data)
+    
+    if matches is None:
+        return jsonify({
+            'success': False,
+            'error': error,
+            'type': 'recognition_failed'
+        }), 400
+    
+    recognized = [m for m in matches if m['employee_id'] is not None]
+    unknown_faces = len(matches) - len(recognized)
+    
+    if not recognized:
+        return jsonify({
+            'success': False,
+            'error': 'Không nhận diện được - khuôn mặt chưa được đăng ký',
+            'type': 'recognition_failed',
+            'unknown_faces': unknown_faces
+        }), 400
+    
+    users = get_employee_cache().get_many_by_employee_id(
+        [m['employee_id'] for m in recognized]
+    )
+    
+    image_path = save_upload(image_data, 'group')
+    now = datetime.now()
+    
+    results = []
+    for match in recognized:
+        user = users.get(match['employee_id'])
+        if not user:
+            results.append({
+                'success': False,
+                'type': 'not_found',
+                'message': 'Không tìm thấy thông tin nhân viên',
+                'employee': {'id': match['employee_id']}
+            })
+            continue
+        confidence_percent = round(match['confidence'] * 100, 1)
+        result = _process_check(user, now, image_path, confidence_percent)
+        result['location'] = list(match['location'])
+        results.append(result)
+    
+    # Ghi toàn bộ nhóm trong một transaction
+    db.session.commit()
+    note_committed()
+    
+    return jsonify({
+        'success': any(r['success'] for r in results),
+        'type': 'group',
+        'count': len(results),
+        'unknown_faces': unknown_faces,
+        'results': results
+    })
+
+
 @attendance_bp.route('/attendance/check', methods=['POST'])
+@admit('kiosk')
 def check_attendance():
-    """API check-in/check-out với face recognition"""
+    """API check-in/check-out với face recognition
+    
+    Gửi thêm `"multi": true` để check-in cho tất cả khuôn mặt trong khung hình.
+    """
     try:
         image_data = request.json.get('image')
         if not image_data:
             return jsonify({'error': 'Không có ảnh được gửi lên'}), 400
         
+        if request.json.get('multi'):
+            return _check_attendance_group(image_data)
+        
         # Nhận diện khuôn mặt
         employee_id, result = recognize_face_from_image(image_data)
         
@@ -41,120 +235,20 @@ def check_attendance():
                 'type': 'recognition_failed'
             }), 400
         
-        # Tìm user trong database
-        user = User.query.filter_by(employee_id=employee_id).first()
+        user = get_employee_cache().get_by_employee_id(employee_id)
         
         if not user:
             return jsonify({'error': 'Không tìm thấy thông tin nhân viên'}), 404
         
         # Lưu ảnh check-in/out
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        face_data = image_data.split(',')[1] if ',' in image_data else image_data
-        image_bytes = base64.b64decode(face_data)
-        image_path = os.path.join('uploads', f'{employee_id}_{timestamp}.jpg')
-        with open(image_path, 'wb') as f:
-            f.write(image_bytes)
-        
-        today = date.today()
-        now = datetime.now()
-        
-        """Kiểm tra xem đã check-in hôm nay chưa"""
-        existing_attendance = Attendance.query.filter_by(
-            employee_id=user.employee_id,
-            date=today
-        ).first()
+        image_path = save_upload(image_data, employee_id)
         
         confidence_percent = round(result * 100, 1) if isinstance(result, float) else 0
         
-        if existing_attendance:
-            """Đã check-in, thực hiện check-out"""
-            if existing_attendance.check_out:
-                return jsonify({
-                    'success': False,
-                    'message': 'Bạn đã check-out hôm nay rồi!',
-                    'type': 'already_checked_out'
-                })
-            MIN_WORK_MINUTES = 30
-            time_since_checkin = (now - existing_attendance.check_in).total_seconds() / 60
-            if time_since_checkin < MIN_WORK_MINUTES:
-                remaining = int(MIN_WORK_MINUTES - time_since_checkin)
-                return jsonify({
-                    'success': False,
-                    'message': f'Chưa đủ thời gian làm việc! Còn {remaining} phút nữa mới được check-out.',
-                    'type': 'too_early_checkout'
-                })
-            
-            """Thêm các chỉ số khi check_out, time làm việc"""           
-            work_hours = 0
-            work_minutes = 0
-            try:
-              
-                existing_attendance.check_out = now
-                if existing_attendance.check_in.time() < work_start_time:
-                    existing_attendance.check_in = datetime.combine(existing_attendance.check_in.date(), work_start_time)
-                if existing_attendance.check_out.time() > work_end_time:
-                    existing_attendance.check_out = datetime.combine(existing_attendance.check_out.date(), work_end_time)
-                time_lam_date = existing_attendance.check_out - existing_attendance.check_in
-                work_hours = time_lam_date.seconds // 3600
-                work_minutes = (time_lam_date.seconds % 3600) // 60
-                # check_out_image luôn cập nhật
-                existing_attendance.check_out_image = image_path
-                from decimal import Decimal
-                existing_attendance.time_lam = Decimal(work_hours * 60 + work_minutes)
-                existing_attendance.luong = (existing_attendance.time_lam / Decimal(60)) * user.salary
-                db.session.commit()
-            except Exception as e:
-                print("Lỗi khi tính time làm :"+str(e))
-    
-            return jsonify({
-                'success': True,
-                'type': 'check_out',
-                'message': f'Check-out thành công! Làm việc: {work_hours}h {work_minutes}p',
-                'confidence': confidence_percent,
-                'employee': {
-                    'id': user.employee_id,
-                    'name': user.full_name,
-                    'department': user.department or 'N/A',
-                    'check_in': existing_attendance.check_in.strftime('%H:%M:%S') if existing_attendance.check_in else None,
-                    'check_out': existing_attendance.check_out.strftime('%H:%M:%S') if existing_attendance.check_out else None
-                }
-            })
-        else:
-            # Chưa check-in, thực hiện check-in
-            status = get_attendance_status(now)
-            
-            new_attendance = Attendance(
-                user_id=user.id,
-                employee_id=user.employee_id,
-                full_name=user.full_name,
-                check_in=now,
-                date=today,
-                check_in_image=image_path,
-                status=status,
-                department=user.department,
-                position=user.position,
-                time_lam=0,
-                luong=0.0
-            )
-            
-            db.session.add(new_attendance)
-            db.session.commit()
-            
-            status_text = 'Đúng giờ' if status == 'present' else 'Đi trễ'
-            
-            return jsonify({
-                'success': True,
-                'type': 'check_in',
-                'message': f'Check-in thành công! ({status_text})',
-                'confidence': confidence_percent,
-                'status': status,
-                'employee': {
-                    'id': user.employee_id,
-                    'name': user.full_name,
-                    'department': user.department or 'N/A',
-                    'check_in': now.strftime('%H:%M:%S')
-                }
-            })
+        response_data = _process_check(user, datetime.now(), image_path, confidence_percent)
+        db.session.commit()
+        note_committed()
+        return jsonify(response_data)
             
     except Exception as e:
         db.session.rollback()
@@ -163,6 +257,7 @@ def check_attendance():
 
 
 @attendance_bp.route('/attendance/recognize', methods=['POST'])
+@admit('kiosk')
 def recognize_face():
     """API nhận diện khuôn mặt không cần check-in"""
     try:
@@ -185,7 +280,7 @@ def recognize_face():
                 'error': result
             })
         
-        user = User.query.filter_by(employee_id=employee_id).first()
+        user = get_employee_cache().get_by_employee_id(employee_id)
         
         if not user:
             return jsonify({'error': 'Không tìm thấy thông tin'}), 404
@@ -228,34 +323,73 @@ def recognize_face():
 
 @attendance_bp.route('/attendance/status')
 def attendance_status():
-    """Trạng thái điểm danh hiện tại"""
+    """Trạng thái điểm danh hiện tại (đọc từ bảng thống kê theo ngày)"""
+    return jsonify(get_day_summary(date.today()))
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# (etag, body JSON) của /attendance/today lần gần nhất
+_today_cache = (None, None)
+
+
+@attendance_bp.route('/attendance/today')
+def today_attendance():
+    """Danh sách điểm danh hôm nay (hỗ trợ ETag/If-None-Match)"""
+    global _today_cache
     today = date.today()
-    attendances = Attendance.query.filter_by(date=today).all()
+    seq, _ = current_seq()
+    etag = make_etag(today, seq)
     
-    stats = {
-        'total': len(attendances),
-        'checked_in': len([a for a in attendances if a.check_in]),
-        'checked_out': len([a for a in attendances if a.check_out]),
-        'present_now': len([a for a in attendances if a.check_in and not a.check_out])
-    }
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    
+    cached_etag, body = _today_cache
+    if cached_etag != etag:
+        attendances = Attendance.query.filter_by(date=today).order_by(Attendance.check_in.desc()).all()
+        body = json.dumps([serialize_attendance(att) for att in attendances], ensure_ascii=False)
+        _today_cache = (etag, body)
     
-    return jsonify(stats)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
-@attendance_bp.route('/attendance/today')
-def today_attendance():
-    """Danh sách điểm danh hôm nay"""
+@attendance_bp.route('/attendance/today/changes')
+def today_attendance_changes():
+    """Delta feed: các bản ghi hôm nay thay đổi sau cursor `since`
+    
+    Trả về {date, cursor, reset, records}. reset=true nghĩa là client phải bỏ
+    dữ liệu cũ và dùng records như danh sách đầy đủ.
+    """
     today = date.today()
-    attendances = Attendance.query.filter_by(date=today).order_by(Attendance.check_in.desc()).all()
+    since = request.args.get('since', 0, type=int)
+    client_date = request.args.get('date')
+    seq, reset_seq = current_seq()
+    etag = make_etag(today, seq)
+    
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
     
-    result = []
-    for att in attendances:
-        result.append({
-            'employee_id': att.employee_id,
-            'full_name': att.full_name,
-            'check_in': att.check_in.strftime('%H:%M:%S') if att.check_in else None,
-            'check_out': att.check_out.strftime('%H:%M:%S') if att.check_out else None,
-            'status': att.status
-        })
+    reset = since <= 0 or since < reset_seq or client_date != today.isoformat()
+    if not reset and since == seq:
+        records = []
+    else:
+        records = [serialize_attendance(att) for att in changes_since(today, 0 if reset else since)]
     
-    return jsonify(result)
+    cursor = max([seq, 0 if reset else since] + [r['seq'] or 0 for r in records])
+    response = jsonify({
+        'date': today.isoformat(),
+        'cursor': cursor,
+        'reset': reset,
+        'records': records
+    })
+    response.set_etag(make_etag(today, cursor))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
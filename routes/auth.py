@@ -7,6 +7,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, login_required, logout_user, current_user
 from models import User, db
 from face_utils import recognize_face_from_image
+from employee_cache import get_employee_cache
+from admission import admit
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -39,6 +41,7 @@ def login():
 
 
 @auth_bp.route('/login/face', methods=['POST'])
+@admit('interactive')
 def login_face():
     """API đăng nhập bằng FaceID"""
     try:
@@ -55,8 +58,8 @@ def login_face():
                 'error': result or 'Không nhận diện được khuôn mặt'
             }), 400
         
-        # Tìm user trong database
-        user = User.query.filter_by(employee_id=employee_id).first()
+        # Tìm user (qua cache nhân viên)
+        user = get_employee_cache().get_by_employee_id(employee_id)
         
         if not user:
             return jsonify({
@@ -114,6 +117,7 @@ def password_recovery():
 
 
 @auth_bp.route('/password/forgot', methods=['POST'])
+@admit('interactive')
 def forgot_password():
     """API quên mật khẩu - quét FaceID để cấp mật khẩu mới"""
     try:
@@ -130,8 +134,8 @@ def forgot_password():
                 'error': result or 'Không nhận diện được khuôn mặt'
             }), 400
         
-        # Tìm user trong database
-        user = User.query.filter_by(employee_id=employee_id).first()
+        # Tìm user (qua cache nhân viên)
+        user = get_employee_cache().get_by_employee_id(employee_id)
         
         if not user:
             return jsonify({
@@ -147,7 +151,7 @@ def forgot_password():
         
         # Tạo mật khẩu mới 6 chữ số
         new_password = ''.join(random.choices(string.digits, k=6))
-        user.set_password(new_password)
+        db.session.get(User, user.id).set_password(new_password)
         db.session.commit()
         
         return jsonify({
@@ -206,6 +210,7 @@ def change_password():
 
 
 @auth_bp.route('/password/verify-face', methods=['POST'])
+@admit('interactive')
 def verify_face_for_password():
     """API xác thực FaceID để đổi mật khẩu"""
     try:
@@ -222,8 +227,8 @@ def verify_face_for_password():
                 'error': result or 'Không nhận diện được khuôn mặt'
             }), 400
         
-        # Tìm user trong database
-        user = User.query.filter_by(employee_id=employee_id).first()
+        # Tìm user (qua cache nhân viên)
+        user = get_employee_cache().get_by_employee_id(employee_id)
         
         if not user:
             return jsonify({
@@ -253,6 +258,7 @@ def verify_face_for_password():
 
 
 @auth_bp.route('/password/change-by-face', methods=['POST'])
+@admit('interactive', concurrency=False)
 def change_password_by_face():
     """API đổi mật khẩu sau khi đã xác thực FaceID"""
     try:
@@ -1,7 +1,12 @@
-import asyncio
+import json
+import os
 import traceback
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, Response, render_template, request, jsonify, stream_with_context
 from flask_login import login_required, current_user
+from background_loop import run_async, iter_async
+from routes.admin import admin_required
+
+CHAT_TIMEOUT = float(os.getenv('CHAT_TIMEOUT', '60'))
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
 
@@ -63,12 +68,14 @@ def ask():
                 'success': False, 
                 'error': error_msg
             }), 500
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Chạy trên event loop nền dùng chung (giữ connection pool của các client async)
         try:
-            result = loop.run_until_complete(brain.ask_tme(query, session_id))
-        finally:
-            loop.close()
+            result = run_async(brain.ask_tme(query, session_id), timeout=CHAT_TIMEOUT)
+        except TimeoutError:
+            return jsonify({
+                'success': False,
+                'error': 'ChatAI phản hồi quá lâu, vui lòng thử lại'
+            }), 504
         
         return jsonify({
             'success': True,
@@ -83,6 +90,47 @@ def ask():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _sse(event):
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@chat_bp.route('/ask/stream', methods=['POST'])
+@login_required
+def ask_stream():
+    """Như /ask nhưng trả câu trả lời theo từng token (Server-Sent Events).
+
+    Mỗi event là một dòng `data: {json}` với type: session, token, done hoặc error.
+    """
+    data = request.json or {}
+    query = (data.get('query') or '').strip()
+    session_id = data.get('session_id')
+    
+    if not query:
+        return jsonify({'success': False, 'error': 'Vui lòng nhập câu hỏi'}), 400
+    
+    brain, init_error = get_brain()
+    if brain is None:
+        error_msg = f'ChatAI chưa được cấu hình. Lỗi: {init_error}' if init_error else 'ChatAI chưa được cấu hình.'
+        return jsonify({'success': False, 'error': error_msg}), 500
+    
+    def generate():
+        try:
+            # Chạy trên event loop nền; mỗi token chờ tối đa CHAT_TIMEOUT giây
+            for event in iter_async(brain.ask_tme_stream(query, session_id), timeout=CHAT_TIMEOUT):
+                yield _sse(event)
+        except TimeoutError:
+            yield _sse({'type': 'error', 'error': 'ChatAI phản hồi quá lâu, vui lòng thử lại'})
+        except Exception as e:
+            print(f"Chat stream error: {str(e)}")
+            traceback.print_exc()
+            yield _sse({'type': 'error', 'error': str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx: không buffer response
+    })
+
+
 @chat_bp.route('/history')
 @login_required
 def history():
@@ -97,3 +145,15 @@ def history():
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@chat_bp.route('/stats')
+@login_required
+@admin_required
+def stats():
+    """Số liệu cache của ChatAI (theo process)"""
+    brain, init_error = get_brain()
+    if brain is None:
+        return jsonify({'success': False, 'error': init_error or 'ChatAI chưa được cấu hình.'}), 503
+    return jsonify({'success': True, **brain.get_cache_stats()})
+
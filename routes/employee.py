@@ -3,7 +3,11 @@ import base64
 from datetime import datetime, date
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import db, Attendance
+from models import db, Attendance, insert_or_ignore
+from attendance_summary import record_check_in
+from attendance_feed import next_seq, note_committed
+from pagination import keyset_page, get_page_args
+from uploads import save_upload
 
 employee_bp = Blueprint('employee', __name__, url_prefix='/employee')
 
@@ -72,17 +76,40 @@ def dashboard():
                          )
 
 
+def _history_page():
+    """Một trang lịch sử điểm danh của nhân viên hiện tại, keyset theo (date, id)"""
+    page_token, page_size = get_page_args()
+    query = Attendance.query.filter_by(employee_id=current_user.employee_id)
+    return keyset_page(query, [Attendance.date, Attendance.id], page_token, page_size)
+
+
 @employee_bp.route('/attendance-history')
 @login_required
 @employee_required
 def attendance_history():
     """Lịch sử điểm danh của nhân viên"""
-    # Lấy tất cả lịch sử điểm danh
-    history = Attendance.query.filter_by(
-        employee_id=current_user.employee_id
-    ).order_by(Attendance.date.desc()).all()
-    
-    return render_template('attendance_history.html', history=history)
+    page = _history_page()
+    return render_template('attendance_history.html', history=page.items, page=page)
+
+
+@employee_bp.route('/api/attendance-history')
+@login_required
+@employee_required
+def attendance_history_json():
+    """API lịch sử điểm danh (JSON), dùng next_token làm page_token cho trang sau"""
+    page = _history_page()
+    return jsonify({
+        'items': [{
+            'id': a.id,
+            'date': a.date.isoformat() if a.date else None,
+            'check_in': a.check_in.strftime('%H:%M:%S') if a.check_in else None,
+            'check_out': a.check_out.strftime('%H:%M:%S') if a.check_out else None,
+            'time_lam': float(a.time_lam) if a.time_lam is not None else None,
+            'status': a.status
+        } for a in page.items],
+        'next_token': page.next_token,
+        'page_size': page.page_size
+    })
 
 
 @employee_bp.route('/check-in', methods=['POST'])
@@ -96,32 +123,14 @@ def check_in():
         if not image_data:
             return jsonify({'error': 'No image provided'}), 400
         
-        # Decode base64 image
-        face_data = image_data.split(',')[1] if ',' in image_data else image_data
-        image_bytes = base64.b64decode(face_data)
-        
         # Lưu ảnh check-in
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"checkin_{current_user.id}_{timestamp}.jpg"
-        image_path = os.path.join('uploads', filename)
-        
-        with open(image_path, 'wb') as f:
-            f.write(image_bytes)
+        image_path = save_upload(image_data, f"checkin_{current_user.id}")
         
         today = date.today()
         now = datetime.now()
         
-        # Kiểm tra đã check-in hôm nay chưa
-        existing = Attendance.query.filter_by(
-            employee_id=current_user.employee_id,
-            date=today
-        ).first()
-        
-        if existing:
-            return jsonify({'error': 'Bạn đã check-in hôm nay rồi'}), 400
-        
-        # Tạo bản ghi điểm danh
-        attendance = Attendance(
+        # Tạo bản ghi điểm danh, bỏ qua nếu đã check-in hôm nay
+        inserted = insert_or_ignore(Attendance, ['employee_id', 'date'], dict(
             user_id=current_user.id,
             employee_id=current_user.employee_id,
             full_name=current_user.full_name,
@@ -130,11 +139,20 @@ def check_in():
             check_in_image=image_path,
             status='present',
             department=current_user.department,
-            position=current_user.position
-        )
+            position=current_user.position,
+            seq=None
+        ))
+        
+        if not inserted:
+            db.session.rollback()
+            return jsonify({'error': 'Bạn đã check-in hôm nay rồi'}), 400
         
-        db.session.add(attendance)
+        Attendance.query.filter_by(employee_id=current_user.employee_id, date=today).update(
+            {'seq': next_seq()}, synchronize_session=False
+        )
+        record_check_in(today, current_user.department, 'present')
         db.session.commit()
+        note_committed()
         
         return jsonify({'success': True, 'message': 'Check-in thành công'})
         
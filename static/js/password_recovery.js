@@ -0,0 +1,314 @@
+// Video elements
+const forgotVideo = document.getElementById('forgotVideo');
+const changeVideo = document.getElementById('changeVideo');
+
+// Canvas for capturing
+const canvas = document.createElement('canvas');
+const ctx = canvas.getContext('2d');
+canvas.width = 640;
+canvas.height = 480;
+
+// Stream variables
+let forgotStream = null;
+let changeStream = null;
+let forgotInterval = null;
+let changeInterval = null;
+let busyUntil = 0;  // Server quá tải (429/503): tạm dừng quét đến thời điểm này
+
+// Trả về true nếu server báo quá tải (ghi nhận Retry-After)
+function isBusy(response) {
+    if (response.status !== 429 && response.status !== 503) return false;
+    busyUntil = Date.now() + (parseInt(response.headers.get('Retry-After'), 10) || 2) * 1000;
+    return true;
+}
+
+// ==================== Tab Switching ====================
+function switchTab(tab) {
+    document.querySelectorAll('.tab-btn').forEach(btn => btn.classList.remove('active'));
+    document.querySelectorAll('.tab-content').forEach(content => content.classList.remove('active'));
+
+    if (tab === 'forgot') {
+        document.querySelector('.tab-btn:first-child').classList.add('active');
+        document.getElementById('forgot-tab').classList.add('active');
+        stopChangeCamera();
+    } else {
+        document.querySelector('.tab-btn:last-child').classList.add('active');
+        document.getElementById('change-tab').classList.add('active');
+        stopForgotCamera();
+    }
+    hideMessage();
+}
+
+function switchChangeMethod(method) {
+    document.querySelectorAll('.method-btn').forEach(btn => btn.classList.remove('active'));
+    document.querySelectorAll('.change-method').forEach(m => m.classList.remove('active'));
+
+    if (method === 'password') {
+        document.querySelector('.method-btn:first-child').classList.add('active');
+        document.getElementById('change-password-method').classList.add('active');
+        stopChangeCamera();
+    } else {
+        document.querySelector('.method-btn:last-child').classList.add('active');
+        document.getElementById('change-face-method').classList.add('active');
+    }
+    hideMessage();
+}
+
+// ==================== Message Display ====================
+function showMessage(text, type = 'info') {
+    const box = document.getElementById('messageBox');
+    const textEl = document.getElementById('messageText');
+    box.className = 'login-message ' + (type === 'error' ? 'error' : type === 'success' ? 'success' : '');
+    textEl.textContent = text;
+    box.style.display = 'block';
+}
+
+function hideMessage() {
+    document.getElementById('messageBox').style.display = 'none';
+}
+
+// ==================== Forgot Password (FaceID) ====================
+function startForgotPassword() {
+    if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
+        navigator.mediaDevices.getUserMedia({ 
+            video: { width: { ideal: 640 }, height: { ideal: 480 }, facingMode: 'user' } 
+        })
+        .then(stream => {
+            forgotVideo.srcObject = stream;
+            forgotStream = stream;
+
+            document.getElementById('btnForgotStart').style.display = 'none';
+            document.getElementById('btnForgotStop').style.display = 'block';
+            document.getElementById('forgotUserPreview').classList.remove('show');
+            document.getElementById('newPasswordBox').style.display = 'none';
+
+            updateForgotStatus('recognizing', 'Đang quét khuôn mặt...');
+
+            // Bắt đầu nhận diện
+            forgotInterval = setInterval(recognizeForgotFace, 2000);
+        })
+        .catch(error => {
+            console.error("Camera error: ", error);
+            updateForgotStatus('error', 'Không thể truy cập camera');
+        });
+    }
+}
+
+function stopForgotCamera() {
+    if (forgotStream) {
+        forgotStream.getTracks().forEach(track => track.stop());
+        forgotStream = null;
+    }
+    if (forgotInterval) {
+        clearInterval(forgotInterval);
+        forgotInterval = null;
+    }
+
+    document.getElementById('btnForgotStart').style.display = 'block';
+    document.getElementById('btnForgotStop').style.display = 'none';
+    updateForgotStatus('waiting', 'Nhấn để bật camera và quét khuôn mặt');
+}
+
+function updateForgotStatus(status, text) {
+    const statusEl = document.getElementById('forgotStatus');
+    statusEl.className = 'face-status ' + status;
+    document.getElementById('forgotStatusText').textContent = text;
+}
+
+function recognizeForgotFace() {
+    if (!forgotStream || Date.now() < busyUntil) return;
+
+    ctx.drawImage(forgotVideo, 0, 0, canvas.width, canvas.height);
+    const imageData = canvas.toDataURL('image/jpeg', 0.8);
+
+    fetch('/password/forgot', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ image: imageData })
+    })
+    .then(response => isBusy(response) ? null : response.json())
+    .then(data => {
+        if (!data) {
+            updateForgotStatus('recognizing', 'Hệ thống đang bận, đang thử lại...');
+            return;
+        }
+        if (data.success) {
+            // Dừng camera
+            stopForgotCamera();
+
+            // Hiển thị thông tin user và mật khẩu mới
+            document.getElementById('forgotPreviewName').textContent = data.user.name;
+            document.getElementById('forgotPreviewDept').textContent = data.user.department || 'N/A';
+            document.getElementById('newPassword').textContent = data.new_password;
+            document.getElementById('forgotUserPreview').classList.add('show');
+            document.getElementById('newPasswordBox').style.display = 'block';
+
+            updateForgotStatus('success', 'Đã cấp mật khẩu mới thành công!');
+            showMessage('Mật khẩu mới đã được cấp. Hãy ghi nhớ mật khẩu!', 'success');
+        }
+    })
+    .catch(error => {
+        console.error("Error:", error);
+    });
+}
+
+// ==================== Change Password by Old Password ====================
+function changePasswordByOld(e) {
+    e.preventDefault();
+
+    const username = document.getElementById('changeUsername').value;
+    const oldPassword = document.getElementById('oldPassword').value;
+    const newPassword = document.getElementById('newPasswordInput').value;
+    const confirmPassword = document.getElementById('confirmPassword').value;
+
+    if (newPassword !== confirmPassword) {
+        showMessage('Mật khẩu mới không khớp!', 'error');
+        return;
+    }
+
+    fetch('/password/change', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            username: username,
+            old_password: oldPassword,
+            new_password: newPassword
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showMessage(data.message, 'success');
+            document.getElementById('changePasswordForm').reset();
+        } else {
+            showMessage(data.error, 'error');
+        }
+    })
+    .catch(error => {
+        showMessage('Có lỗi xảy ra!', 'error');
+    });
+}
+
+// ==================== Change Password by FaceID ====================
+function startChangeByFace() {
+    if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
+        navigator.mediaDevices.getUserMedia({ 
+            video: { width: { ideal: 640 }, height: { ideal: 480 }, facingMode: 'user' } 
+        })
+        .then(stream => {
+            changeVideo.srcObject = stream;
+            changeStream = stream;
+
+            document.getElementById('btnChangeStart').style.display = 'none';
+            document.getElementById('btnChangeStop').style.display = 'block';
+            document.getElementById('changeFaceStep2').style.display = 'none';
+            document.getElementById('changeFaceStep1').style.display = 'block';
+
+            updateChangeStatus('recognizing', 'Đang quét khuôn mặt...');
+
+            // Bắt đầu nhận diện
+            changeInterval = setInterval(recognizeChangeFace, 2000);
+        })
+        .catch(error => {
+            console.error("Camera error: ", error);
+            updateChangeStatus('error', 'Không thể truy cập camera');
+        });
+    }
+}
+
+function stopChangeCamera() {
+    if (changeStream) {
+        changeStream.getTracks().forEach(track => track.stop());
+        changeStream = null;
+    }
+    if (changeInterval) {
+        clearInterval(changeInterval);
+        changeInterval = null;
+    }
+
+    document.getElementById('btnChangeStart').style.display = 'block';
+    document.getElementById('btnChangeStop').style.display = 'none';
+    updateChangeStatus('waiting', 'Nhấn để bật camera và quét khuôn mặt');
+}
+
+function updateChangeStatus(status, text) {
+    const statusEl = document.getElementById('changeStatus');
+    statusEl.className = 'face-status ' + status;
+    document.getElementById('changeStatusText').textContent = text;
+}
+
+function recognizeChangeFace() {
+    if (!changeStream || Date.now() < busyUntil) return;
+
+    ctx.drawImage(changeVideo, 0, 0, canvas.width, canvas.height);
+    const imageData = canvas.toDataURL('image/jpeg', 0.8);
+
+    fetch('/password/verify-face', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ image: imageData })
+    })
+    .then(response => isBusy(response) ? null : response.json())
+    .then(data => {
+        if (!data) {
+            updateChangeStatus('recognizing', 'Hệ thống đang bận, đang thử lại...');
+            return;
+        }
+        if (data.success) {
+            // Dừng camera
+            stopChangeCamera();
+
+            // Hiển thị form đổi mật khẩu
+            document.getElementById('verifiedUserId').value = data.user.id;
+            document.getElementById('changePreviewName').textContent = data.user.name;
+            document.getElementById('changePreviewDept').textContent = data.user.department || 'N/A';
+            document.getElementById('changeFaceStep1').style.display = 'none';
+            document.getElementById('changeFaceStep2').style.display = 'block';
+
+            updateChangeStatus('success', 'Xác thực thành công!');
+            showMessage('Đã xác thực khuôn mặt. Vui lòng nhập mật khẩu mới.', 'success');
+        }
+    })
+    .catch(error => {
+        console.error("Error:", error);
+    });
+}
+
+function changePasswordByFace(e) {
+    e.preventDefault();
+
+    const userId = document.getElementById('verifiedUserId').value;
+    const newPassword = document.getElementById('faceNewPassword').value;
+    const confirmPassword = document.getElementById('faceConfirmPassword').value;
+
+    if (newPassword !== confirmPassword) {
+        showMessage('Mật khẩu mới không khớp!', 'error');
+        return;
+    }
+
+    fetch('/password/change-by-face', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            user_id: userId,
+            new_password: newPassword
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showMessage(data.message, 'success');
+            document.getElementById('changeFacePasswordForm').reset();
+            // Reset về bước 1
+            setTimeout(() => {
+                document.getElementById('changeFaceStep2').style.display = 'none';
+                document.getElementById('changeFaceStep1').style.display = 'block';
+            }, 2000);
+        } else {
+            showMessage(data.error, 'error');
+        }
+    })
+    .catch(error => {
+        showMessage('Có lỗi xảy ra!', 'error');
+    });
+}
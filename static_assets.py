@@ -0,0 +1,168 @@
+"""
+Lớp phục vụ tài nguyên tĩnh không cần bước build.
+
+- asset_url('css/common.css') trả về URL có dấu vân tay nội dung (?v=<hash>);
+  file có dấu vân tay đúng được trả với Cache-Control immutable một năm, nên kiosk
+  chỉ tải lại khi file thực sự thay đổi.
+- Response HTML/JSON/CSS/JS được nén brotli (nếu cài `brotli`) hoặc gzip theo
+  Accept-Encoding. Response stream (export, payroll...) và response đã nén bỏ qua.
+  Bản nén của file tĩnh được cache trong bộ nhớ theo mtime.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from flask import request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_MAX_AGE = int(os.getenv('ASSET_MAX_AGE', str(365 * 24 * 3600)))
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/csv',
+    'application/javascript', 'application/json', 'application/x-ndjson',
+    'image/svg+xml',
+}
+
+_lock = threading.Lock()
+# đường dẫn -> (mtime, hash)
+_fingerprints = {}
+# (đường dẫn, encoding) -> (mtime, dữ liệu nén)
+_compressed_files = {}
+
+
+def _static_path(app, filename):
+    return os.path.join(app.static_folder, filename)
+
+
+def _fingerprint(path):
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _fingerprints.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.md5(f.read()).hexdigest()[:12]
+    with _lock:
+        _fingerprints[path] = (mtime, digest)
+    return digest
+
+
+def asset_url(filename):
+    """URL file tĩnh kèm dấu vân tay nội dung (dùng trong template)"""
+    from flask import current_app
+    try:
+        version = _fingerprint(_static_path(current_app, filename))
+    except OSError:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=filename, v=version)
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def _compressed_static(path, encoding):
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, encoding)
+    with _lock:
+        cached = _compressed_files.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        data = _compress(f.read(), encoding)
+    with _lock:
+        _compressed_files[key] = (mtime, data)
+    return data
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def _cache_static(app, response):
+    """Header cache cho file tĩnh: immutable nếu URL có dấu vân tay đúng"""
+    filename = (request.view_args or {}).get('filename')
+    version = request.args.get('v')
+    if not filename or not version:
+        return
+    try:
+        current = _fingerprint(_static_path(app, filename))
+    except OSError:
+        return
+    if version == current:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+        response.expires = None
+    else:
+        # Trang cũ tham chiếu phiên bản đã thay đổi: không cache nội dung mới dưới URL cũ
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = None
+
+
+def _compress_response(app, response):
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    if request.method == 'HEAD' or 'Range' in request.headers:
+        return response
+    _add_vary(response)
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if request.endpoint == 'static':
+        # send_file trả file dạng passthrough: nén từ file gốc, cache theo mtime
+        path = _static_path(app, request.view_args['filename'])
+        try:
+            if os.path.getsize(path) < COMPRESS_MIN_SIZE:
+                return response
+            data = _compressed_static(path, encoding)
+        except OSError:
+            return response
+        if hasattr(response.response, 'close'):
+            response.response.close()
+        response.direct_passthrough = False
+        response.set_data(data)
+    else:
+        if response.is_streamed or response.direct_passthrough:
+            return response
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(_compress(body, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Đăng ký asset_url cho template và hook cache/nén response"""
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.after_request
+    def static_assets_after_request(response):
+        if request.endpoint == 'static':
+            _cache_static(app, response)
+        return _compress_response(app, response)
+
+    return app
@@ -0,0 +1,43 @@
+"""
+Lưu ảnh check-in/out vào thư mục uploads.
+
+Ảnh được ghi ngay trong request (ghi file tạm rồi đổi tên) trước khi tạo bản ghi
+điểm danh, nên đường dẫn trong database luôn trỏ tới file đã có. Tên file gồm
+thời điểm tới mili giây và một chuỗi ngẫu nhiên để hai ảnh cùng prefix trong
+cùng một giây không ghi đè nhau.
+"""
+import base64
+import os
+import uuid
+from datetime import datetime
+from config import Config
+from job_queue import job_handler
+
+
+def _strip_data_url(image_data):
+    return image_data.split(',')[1] if ',' in image_data else image_data
+
+
+def _write_file(path, image_bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Ghi file tạm rồi đổi tên để /uploads không trả về ảnh ghi dở
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(image_bytes)
+    os.replace(tmp_path, path)
+
+
+def save_upload(image_data, prefix):
+    """Ghi ảnh base64 vào uploads, trả về đường dẫn file"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+    image_path = os.path.join(Config.UPLOAD_FOLDER, f'{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}.jpg')
+    _write_file(image_path, base64.b64decode(_strip_data_url(image_data)))
+    return image_path
+
+
+@job_handler('write_upload')
+def _write_upload(payload):
+    """Job cũ còn trong hàng đợi từ phiên bản ghi ảnh bằng job nền"""
+    image_bytes = base64.b64decode(payload['data'])
+    _write_file(payload['path'], image_bytes)
+    return {'path': payload['path'], 'bytes': len(image_bytes)}
@@ -0,0 +1,36 @@
+"""
+Entry point WSGI cho production: gunicorn -c gunicorn.conf.py wsgi:app
+
+Với preload_app, module này chỉ được import một lần trong gunicorn master nên
+init_database chạy đúng một lần; các worker fork từ master.
+
+TmeBrain (model torch, client Chroma, engine SQLAlchemy của SQLChatMessageHistory)
+không an toàn qua fork nên được tạo trong từng worker (post_fork), không trong master.
+"""
+from app import app, init_database
+from main import init_search_system, get_brain_instance
+from models import db
+from job_queue import start_workers, get_job_queue
+
+# Thread job nền không sống qua fork, khởi động trong từng worker (post_fork)
+init_database(app, start_jobs=False)
+
+
+def start_worker_services(app):
+    """Chạy trong mỗi worker ngay sau fork"""
+    with app.app_context():
+        # Không dùng lại kết nối SQLite mở trong master
+        db.engine.dispose(close=False)
+    start_workers()
+    init_search_system()
+
+
+def stop_worker_services():
+    """Chạy khi worker thoát: ghi nốt cache tìm kiếm đang chờ, dừng job nền"""
+    brain = get_brain_instance()
+    if brain is not None:
+        try:
+            brain.cleanup()
+        except Exception as e:
+            print(f"Lỗi dọn dẹp Search AI: {e}")
+    get_job_queue().stop()